@@ -1,13 +1,14 @@
 import argparse
+import os
 import sys
 import asyncio
 import json
-import vector_search_util.core.app as app_module
 
 async def main():
     parser = argparse.ArgumentParser(
         description="Vector Search Utility CLI"
     )
+    parser.add_argument("--collection_name", type=str, default="", help="Collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted.")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # vector_search サブコマンド
@@ -15,10 +16,22 @@ async def main():
     vector_search_parser.add_argument("-q", "--query", type=str, required=True, help="Search query text.")
     vector_search_parser.add_argument("-c", "--category", type=str, default="", help="Category to filter search results.")
     vector_search_parser.add_argument("-k", "--top_k", type=int, default=5, help="Number of top results to return.")
+    vector_search_parser.add_argument("--ef", type=int, default=None, help="HNSW ef for this query only. Uses the collection setting if omitted.")
+    vector_search_parser.add_argument("--exact", action="store_true", help="Search all chunks exactly by cosine similarity instead of HNSW.")
+    vector_search_parser.add_argument("--fields", type=str, nargs="*", default=[], help="Metadata keys to return. Returns all metadata if omitted.")
+    vector_search_parser.add_argument("--include_content", choices=["full", "snippet", "false"], default="full", help="How to return the content: full, snippet or false.")
+    vector_search_parser.add_argument("--expand_category_depth", type=int, default=0, help="Also search the categories reachable from --category within this many relation hops.")
+    vector_search_parser.add_argument("--edge_types", type=str, nargs="*", default=[], help="Edge types to follow when expanding the category. Follows all edge types if omitted.")
+    vector_search_parser.add_argument("--expand_direction", choices=["out", "in", "both"], default="out", help="Direction to follow when expanding the category.")
+    vector_search_parser.add_argument("--mmr", action="store_true", help="Rerank candidates with maximal marginal relevance to avoid near-duplicate results.")
+    vector_search_parser.add_argument("--fetch_k", type=int, default=20, help="Number of candidates to rerank with --mmr.")
+    vector_search_parser.add_argument("--lambda_mult", type=float, default=0.5, help="MMR trade-off between relevance (1.0) and diversity (0.0).")
 
     # metadata_search サブコマンド
     metadata_search_parser = subparsers.add_parser("metadata_search", help="Execute metadata search process")
     metadata_search_parser.add_argument("-c", "--conditions", type=str, default="{}", help="Conditions to filter metadata search results.")
+    metadata_search_parser.add_argument("--fields", type=str, nargs="*", default=[], help="Metadata keys to return. Returns all metadata if omitted.")
+    metadata_search_parser.add_argument("--include_content", choices=["full", "snippet", "false"], default="full", help="How to return the content: full, snippet or false.")
 
     # load_data サブコマンド
     load_parser = subparsers.add_parser("load_data", help="Execute data loading process")
@@ -29,6 +42,9 @@ async def main():
     load_parser.add_argument("--category_column", type=str, default="category", help="Category tag to filter documents.")
     # append_vectors オプションを追加
     load_parser.add_argument("--append_vectors", action="store_true", help="Append mode if set; otherwise, overwrite existing data.")
+    # resume / retry_failed オプションを追加
+    load_parser.add_argument("--resume", action="store_true", help="Skip batches already completed by a previous run of the same file.")
+    load_parser.add_argument("--retry_failed", action="store_true", help="Reprocess only the rows that failed in a previous run of the same file.")
 
     # unload_data サブコマンド
     unload_parser = subparsers.add_parser("unload_data", help="Execute data unloading process")
@@ -64,6 +80,44 @@ async def main():
     category_delete_parser.add_argument("-i", "--input_file_path", type=str, help="Path to the Excel file containing category names to delete.")
     category_delete_parser.add_argument("--name_column", type=str, default="name", help="Name of the name column. default is 'name'.")
 
+    # cleanup_category サブコマンド
+    category_cleanup_parser = subparsers.add_parser("cleanup_category", help="Delete categories not referenced by any document in the vector DB.")
+    category_cleanup_parser.add_argument("--dry_run", action="store_true", help="Only report the categories to delete without deleting them.")
+
+    # tune_index サブコマンド
+    tune_index_parser = subparsers.add_parser("tune_index", help="Measure recall and latency of HNSW parameters on the stored vectors.")
+    tune_index_parser.add_argument("-k", "--top_k", type=int, default=10, help="Number of neighbors used to compute recall@k.")
+    tune_index_parser.add_argument("-n", "--num_queries", type=int, default=100, help="Number of stored vectors sampled as queries.")
+    tune_index_parser.add_argument("--m", type=int, nargs="+", default=[16, 24, 32], help="Candidate values of HNSW M.")
+    tune_index_parser.add_argument("--construction_ef", type=int, nargs="+", default=[100, 200, 400], help="Candidate values of HNSW construction_ef.")
+    tune_index_parser.add_argument("--search_ef", type=int, nargs="+", default=[10, 50, 100, 200], help="Candidate values of HNSW search_ef.")
+
+    # audit_recall サブコマンド
+    audit_recall_parser = subparsers.add_parser("audit_recall", help="Measure recall of the HNSW index against exact search.")
+    audit_recall_parser.add_argument("-k", "--top_k", type=int, default=10, help="Number of neighbors used to compute recall@k.")
+    audit_recall_parser.add_argument("-n", "--num_queries", type=int, default=100, help="Number of stored vectors sampled as queries.")
+    audit_recall_parser.add_argument("--ef", type=int, default=None, help="HNSW ef applied to the audited searches. Uses the collection setting if omitted.")
+
+    # reembed サブコマンド
+    reembed_parser = subparsers.add_parser("reembed", help="Re-embed all documents into a new collection and switch to it when finished.")
+    reembed_parser.add_argument("--collection", type=str, default="", help="Target collection name. Defaults to {VECTOR_DB_COLLECTION_NAME}_{timestamp}.")
+    reembed_parser.add_argument("--model", type=str, default="", help="Embedding model. Uses the current setting if omitted.")
+    reembed_parser.add_argument("--dimensions", type=int, default=None, help="Embedding dimensions. Uses the current setting if omitted, 0 for the model default.")
+    reembed_parser.add_argument("--chunk_size", type=int, default=0, help="Chunk size. Uses the current setting if omitted.")
+    reembed_parser.add_argument("--batch_size", type=int, default=0, help="Number of documents embedded per checkpoint. Uses LOAD_BATCH_SIZE if omitted.")
+    reembed_parser.add_argument("--tokens_per_minute", type=int, default=0, help="Token rate limit of the migration. Uses REEMBED_TOKENS_PER_MINUTE if omitted.")
+    reembed_parser.add_argument("--resume", action="store_true", help="Resume the unfinished job of the same target collection.")
+
+    # reembed_status サブコマンド
+    reembed_status_parser = subparsers.add_parser("reembed_status", help="Show the progress of the reembed jobs.")
+
+    # snapshot サブコマンド
+    snapshot_parser = subparsers.add_parser("snapshot", help="Export or import the chunks with their vectors and the SQLite tables.")
+    snapshot_parser.add_argument("action", choices=["export", "import"], help="export: write a snapshot, import: load a snapshot without re-embedding.")
+    snapshot_parser.add_argument("path", type=str, help="Snapshot directory.")
+    snapshot_parser.add_argument("--page_size", type=int, default=1000, help="Number of chunks and table rows written per page on export.")
+    snapshot_parser.add_argument("--force", action="store_true", help="Import even if the embedding model or dimensions differ from the current settings.")
+
     # list_relation サブコマンド
     list_relation_parser = subparsers.add_parser("list_relation", help="List all relations in the vector DB.")
     # load_relation サブコマンド
@@ -109,6 +163,12 @@ async def main():
     
     args = parser.parse_args()
     print(f"Executing command: {args.command}")
+    if args.collection_name:
+        # 以降に作成するEmbeddingConfigは指定したコレクションを使用する
+        os.environ["VECTOR_DB_COLLECTION_NAME"] = args.collection_name
+
+    # 引数の解析(--help等)ではアプリの処理を読み込まない
+    import vector_search_util.core.app as app_module
 
     if args.command == "vector_search":
         query = args.query
@@ -119,7 +179,11 @@ async def main():
         category = args.category
         num_results = args.top_k
 
-        results = await app_module.vector_search(query=query, category=category, num_results=num_results)
+        results = await app_module.vector_search(
+            query=query, category=category, num_results=num_results, search_ef=args.ef, exact=args.exact,
+            fields=args.fields, include_content=args.include_content,
+            expand_category_depth=args.expand_category_depth, edge_types=args.edge_types, expand_direction=args.expand_direction,
+            mmr=args.mmr, fetch_k=args.fetch_k, lambda_mult=args.lambda_mult)
 
         # 結果出力
         print("\n=== Search Results ===")
@@ -140,7 +204,7 @@ async def main():
             sys.exit(1)
 
         condition_container = app_module.ConditionContainer.from_dict(conditions)
-        results = await app_module.metadata_search(conditions=condition_container)
+        results = await app_module.metadata_search(conditions=condition_container, fields=args.fields, include_content=args.include_content)
 
         # 結果出力
         print("\n=== Metadata Search Results ===")
@@ -162,7 +226,14 @@ async def main():
         category_column = args.category_column
         metadata_columns = args.metadata_columns
         append_vectors = args.append_vectors
-        await app_module.load_documents_from_excel(file_path, content_column, source_id_column, category_column, metadata_columns, append_vectors)
+        failures = await app_module.load_documents_from_excel(
+            file_path, content_column, source_id_column, category_column, metadata_columns, append_vectors,
+            resume=args.resume, retry_failed=args.retry_failed
+        )
+        if failures:
+            print("\n=== Failed Rows ===")
+            for failure in failures:
+                print(f"Row: {failure.row_num}, Source ID: {failure.source_id}, Error: {failure.error}")
 
     elif args.command == "unload_data":
         output_file = args.output_file
@@ -223,6 +294,52 @@ async def main():
         name_column = args.name_column
         await app_module.delete_category_data_from_excel(input_file_path, name_column)
 
+    elif args.command == "cleanup_category":
+        orphan_names = await app_module.cleanup_categories(dry_run=args.dry_run)
+        if args.dry_run:
+            print("\n=== Categories to be deleted (dry run) ===")
+        else:
+            print("\n=== Deleted Categories ===")
+        for i, name in enumerate(orphan_names, start=1):
+            print(f"[{i}] Name: {name}")
+
+    elif args.command == "tune_index":
+        results = await app_module.tune_index(
+            k=args.top_k, num_queries=args.num_queries,
+            m_values=args.m, construction_ef_values=args.construction_ef, search_ef_values=args.search_ef
+        )
+        print(f"{'M':>4} {'construction_ef':>15} {'search_ef':>9} {'recall@' + str(args.top_k):>10} {'p50(ms)':>8} {'p99(ms)':>8} {'build(s)':>8}")
+        for result in results:
+            print(f"{result.m:>4} {result.construction_ef:>15} {result.search_ef:>9} {result.recall:>10.4f} "
+                  f"{result.p50_latency_ms:>8.2f} {result.p99_latency_ms:>8.2f} {result.build_seconds:>8.2f}")
+
+    elif args.command == "audit_recall":
+        result = await app_module.audit_recall(k=args.top_k, num_queries=args.num_queries, search_ef=args.ef)
+        print(f"recall@{result.k}: {result.recall:.4f} (queries={result.num_queries}, ef={result.search_ef if result.search_ef is not None else 'collection'})")
+        print(f"p50 latency: exact={result.exact_p50_latency_ms:.2f}ms, hnsw={result.hnsw_p50_latency_ms:.2f}ms")
+
+    elif args.command == "reembed":
+        job = await app_module.reembed(
+            target_collection=args.collection, embedding_model=args.model, embedding_dimensions=args.dimensions,
+            chunk_size=args.chunk_size, batch_size=args.batch_size, tokens_per_minute=args.tokens_per_minute, resume=args.resume
+        )
+        print(f"Switched {job.name or '(default)'}: {job.source_collection} -> {job.target_collection} ({job.processed}/{job.total} documents)")
+
+    elif args.command == "reembed_status":
+        jobs = await app_module.get_reembed_jobs()
+        print("\n=== Reembed Jobs ===")
+        for i, job in enumerate(jobs, start=1):
+            print(f"[{i}] {job.source_collection} -> {job.target_collection}: {job.status} {job.processed}/{job.total} "
+                  f"(model={job.embedding_model}, dimensions={job.embedding_dimensions or 'default'}, chunk_size={job.chunk_size}, updated_at={job.updated_at})")
+
+    elif args.command == "snapshot":
+        if args.action == "export":
+            snapshot = await app_module.export_snapshot(args.path, args.page_size)
+        else:
+            snapshot = await app_module.import_snapshot(args.path, args.force)
+        print(f"{args.action.capitalize()}ed snapshot {args.path}: {snapshot.count} chunks "
+              f"(model={snapshot.embedding_model}, dimensions={snapshot.embedding_dimensions}), tables={snapshot.tables}")
+
     elif args.command == "list_relation":
         relations = await app_module.get_relations()
         print("\n=== Relations in Vector DB ===")
@@ -0,0 +1,49 @@
+"""
+metadataの格納とAPIレスポンスで使用するJSONのエンコード/デコード。
+orjsonがインストールされている場合はorjsonを、ない場合は標準ライブラリのjsonを使用する。
+どちらの場合も非ASCII文字はエスケープせずに出力する。
+"""
+import json
+from typing import Any
+
+try:
+    import orjson # type: ignore
+except ImportError:
+    orjson = None
+
+# dictのキーにstr以外(int等)を許容し、numpyの配列・スカラーもそのまま出力する
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    objをUTF-8のJSONに変換する。
+    :param obj: 変換するオブジェクト
+    :return: JSONのバイト列
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """
+    objをJSON文字列に変換する。
+    :param obj: 変換するオブジェクト
+    :return: JSON文字列
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: str | bytes | bytearray) -> Any:
+    """
+    JSON文字列(またはバイト列)をオブジェクトに変換する。
+    :param data: JSON文字列
+    :return: 変換したオブジェクト
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
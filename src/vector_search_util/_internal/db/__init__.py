@@ -1,15 +1,43 @@
-import os, json
+import os
 import aiosqlite
 import sqlite3
 import asyncio
+import itertools
+from datetime import datetime, timezone
+from typing import Optional, Any, Iterable, TYPE_CHECKING
 
-from vector_search_util.model import CategoryData, RelationData, TagData, SourceDocumentData, ConditionContainer
+from vector_search_util.model import (
+    CategoryData, RelationData, TagData, SourceDocumentData, ConditionContainer, LoadJobData, LoadFailureData,
+    CollectionAliasData, ReembedJobData, GraphNodeData, GraphDirection
+)
+import vector_search_util._internal.codec.json_codec as json_codec
+
+if TYPE_CHECKING:
+    from vector_search_util._internal.db.relation_graph import RelationGraph
 
 # sqlite3
 class SQLiteClient:
     initialized: bool = False 
-    def __init__(self, db_path: str):
+    # snapshotの対象とするテーブル
+    snapshot_tables: list[str] = ["documents", "categories", "relations", "tags", "conditions"]
+    # DBパスごとに既知のカテゴリ名・タグ名を保持するプロセス内キャッシュ。書き込み時に更新する
+    known_names: dict[str, dict[str, set[str]]] = {}
+    # DBパスごとの、known_namesを作成した時点のnames_versionのversion。
+    # 他プロセスの書き込みで値が変わった場合もキャッシュを読み直す
+    known_name_versions: dict[str, dict[str, int]] = {}
+    # DBパスごとのrelationsの隣接リストのキャッシュ。relationsの書き込み時に破棄する
+    relation_graphs: dict[str, "RelationGraph"] = {}
+    # DBパスごとの(カテゴリ, 辺の種別, 向き, ホップ数)をキーとするカテゴリの閉包のキャッシュ。relationsの書き込み時に破棄する
+    category_closures: dict[str, dict[tuple, list[str]]] = {}
+    # DBパスごとの、relationsのキャッシュを作成した時点のrelations_versionのversion。
+    # 他プロセスの書き込みで値が変わった場合もキャッシュを破棄する
+    relation_versions: dict[str, int] = {}
+    def __init__(self, db_path: str, relation_graph_cache: bool = False):
+        """
+        :param relation_graph_cache: Trueの場合、グラフ探索にプロセス内の隣接リストのキャッシュを使用する
+        """
         self.db_path = db_path
+        self.relation_graph_cache = relation_graph_cache
         self.lock = asyncio.Lock()
         if not SQLiteClient.initialized:
             dirname = os.path.dirname(self.db_path)
@@ -17,8 +45,12 @@ class SQLiteClient:
                 os.makedirs(dirname)
             self.__create_categories_table__()
             self.__create_tags_table__()
+            self.__create_names_version_table__()
             self.__create_relations_table__()
             self.__create_source_documents_table__()
+            self.__create_conditions_table__()
+            self.__create_load_journal_tables__()
+            self.__create_reembed_tables__()
             SQLiteClient.initialized = True
     
     def __create_source_documents_table__(self):
@@ -62,6 +94,26 @@ class SQLiteClient:
                     FOREIGN KEY (to_node) REFERENCES categories(name)
                 )
             ''')
+            # to_node側からたどる探索(in)用のインデックス。from_node側は主キーのインデックスを使う
+            cur.execute('''
+                CREATE INDEX IF NOT EXISTS relations_to_node ON relations (to_node, edge_type)
+            ''')
+            # relationsへの書き込みごとに増える版数。プロセス内のグラフのキャッシュの検証に使う。
+            # 書き込み経路(一括書き込み、snapshotの復元、他プロセス)によらず更新されるようトリガーで増やす
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS relations_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    version INTEGER NOT NULL
+                )
+            ''')
+            cur.execute("INSERT OR IGNORE INTO relations_version (id, version) VALUES (0, 0)")
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cur.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS relations_version_{event.lower()} AFTER {event} ON relations
+                    BEGIN
+                        UPDATE relations_version SET version = version + 1 WHERE id = 0;
+                    END
+                ''')
             conn.commit()
 
     def __create_tags_table__(self):
@@ -78,6 +130,28 @@ class SQLiteClient:
             ''')
             conn.commit()
 
+    def __create_names_version_table__(self):
+        # categories、tagsへの書き込みごとに増えるテーブルごとの版数。プロセス内の既知の名前のキャッシュの検証に使う。
+        # 書き込み経路(一括書き込み、snapshotの復元、他プロセス)によらず更新されるようトリガーで増やす
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS names_version (
+                    table_name TEXT NOT NULL PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            ''')
+            for table in ("categories", "tags"):
+                cur.execute("INSERT OR IGNORE INTO names_version (table_name, version) VALUES (?, 0)", (table,))
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    cur.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE names_version SET version = version + 1 WHERE table_name = '{table}';
+                        END
+                    ''')
+            conn.commit()
+
     def __create_conditions_table__(self):
         # ConditionContainer用のテーブルを作成する
         with sqlite3.connect(self.db_path) as conn:
@@ -91,6 +165,71 @@ class SQLiteClient:
             ''')
             conn.commit()
 
+    # load_dataの進捗を記録するジャーナル用のテーブル
+    def __create_load_journal_tables__(self):
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS load_jobs (
+                    job_id TEXT NOT NULL PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    file_fingerprint TEXT NOT NULL,
+                    total_rows INTEGER NOT NULL,
+                    batch_size INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS load_batches (
+                    job_id TEXT NOT NULL,
+                    batch_index INTEGER NOT NULL,
+                    completed_at TEXT NOT NULL,
+                    PRIMARY KEY (job_id, batch_index)
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS load_failures (
+                    job_id TEXT NOT NULL,
+                    row_num INTEGER NOT NULL,
+                    source_id TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, row_num)
+                )
+            ''')
+            conn.commit()
+
+    def __create_reembed_tables__(self):
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            # VECTOR_DB_COLLECTION_NAMEの値から実際に使用するコレクションへの別名
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS collection_aliases (
+                    name TEXT NOT NULL PRIMARY KEY,
+                    collection_name TEXT NOT NULL,
+                    embedding_model TEXT NOT NULL,
+                    embedding_dimensions INTEGER,
+                    chunk_size INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS reembed_jobs (
+                    target_collection TEXT NOT NULL PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    source_collection TEXT NOT NULL,
+                    embedding_model TEXT NOT NULL,
+                    embedding_dimensions INTEGER,
+                    chunk_size INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    processed INTEGER NOT NULL,
+                    last_source_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            conn.commit()
+
     def get_content_by_source_id(self, source_id: str) -> str :
         query = "SELECT source_content FROM documents WHERE source_id = ?"
         with sqlite3.connect(self.db_path) as conn:
@@ -116,7 +255,7 @@ class SQLiteClient:
                 rows = await cur.fetchall()
                 documents = []
                 for row in rows:
-                    metadata_dict = json.loads(row[2]) if row[2] else {}
+                    metadata_dict = json_codec.loads(row[2]) if row[2] else {}
                     doc = SourceDocumentData(
                         source_id=row[0],
                         source_content=row[1],
@@ -125,6 +264,25 @@ class SQLiteClient:
                     documents.append(doc)
                 return documents
 
+    async def get_source_documents_page(self, after_source_id: str = "", limit: int = 100) -> list[SourceDocumentData]:
+        """source_idの昇順で、after_source_idより後のドキュメントをlimit件返す。"""
+        query = "SELECT source_id, source_content, metadata FROM documents WHERE source_id > ? ORDER BY source_id LIMIT ?"
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (after_source_id, limit))
+                rows = await cur.fetchall()
+                return [
+                    SourceDocumentData(source_id=row[0], source_content=row[1], metadata=json_codec.loads(row[2]) if row[2] else {})
+                    for row in rows
+                ]
+
+    async def count_source_documents(self, after_source_id: str = "") -> int:
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT count(*) FROM documents WHERE source_id > ?", (after_source_id,))
+                row = await cur.fetchone()
+                return int(row[0]) if row else 0
+
     async def upsert_source_documents(self, documents: list[SourceDocumentData]):
         async with self.lock:
             async with aiosqlite.connect(self.db_path) as conn:
@@ -139,7 +297,7 @@ class SQLiteClient:
                         (
                             doc.source_id, 
                             doc.source_content, 
-                            json.dumps(doc.metadata, ensure_ascii=False) if doc.metadata else None
+                            json_codec.dumps(doc.metadata) if doc.metadata else None
                         ) 
                         for doc in documents
                     ])
@@ -162,22 +320,55 @@ class SQLiteClient:
                         DELETE FROM documents
                     ''')
                 await conn.commit()
-    async def get_categories(self, names: list[str] = [], conditions: ConditionContainer = ConditionContainer()) -> list[CategoryData]:
-        if names:
-            conditions.add_in_condition("name", names)
-
-
-        query = "SELECT name, description, metadata FROM categories"
-        conditions_sql = conditions.to_sqlite_sql()
-        if conditions_sql:
-            query += " WHERE " + conditions_sql
+    def __build_where__(
+            self, column_values: list[tuple[str, list[str]]], conditions: Optional[ConditionContainer] = None
+            ) -> tuple[str, list[Any]]:
+        # 名前などの絞り込みはカラム、ConditionContainerはmetadataカラムのJSONに対する条件とする
+        clauses: list[str] = []
+        params: list[Any] = []
+        for column, values in column_values:
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+        sql_conditions = conditions.to_sqlite_sql("metadata") if conditions is not None else ""
+        if sql_conditions:
+            clauses.append(sql_conditions)
+        return " AND ".join(clauses), params
 
+    async def __select_rows__(
+            self, table: str, columns: list[str], key_columns: list[str], where_sql: str, params: list[Any],
+            after: tuple[Any, ...] = (), limit: int = 0
+            ) -> list[tuple]:
+        # key_columnsの昇順で、afterより後の行をlimit件返す(キーセットページング)。limitが0の場合は全件
+        clauses = [where_sql] if where_sql else []
+        params = list(params)
+        if after:
+            clauses.append(f"({', '.join(key_columns)}) > ({', '.join('?' for _ in key_columns)})")
+            params.extend(after)
+        query = f"SELECT {', '.join(columns)} FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY {', '.join(key_columns)}"
+        if limit > 0:
+            query += " LIMIT ?"
+            params.append(limit)
         async with aiosqlite.connect(self.db_path) as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query)
-                rows = await cur.fetchall()
-                categories = [CategoryData(name=row[0], description=row[1], metadata=json.loads(row[2]) if row[2] else {}) for row in rows]
-                return categories
+            async with conn.execute(query, params) as cur:
+                return list(await cur.fetchall())
+
+    async def get_categories(
+            self, names: list[str] = [], conditions: ConditionContainer = ConditionContainer(),
+            after: str = "", limit: int = 0
+            ) -> list[CategoryData]:
+        """
+        nameの昇順でカテゴリを返す。
+        :param after: limitを指定した場合、このnameより後のカテゴリを返す
+        :param limit: 0より大きい場合、limit件返す
+        """
+        where_sql, params = self.__build_where__([("name", names)], conditions)
+        rows = await self.__select_rows__(
+            "categories", ["name", "description", "metadata"], ["name"], where_sql, params, (after,) if after else (), limit)
+        return [CategoryData(name=row[0], description=row[1], metadata=json_codec.loads(row[2]) if row[2] else {}) for row in rows]
 
     async def delete_categories(self, names: list[str]):
         async with self.lock:
@@ -187,6 +378,7 @@ class SQLiteClient:
                         DELETE FROM categories WHERE name = ?
                     ''', [(name,) for name in names])
                 await conn.commit()
+            self.__discard_known_names__("categories", names)
 
     async def upsert_categories(self, category_list: list[CategoryData]):
         async with self.lock:
@@ -196,8 +388,9 @@ class SQLiteClient:
                         INSERT INTO categories (name, description, metadata)
                         VALUES (?, ?, ?)
                         ON CONFLICT(name) DO UPDATE SET description=excluded.description, metadata=excluded.metadata
-                    ''', [(category.name, category.description, json.dumps(category.metadata, ensure_ascii=False) if category.metadata else None) for category in category_list])
+                    ''', [(category.name, category.description, json_codec.dumps(category.metadata) if category.metadata else None) for category in category_list])
                 await conn.commit()
+            self.__add_known_names__("categories", [category.name for category in category_list])
     
     async def delete_all_categories(self):
         async with self.lock:
@@ -207,40 +400,47 @@ class SQLiteClient:
                     DELETE FROM categories
                 ''')
                 await conn.commit()
+            self.__clear_known_names__("categories")
 
     async def upsert_new_categories(self, data_list_category_names_set: set[str]):
-        existing_category_names_set = set([category.name for category in await self.get_categories()])
-        new_category_names_set = data_list_category_names_set - existing_category_names_set
-        new_categories = [CategoryData(name=category_name, description="", metadata={}) for category_name in new_category_names_set]
-        if new_categories:
-            await self.upsert_categories(new_categories)
+        await self.upsert_new_categories_and_tags(data_list_category_names_set, set())
 
     # relations関連
     async def get_relations(
             self, 
             from_nodes: list[str] = [], 
             to_nodes: list[str] = [], edge_types: list[str] = [],
-            conditions: ConditionContainer = ConditionContainer()
+            conditions: ConditionContainer = ConditionContainer(),
+            after: tuple[str, ...] = (), limit: int = 0
             ) -> list[RelationData]:
+        """
+        主キー(from_node, to_node, edge_type)の昇順でリレーションを返す。
+        :param after: limitを指定した場合、この主キーより後のリレーションを返す
+        :param limit: 0より大きい場合、limit件返す
+        """
+        where_sql, params = self.__build_where__(
+            [("from_node", from_nodes), ("to_node", to_nodes), ("edge_type", edge_types)], conditions)
+        rows = await self.__select_rows__(
+            "relations", ["from_node", "to_node", "edge_type", "metadata"], ["from_node", "to_node", "edge_type"],
+            where_sql, params, after, limit)
+        return [RelationData(from_node=row[0], to_node=row[1], edge_type=row[2], metadata=json_codec.loads(row[3]) if row[3] else {}) for row in rows]
 
-        if from_nodes:
-            conditions.add_in_condition("from_node", from_nodes)
-        if to_nodes:
-            conditions.add_in_condition("to_node", to_nodes)
-        if edge_types:
-            conditions.add_in_condition("edge_type", edge_types)
-        query = "SELECT from_node, to_node, edge_type, metadata FROM relations"
-
-        sql_conditions = conditions.to_sqlite_sql()
-        if sql_conditions:
-            query += " WHERE " + sql_conditions
-
-        async with aiosqlite.connect(self.db_path) as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, tuple(param for param in from_nodes + to_nodes + edge_types if param))
-                rows = await cur.fetchall()
-                relations = [RelationData(from_node=row[0], to_node=row[1], edge_type=row[2], metadata=json.loads(row[3]) if row[3] else {}) for row in rows]
-                return relations
+    async def iter_relations(
+            self,
+            from_nodes: list[str] = [],
+            to_nodes: list[str] = [], edge_types: list[str] = [],
+            conditions: ConditionContainer = ConditionContainer(),
+            page_size: int = 1000
+            ):
+        """条件に一致するリレーションを主キーの昇順でpage_size件ずつ返す。"""
+        after: tuple[str, ...] = ()
+        while True:
+            relations = await self.get_relations(from_nodes, to_nodes, edge_types, conditions, after, page_size)
+            if relations:
+                yield relations
+            if len(relations) < page_size:
+                break
+            after = (relations[-1].from_node, relations[-1].to_node, relations[-1].edge_type)
 
     async def upsert_relations(self, relations: list[RelationData]):
     
@@ -251,8 +451,9 @@ class SQLiteClient:
                         INSERT INTO relations (from_node, to_node, edge_type, metadata)
                         VALUES (?, ?, ?, ?)
                         ON CONFLICT(from_node, to_node, edge_type) DO UPDATE SET metadata=excluded.metadata
-                    ''', [(relation.from_node, relation.to_node, relation.edge_type, json.dumps(relation.metadata, ensure_ascii=False) if relation.metadata else None) for relation in relations if relation.is_valid()])
+                    ''', [(relation.from_node, relation.to_node, relation.edge_type, json_codec.dumps(relation.metadata) if relation.metadata else None) for relation in relations if relation.is_valid()])
                 await conn.commit()
+            self.__clear_relation_caches__()
 
     async def delete_relations(self, relations: list[RelationData]):
         async with self.lock:
@@ -262,6 +463,7 @@ class SQLiteClient:
                         DELETE FROM relations WHERE from_node = ? AND to_node = ? AND edge_type = ?
                     ''', [(relation.from_node, relation.to_node, relation.edge_type) for relation in relations])
                 await conn.commit()
+            self.__clear_relation_caches__()
 
     async def delete_all_relations(self):
         async with self.lock:
@@ -271,21 +473,271 @@ class SQLiteClient:
                         DELETE FROM relations
                     ''')
                 await conn.commit()
+            self.__clear_relation_caches__()
 
-    async def get_tags(self, names: list[str]) -> list[TagData]:
-        conditions = []
-        if names:
-            conditions.append("name IN ({})".format(",".join("?" * len(names))))
-        query = "SELECT name, description, metadata FROM tags"
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+    # 一括書き込み
+    async def __bulk_upsert__(
+            self, table: str, columns: list[str], key_columns: list[str], rows: Iterable[tuple[int, tuple]],
+            batch_size: int = 5000, staging: bool = False
+            ) -> tuple[int, list[tuple[int, Exception]]]:
+        """
+        rowsをbatch_size行ずつexecutemanyで書き込む。1つの接続で、batch_size行ごとに1トランザクションとする。
+        rowsは逐次読み込み、batch_size行を超えて保持しない。主キーが重複する行は後の行で上書きする。
+        バッチの書き込みに失敗した場合は、失敗した行を特定するためバッチを1行ずつ書き込み直す。
+        :param rows: (行番号, 行の値)のイテレータ
+        :param staging: Trueの場合、一時テーブルに全行を書き込んでから INSERT ... SELECT で1トランザクションで反映する
+        :return: 書き込んだ行数と、失敗した行の(行番号, 例外)のリスト。
+            stagingの場合、失敗時は例外を送出する
+        """
+        batch_size = max(1, batch_size)
+        column_sql = ", ".join(columns)
+        update_sql = ", ".join(f"{column}=excluded.{column}" for column in columns if column not in key_columns)
+        conflict_sql = f"ON CONFLICT({', '.join(key_columns)}) DO UPDATE SET {update_sql}"
+        staging_table = f"temp.staging_{table}"
+        target_table = staging_table if staging else table
+        insert_sql = f"INSERT INTO {target_table} ({column_sql}) VALUES ({', '.join('?' for _ in columns)})"
+        if not staging:
+            insert_sql += " " + conflict_sql
+
+        count = 0
+        failures: list[tuple[int, Exception]] = []
+        iterator = iter(rows)
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path, isolation_level=None) as conn:
+                if staging:
+                    await conn.execute(f"DROP TABLE IF EXISTS {staging_table}")
+                    await conn.execute(f"CREATE TABLE {staging_table} AS SELECT {column_sql} FROM {table} WHERE 0")
+                while True:
+                    batch = list(itertools.islice(iterator, batch_size))
+                    if not batch:
+                        break
+                    await conn.execute("BEGIN IMMEDIATE" if not staging else "BEGIN")
+                    try:
+                        await conn.executemany(insert_sql, [row for _, row in batch])
+                        await conn.execute("COMMIT")
+                    except Exception:
+                        await conn.execute("ROLLBACK")
+                        if staging:
+                            raise
+                        for row_num, row in batch:
+                            await conn.execute("BEGIN IMMEDIATE")
+                            try:
+                                await conn.execute(insert_sql, row)
+                                await conn.execute("COMMIT")
+                            except Exception as e:
+                                await conn.execute("ROLLBACK")
+                                failures.append((row_num, e))
+                    count += len(batch)
+                if staging:
+                    # 一時テーブルへの書き込み順(rowid)に反映し、重複する主キーは後の行で上書きする
+                    await conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        await conn.execute(
+                            f"INSERT INTO {table} ({column_sql}) SELECT {column_sql} FROM {staging_table} WHERE true ORDER BY rowid {conflict_sql}")
+                        await conn.execute("COMMIT")
+                    except Exception:
+                        await conn.execute("ROLLBACK")
+                        raise
+                    finally:
+                        await conn.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        return count, failures
+
+    async def bulk_upsert_categories(
+            self, categories: Iterable[CategoryData], batch_size: int = 5000, staging: bool = False, numbered: bool = False
+            ) -> tuple[int, list[tuple[int, Exception]]]:
+        """
+        カテゴリを一括で書き込む。引数と戻り値は__bulk_upsert__を参照
+        :param numbered: Trueの場合、categoriesは(行番号, カテゴリ)のタプルとして扱う。Falseの場合の行番号は0始まりの番号
+        """
+        entries: Iterable[tuple[int, CategoryData]] = categories if numbered else enumerate(categories) # type: ignore
+        rows = (
+            (row_num, (category.name, category.description, json_codec.dumps(category.metadata) if category.metadata else None))
+            for row_num, category in entries
+        )
+        result = await self.__bulk_upsert__("categories", ["name", "description", "metadata"], ["name"], rows, batch_size, staging)
+        self.__clear_known_names__("categories")
+        return result
+
+    async def bulk_upsert_relations(
+            self, relations: Iterable[RelationData], batch_size: int = 5000, staging: bool = False, numbered: bool = False
+            ) -> tuple[int, list[tuple[int, Exception]]]:
+        """
+        リレーションを一括で書き込む。空文字のフィールドを含むリレーションは書き込まない
+        :param numbered: Trueの場合、relationsは(行番号, リレーション)のタプルとして扱う。
+            Falseの場合の行番号は空文字のフィールドを含むリレーションを除いた0始まりの番号
+        """
+        entries: Iterable[tuple[int, RelationData]] = (
+            relations if numbered else enumerate(relation for relation in relations if relation.is_valid()) # type: ignore
+        )
+        rows = (
+            (row_num, (relation.from_node, relation.to_node, relation.edge_type, json_codec.dumps(relation.metadata) if relation.metadata else None))
+            for row_num, relation in entries if relation.is_valid()
+        )
+        try:
+            return await self.__bulk_upsert__(
+                "relations", ["from_node", "to_node", "edge_type", "metadata"], ["from_node", "to_node", "edge_type"], rows, batch_size, staging)
+        finally:
+            self.__clear_relation_caches__()
+
+    async def bulk_upsert_tags(
+            self, tags: Iterable[TagData], batch_size: int = 5000, staging: bool = False, numbered: bool = False
+            ) -> tuple[int, list[tuple[int, Exception]]]:
+        """
+        タグを一括で書き込む。引数と戻り値は__bulk_upsert__を参照
+        :param numbered: Trueの場合、tagsは(行番号, タグ)のタプルとして扱う。Falseの場合の行番号は0始まりの番号
+        """
+        entries: Iterable[tuple[int, TagData]] = tags if numbered else enumerate(tags) # type: ignore
+        rows = (
+            (row_num, (tag.name, tag.description, json_codec.dumps(tag.metadata) if tag.metadata else None))
+            for row_num, tag in entries
+        )
+        result = await self.__bulk_upsert__("tags", ["name", "description", "metadata"], ["name"], rows, batch_size, staging)
+        self.__clear_known_names__("tags")
+        return result
+
+    # relationsのグラフ探索
+    @staticmethod
+    def __walk_step__(direction: GraphDirection) -> tuple[str, str]:
+        # 再帰CTEでwalkの行wから辺rをたどる際の結合条件と、たどった先のノード
+        if direction == "out":
+            return "r.from_node = w.node", "r.to_node"
+        if direction == "in":
+            return "r.to_node = w.node", "r.from_node"
+        if direction == "both":
+            return "(r.from_node = w.node OR r.to_node = w.node)", "CASE WHEN r.from_node = w.node THEN r.to_node ELSE r.from_node END"
+        raise ValueError(f"Invalid direction: {direction}")
 
+    def __clear_relation_caches__(self):
+        SQLiteClient.relation_graphs.pop(self.db_path, None)
+        SQLiteClient.category_closures.pop(self.db_path, None)
+        SQLiteClient.relation_versions.pop(self.db_path, None)
+
+    async def __validate_relation_caches__(self):
+        # キャッシュの作成後にrelationsが書き込まれていれば(他プロセスの書き込みを含む)キャッシュを破棄する。
+        # キャッシュの作成中に書き込まれた場合は次回の呼び出しで破棄されるよう、読み込み前の版数を記録する
         async with aiosqlite.connect(self.db_path) as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, tuple(names))
+            async with conn.execute("SELECT version FROM relations_version WHERE id = 0") as cur:
+                row = await cur.fetchone()
+        version = row[0] if row else 0
+        if SQLiteClient.relation_versions.get(self.db_path) != version:
+            self.__clear_relation_caches__()
+            SQLiteClient.relation_versions[self.db_path] = version
+
+    async def __get_relation_graph__(self) -> "RelationGraph":
+        # relationsが書き込まれた後の初回のみrelationsの全行を読み込んで隣接リストを作る
+        from vector_search_util._internal.db.relation_graph import RelationGraph
+        await self.__validate_relation_caches__()
+        graph = SQLiteClient.relation_graphs.get(self.db_path)
+        if graph is None:
+            graph = RelationGraph(await self.get_relations())
+            SQLiteClient.relation_graphs[self.db_path] = graph
+        return graph
+
+    async def get_related_nodes(
+            self, start_nodes: list[str], edge_types: list[str] = [], direction: GraphDirection = "both", max_depth: int = 1
+            ) -> list[GraphNodeData]:
+        """
+        起点のノードからリレーションをmax_depthホップまでたどって到達したノードを、ホップ数、ノード名の順に返す。
+        起点のノードは含めない。
+        :param edge_types: たどる辺の種別。空の場合はすべて
+        :param direction: たどる向き。outは子孫、inは祖先、bothはk-hop近傍
+        """
+        edge_sql, edge_params = self.__build_where__([("r.edge_type", edge_types)])
+        join_sql, next_node = self.__walk_step__(direction)
+        if not start_nodes or max_depth <= 0:
+            return []
+        if self.relation_graph_cache:
+            graph = await self.__get_relation_graph__()
+            return graph.get_related_nodes(start_nodes, edge_types, direction, max_depth)
+        # (node, depth)をUNIONで重複除去するため、循環があってもmax_depthで停止する
+        query = f'''
+            WITH RECURSIVE walk(node, depth) AS (
+                SELECT value, 0 FROM json_each(?)
+                UNION
+                SELECT {next_node}, w.depth + 1 FROM walk w JOIN relations r ON {join_sql}
+                WHERE w.depth < ?{" AND " + edge_sql if edge_sql else ""}
+            )
+            SELECT node, MIN(depth) AS min_depth FROM walk GROUP BY node HAVING min_depth > 0 ORDER BY min_depth, node
+        '''
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(query, [json_codec.dumps(start_nodes), max_depth, *edge_params]) as cur:
                 rows = await cur.fetchall()
-                tags = [TagData(name=row[0], description=row[1], metadata=json.loads(row[2]) if row[2] else {}) for row in rows]
-                return tags
+        return [GraphNodeData(node=row[0], depth=row[1]) for row in rows]
+
+    async def get_category_closure(
+            self, category: str, edge_types: list[str] = [], direction: GraphDirection = "out", max_depth: int = 1
+            ) -> list[str]:
+        """
+        categoryと、categoryからリレーションをmax_depthホップまでたどって到達したカテゴリ名を返す。
+        結果はrelationsの書き込み(他プロセスの書き込みを含む)までプロセス内にキャッシュする。
+        """
+        await self.__validate_relation_caches__()
+        closures = SQLiteClient.category_closures.setdefault(self.db_path, {})
+        key = (category, tuple(sorted(edge_types)), direction, max_depth)
+        if key not in closures:
+            related_nodes = await self.get_related_nodes([category], edge_types, direction, max_depth)
+            closures[key] = [category] + [related.node for related in related_nodes]
+        return closures[key]
+
+    async def get_shortest_path(
+            self, from_node: str, to_node: str, edge_types: list[str] = [], direction: GraphDirection = "out", max_depth: int = 10
+            ) -> list[RelationData]:
+        """
+        from_nodeからto_nodeまでの最短経路のリレーションを経路の順に返す。max_depthホップ以内に経路がない場合は空のリスト
+        :param edge_types: たどる辺の種別。空の場合はすべて
+        :param direction: たどる向き。bothの場合はリレーションの向きを無視する
+        """
+        edge_sql, edge_params = self.__build_where__([("r.edge_type", edge_types)])
+        join_sql, next_node = self.__walk_step__(direction)
+        if from_node == to_node or max_depth <= 0:
+            return []
+        if self.relation_graph_cache:
+            graph = await self.__get_relation_graph__()
+            return graph.get_shortest_path(from_node, to_node, edge_types, direction, max_depth)
+        # 1ホップずつ幅優先でたどり、to_nodeに到達した時点で打ち切る。
+        # 各ノードには最初に到達したホップで、(from_node, to_node, edge_type)の順で最初の辺を記録する
+        query = f'''
+            SELECT {next_node}, r.from_node, r.to_node, r.edge_type, r.metadata
+            FROM (SELECT value AS node FROM json_each(?)) w JOIN relations r ON {join_sql}
+            {"WHERE " + edge_sql if edge_sql else ""}
+            ORDER BY r.from_node, r.to_node, r.edge_type
+        '''
+        parents: dict[str, tuple] = {}
+        visited = {from_node}
+        frontier = [from_node]
+        async with aiosqlite.connect(self.db_path) as conn:
+            for _ in range(max_depth):
+                async with conn.execute(query, [json_codec.dumps(frontier), *edge_params]) as cur:
+                    rows = await cur.fetchall()
+                frontier = []
+                for row in rows:
+                    if row[0] not in visited:
+                        visited.add(row[0])
+                        parents[row[0]] = row
+                        frontier.append(row[0])
+                if to_node in parents or not frontier:
+                    break
+        if to_node not in parents:
+            return []
+        # to_nodeから起点に向かってたどる
+        path: list[RelationData] = []
+        current = to_node
+        while current != from_node:
+            row = parents[current]
+            path.append(RelationData(from_node=row[1], to_node=row[2], edge_type=row[3], metadata=json_codec.loads(row[4]) if row[4] else {}))
+            current = row[1] if row[2] == current else row[2]
+        return list(reversed(path))
+
+    async def get_tags(self, names: list[str] = [], after: str = "", limit: int = 0) -> list[TagData]:
+        """
+        nameの昇順でタグを返す。
+        :param after: limitを指定した場合、このnameより後のタグを返す
+        :param limit: 0より大きい場合、limit件返す
+        """
+        where_sql, params = self.__build_where__([("name", names)])
+        rows = await self.__select_rows__(
+            "tags", ["name", "description", "metadata"], ["name"], where_sql, params, (after,) if after else (), limit)
+        return [TagData(name=row[0], description=row[1], metadata=json_codec.loads(row[2]) if row[2] else {}) for row in rows]
         
     async def upsert_tags(self, tag_list: list[TagData]):
         async with self.lock:
@@ -295,8 +747,9 @@ class SQLiteClient:
                         INSERT INTO tags (name, description, metadata)
                         VALUES (?, ?, ?)
                         ON CONFLICT(name) DO UPDATE SET description=excluded.description, metadata=excluded.metadata
-                    ''', [(tag.name, tag.description, json.dumps(tag.metadata, ensure_ascii=False) if tag.metadata else None) for tag in tag_list])
+                    ''', [(tag.name, tag.description, json_codec.dumps(tag.metadata) if tag.metadata else None) for tag in tag_list])
                 await conn.commit()
+            self.__add_known_names__("tags", [tag.name for tag in tag_list])
 
     async def delete_tags(self, names: list[str]):
         async with self.lock:
@@ -306,6 +759,7 @@ class SQLiteClient:
                         DELETE FROM tags WHERE name = ?
                     ''', [(name,) for name in names])
                 await conn.commit()
+            self.__discard_known_names__("tags", names)
 
     async def delete_all_tags(self):
         async with self.lock:
@@ -315,36 +769,91 @@ class SQLiteClient:
                         DELETE FROM tags
                     ''')
                 await conn.commit()
+            self.__clear_known_names__("tags")
 
     async def upsert_new_tags(self, data_list_metadata_keys_set: set[str]):
-        existing = {t.name for t in await self.get_tags(list(data_list_metadata_keys_set))}
-        new_names = data_list_metadata_keys_set - existing
-        new_tags = [TagData(name=n, description="", metadata={}) for n in new_names]
-        if new_tags:
-            await self.upsert_tags(new_tags)
+        await self.upsert_new_categories_and_tags(set(), data_list_metadata_keys_set)
+
+    # 既知のカテゴリ名・タグ名のキャッシュ関連
+    @staticmethod
+    async def __read_names_version__(conn: aiosqlite.Connection, table: str) -> int:
+        async with conn.execute("SELECT version FROM names_version WHERE table_name = ?", (table,)) as cur:
+            row = await cur.fetchone()
+        return row[0] if row else 0
+
+    async def __get_known_names__(self, conn: aiosqlite.Connection, table: str) -> set[str]:
+        # キャッシュの作成後にテーブルが書き込まれていれば(他プロセスの削除を含む)名前を読み直す。
+        # 読み込み中に書き込まれた場合は次回の呼び出しで読み直されるよう、読み込み前の版数を記録する
+        version = await self.__read_names_version__(conn, table)
+        names_by_table = SQLiteClient.known_names.setdefault(self.db_path, {})
+        versions_by_table = SQLiteClient.known_name_versions.setdefault(self.db_path, {})
+        if table not in names_by_table or versions_by_table.get(table) != version:
+            async with conn.execute(f"SELECT name FROM {table}") as cur:
+                rows = await cur.fetchall()
+            names_by_table[table] = {row[0] for row in rows}
+            versions_by_table[table] = version
+        return names_by_table[table]
+
+    def __add_known_names__(self, table: str, names: list[str]):
+        known = SQLiteClient.known_names.get(self.db_path, {}).get(table)
+        if known is not None:
+            known.update(names)
+
+    def __discard_known_names__(self, table: str, names: list[str]):
+        known = SQLiteClient.known_names.get(self.db_path, {}).get(table)
+        if known is not None:
+            known.difference_update(names)
+
+    def __clear_known_names__(self, table: str):
+        SQLiteClient.known_names.get(self.db_path, {}).pop(table, None)
+        SQLiteClient.known_name_versions.get(self.db_path, {}).pop(table, None)
+
+    async def upsert_new_categories_and_tags(self, category_names: set[str], tag_names: set[str]):
+        """
+        未登録のカテゴリ名・タグ名を1トランザクションで登録する。
+        既知の名前はキャッシュで判定し、既存の説明・metadataは上書きしない。
+        """
+        async with aiosqlite.connect(self.db_path) as conn:
+            new_category_names = category_names - await self.__get_known_names__(conn, "categories")
+            new_tag_names = tag_names - await self.__get_known_names__(conn, "tags")
+        if not new_category_names and not new_tag_names:
+            return
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                # 書き込みロックを取ってから版数を読み、キャッシュの検証後に他プロセスが削除した名前も登録し直す
+                await conn.execute("BEGIN IMMEDIATE")
+                for table, names in (("categories", category_names), ("tags", tag_names)):
+                    new_names = names - await self.__get_known_names__(conn, table)
+                    await conn.executemany(f'''
+                        INSERT INTO {table} (name, description, metadata)
+                        VALUES (?, '', NULL)
+                        ON CONFLICT(name) DO NOTHING
+                    ''', [(name,) for name in new_names])
+                    # 自身の書き込みによる版数の増加はキャッシュに反映済みとする
+                    SQLiteClient.known_name_versions[self.db_path][table] = await self.__read_names_version__(conn, table)
+                    self.__add_known_names__(table, list(new_names))
+                await conn.commit()
 
     async def get_conditions(
         self, name_list: list[str] = [], 
-        conditions: ConditionContainer = ConditionContainer()
+        conditions: ConditionContainer = ConditionContainer(),
+        after: str = "", limit: int = 0
         ) -> list[ConditionContainer]:
-        
-        query = "SELECT name, condition_data, metadata FROM conditions"
-        if name_list:
-            conditions.add_in_condition("name", name_list)
-        sql_conditions = conditions.to_sqlite_sql()
-        if sql_conditions:
-            query += " WHERE " + sql_conditions
-
+        """
+        nameの昇順で検索条件を返す。
+        :param after: limitを指定した場合、このnameより後の検索条件を返す
+        :param limit: 0より大きい場合、limit件返す
+        """
+        where_sql, params = self.__build_where__([("name", name_list)], conditions)
+        rows = await self.__select_rows__(
+            "conditions", ["name", "condition_data", "metadata"], ["name"], where_sql, params, (after,) if after else (), limit)
         results = []
-        async with aiosqlite.connect(self.db_path) as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, tuple(name_list))
-                rows = await cur.fetchall()
-                for row in rows:
-                    condition_data = json.loads(row[1])
-                    metadata = json.loads(row[2]) if row[2] else {}
-                    condition_container = ConditionContainer(name=row[0], **condition_data, metadata=metadata)
-                    results.append(condition_container)
+        for row in rows:
+            condition_data = json_codec.loads(row[1])
+            metadata = json_codec.loads(row[2]) if row[2] else {}
+            # condition_dataにはmetadataも含まれるため、metadataカラムの値で上書きする
+            condition_container = ConditionContainer(**{**condition_data, "name": row[0], "metadata": metadata})
+            results.append(condition_container)
         return results
 
 
@@ -356,7 +865,7 @@ class SQLiteClient:
                         INSERT INTO conditions (name, condition_data, metadata)
                         VALUES (?, ?, ?)
                         ON CONFLICT(name) DO UPDATE SET condition_data=excluded.condition_data, metadata=excluded.metadata
-                    ''', [(condition.name, json.dumps(condition.model_dump(exclude={"name"}), ensure_ascii=False), json.dumps(condition.metadata, ensure_ascii=False) if condition.metadata else None) for condition in conditions])
+                    ''', [(condition.name, json_codec.dumps(condition.model_dump(exclude={"name"})), json_codec.dumps(condition.metadata) if condition.metadata else None) for condition in conditions])
                 await conn.commit()
     
     async def delete_conditions(self, names: list[str]):
@@ -376,3 +885,246 @@ class SQLiteClient:
                         DELETE FROM conditions
                     ''')
                 await conn.commit()
+
+
+    # load_journal関連
+    async def get_load_job(self, job_id: str) -> Optional[LoadJobData]:
+        query = "SELECT job_id, file_path, file_fingerprint, total_rows, batch_size, status, updated_at FROM load_jobs WHERE job_id = ?"
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, (job_id,))
+                row = await cur.fetchone()
+                if not row:
+                    return None
+                return LoadJobData(
+                    job_id=row[0], file_path=row[1], file_fingerprint=row[2],
+                    total_rows=row[3], batch_size=row[4], status=row[5], updated_at=row[6]
+                )
+
+    async def start_load_job(self, job: LoadJobData, reset: bool = True):
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    if reset:
+                        await cur.execute("DELETE FROM load_batches WHERE job_id = ?", (job.job_id,))
+                        await cur.execute("DELETE FROM load_failures WHERE job_id = ?", (job.job_id,))
+                    await cur.execute('''
+                        INSERT INTO load_jobs (job_id, file_path, file_fingerprint, total_rows, batch_size, status, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(job_id) DO UPDATE SET
+                            file_path=excluded.file_path,
+                            total_rows=excluded.total_rows,
+                            batch_size=excluded.batch_size,
+                            status=excluded.status,
+                            updated_at=excluded.updated_at
+                    ''', (job.job_id, job.file_path, job.file_fingerprint, job.total_rows, job.batch_size, job.status, job.updated_at))
+                await conn.commit()
+
+    async def update_load_job_status(self, job_id: str, status: str):
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        "UPDATE load_jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                        (status, datetime.now(timezone.utc).isoformat(), job_id))
+                await conn.commit()
+
+    async def get_completed_load_batches(self, job_id: str) -> set[int]:
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT batch_index FROM load_batches WHERE job_id = ?", (job_id,))
+                rows = await cur.fetchall()
+                return {row[0] for row in rows}
+
+    async def complete_load_batch(self, job_id: str, batch_index: int, failures: list[LoadFailureData]):
+        """バッチの完了と、バッチ内で失敗した行を1トランザクションで記録する。"""
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.executemany('''
+                        INSERT INTO load_failures (job_id, row_num, source_id, error)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(job_id, row_num) DO UPDATE SET source_id=excluded.source_id, error=excluded.error
+                    ''', [(job_id, failure.row_num, failure.source_id, failure.error) for failure in failures])
+                    await cur.execute('''
+                        INSERT INTO load_batches (job_id, batch_index, completed_at)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT(job_id, batch_index) DO UPDATE SET completed_at=excluded.completed_at
+                    ''', (job_id, batch_index, datetime.now(timezone.utc).isoformat()))
+                await conn.commit()
+
+    async def get_load_failures(self, job_id: str) -> list[LoadFailureData]:
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT row_num, source_id, error FROM load_failures WHERE job_id = ? ORDER BY row_num", (job_id,))
+                rows = await cur.fetchall()
+                return [LoadFailureData(row_num=row[0], source_id=row[1] or "", error=row[2] or "") for row in rows]
+
+    async def upsert_load_failures(self, job_id: str, failures: list[LoadFailureData]):
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.executemany('''
+                        INSERT INTO load_failures (job_id, row_num, source_id, error)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(job_id, row_num) DO UPDATE SET source_id=excluded.source_id, error=excluded.error
+                    ''', [(job_id, failure.row_num, failure.source_id, failure.error) for failure in failures])
+                await conn.commit()
+
+    async def delete_load_failures(self, job_id: str, row_nums: list[int]):
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.executemany('''
+                        DELETE FROM load_failures WHERE job_id = ? AND row_num = ?
+                    ''', [(job_id, row_num) for row_num in row_nums])
+                await conn.commit()
+
+    # reembed関連
+    # コレクションの解決はEmbeddingClientの初期化時に行うため同期で取得する
+    def get_collection_alias(self, name: str) -> Optional[CollectionAliasData]:
+        query = "SELECT name, collection_name, embedding_model, embedding_dimensions, chunk_size, updated_at FROM collection_aliases WHERE name = ?"
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(query, (name,)).fetchone()
+        if not row:
+            return None
+        return CollectionAliasData(
+            name=row[0], collection_name=row[1], embedding_model=row[2], embedding_dimensions=row[3], chunk_size=row[4], updated_at=row[5]
+        )
+
+    def get_running_reembed_job(self, source_collection: str) -> Optional[ReembedJobData]:
+        query = "SELECT target_collection FROM reembed_jobs WHERE source_collection = ? AND status = 'running' ORDER BY updated_at DESC LIMIT 1"
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(query, (source_collection,)).fetchone()
+        if not row:
+            return None
+        return self.__get_reembed_job__(row[0])
+
+    def __get_reembed_job__(self, target_collection: str) -> Optional[ReembedJobData]:
+        query = '''
+            SELECT target_collection, name, source_collection, embedding_model, embedding_dimensions, chunk_size,
+                   total, processed, last_source_id, status, updated_at
+            FROM reembed_jobs WHERE target_collection = ?
+        '''
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(query, (target_collection,)).fetchone()
+        if not row:
+            return None
+        return ReembedJobData(
+            target_collection=row[0], name=row[1], source_collection=row[2], embedding_model=row[3], embedding_dimensions=row[4],
+            chunk_size=row[5], total=row[6], processed=row[7], last_source_id=row[8], status=row[9], updated_at=row[10]
+        )
+
+    async def get_reembed_job(self, target_collection: str) -> Optional[ReembedJobData]:
+        return self.__get_reembed_job__(target_collection)
+
+    async def get_reembed_jobs(self) -> list[ReembedJobData]:
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT target_collection FROM reembed_jobs ORDER BY updated_at")
+                rows = await cur.fetchall()
+        return [job for job in (self.__get_reembed_job__(row[0]) for row in rows) if job is not None]
+
+    async def start_reembed_job(self, job: ReembedJobData):
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute('''
+                        INSERT INTO reembed_jobs (
+                            target_collection, name, source_collection, embedding_model, embedding_dimensions, chunk_size,
+                            total, processed, last_source_id, status, updated_at
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(target_collection) DO UPDATE SET
+                            name=excluded.name,
+                            source_collection=excluded.source_collection,
+                            embedding_model=excluded.embedding_model,
+                            embedding_dimensions=excluded.embedding_dimensions,
+                            chunk_size=excluded.chunk_size,
+                            total=excluded.total,
+                            processed=excluded.processed,
+                            last_source_id=excluded.last_source_id,
+                            status=excluded.status,
+                            updated_at=excluded.updated_at
+                    ''', (
+                        job.target_collection, job.name, job.source_collection, job.embedding_model, job.embedding_dimensions,
+                        job.chunk_size, job.total, job.processed, job.last_source_id, job.status, job.updated_at
+                    ))
+                await conn.commit()
+
+    async def update_reembed_job_progress(self, target_collection: str, last_source_id: str, processed: int):
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        "UPDATE reembed_jobs SET last_source_id = ?, processed = ?, updated_at = ? WHERE target_collection = ?",
+                        (last_source_id, processed, datetime.now(timezone.utc).isoformat(), target_collection))
+                await conn.commit()
+
+    async def update_reembed_job_status(self, target_collection: str, status: str):
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        "UPDATE reembed_jobs SET status = ?, updated_at = ? WHERE target_collection = ?",
+                        (status, datetime.now(timezone.utc).isoformat(), target_collection))
+                await conn.commit()
+
+    async def complete_reembed_job(self, job: ReembedJobData, alias: CollectionAliasData):
+        """ジョブの完了と別名の切り替えを1トランザクションで記録する。"""
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute('''
+                        INSERT INTO collection_aliases (name, collection_name, embedding_model, embedding_dimensions, chunk_size, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(name) DO UPDATE SET
+                            collection_name=excluded.collection_name,
+                            embedding_model=excluded.embedding_model,
+                            embedding_dimensions=excluded.embedding_dimensions,
+                            chunk_size=excluded.chunk_size,
+                            updated_at=excluded.updated_at
+                    ''', (alias.name, alias.collection_name, alias.embedding_model, alias.embedding_dimensions, alias.chunk_size, alias.updated_at))
+                    await cur.execute(
+                        "UPDATE reembed_jobs SET status = 'completed', updated_at = ? WHERE target_collection = ?",
+                        (datetime.now(timezone.utc).isoformat(), job.target_collection))
+                await conn.commit()
+
+    # snapshot関連
+    async def iter_table_rows(self, table: str, page_size: int = 1000):
+        """テーブルの全行をカラム名をキーとするdictとしてpage_size件ずつ返す。"""
+        if table not in SQLiteClient.snapshot_tables:
+            raise ValueError(f"table {table} is not a snapshot target")
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(f"SELECT * FROM {table} ORDER BY rowid") as cur:
+                columns = [column[0] for column in cur.description]
+                while True:
+                    rows = await cur.fetchmany(page_size)
+                    if not rows:
+                        break
+                    yield [dict(zip(columns, row)) for row in rows]
+
+    async def import_table_rows(self, table: str, rows: list[dict]):
+        """snapshotの行をそのまま書き込む。主キーが重複する行は上書きする。"""
+        if table not in SQLiteClient.snapshot_tables:
+            raise ValueError(f"table {table} is not a snapshot target")
+        if not rows:
+            return
+        async with self.lock:
+            async with aiosqlite.connect(self.db_path) as conn:
+                # カラム名はSQLに埋め込むため、テーブルに存在するカラムのみを受け付ける
+                async with conn.execute(f"PRAGMA table_info({table})") as cur:
+                    table_columns = [row[1] for row in await cur.fetchall()]
+                row_columns = {column for row in rows for column in row}
+                unknown_columns = sorted(row_columns - set(table_columns))
+                if unknown_columns:
+                    raise ValueError(f"unknown columns for table {table}: {unknown_columns}")
+                columns = [column for column in table_columns if column in row_columns]
+                query = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+                async with conn.cursor() as cur:
+                    await cur.executemany(query, [tuple(row.get(column) for column in columns) for row in rows])
+                await conn.commit()
+            if table in ("categories", "tags"):
+                self.__clear_known_names__(table)
+            if table == "relations":
+                self.__clear_relation_caches__()
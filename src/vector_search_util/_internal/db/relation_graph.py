@@ -0,0 +1,107 @@
+from typing import Optional
+
+import numpy as np
+
+from vector_search_util.model import RelationData, GraphNodeData, GraphDirection
+
+
+class RelationGraph:
+    """relationsテーブルの隣接リストをCSR形式(indptr, 辺番号の配列)で保持するグラフ。
+
+    ノード名と辺種別は整数に置き換え、辺はsrc, dst, edge_typeの配列で持つ。
+    from_node側(out)とto_node側(in)のそれぞれでCSRを作り、幅優先探索はフロンティア単位でまとめて処理する。
+    """
+    def __init__(self, relations: list[RelationData]):
+        self.relations = relations
+        self.nodes: list[str] = sorted({r.from_node for r in relations} | {r.to_node for r in relations})
+        self.node_index: dict[str, int] = {node: i for i, node in enumerate(self.nodes)}
+        self.edge_type_index: dict[str, int] = {edge_type: i for i, edge_type in enumerate(sorted({r.edge_type for r in relations}))}
+
+        self.src = np.array([self.node_index[r.from_node] for r in relations], dtype=np.int64)
+        self.dst = np.array([self.node_index[r.to_node] for r in relations], dtype=np.int64)
+        self.edge_types = np.array([self.edge_type_index[r.edge_type] for r in relations], dtype=np.int64)
+        self.out_indptr, self.out_edges = self.__build_csr__(self.src)
+        self.in_indptr, self.in_edges = self.__build_csr__(self.dst)
+
+    def __build_csr__(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # keysの値(ノード番号)ごとに辺番号をまとめる。indptr[i]:indptr[i+1]がノードiの辺
+        indptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(keys, minlength=len(self.nodes)))
+        return indptr, np.argsort(keys, kind="stable")
+
+    @staticmethod
+    def __gather__(indptr: np.ndarray, edges: np.ndarray, frontier: np.ndarray) -> np.ndarray:
+        # フロンティアの各ノードの辺番号を連結して返す
+        starts = indptr[frontier]
+        lengths = indptr[frontier + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        return edges[offsets]
+
+    def __bfs__(
+            self, start_nodes: list[str], edge_types: list[str], direction: GraphDirection, max_depth: int,
+            target: Optional[int] = None
+            ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: ノードごとの起点からのホップ数(未到達は-1)と、最短経路で直前にたどった辺番号(-1は起点または未到達)
+        """
+        depth = np.full(len(self.nodes), -1, dtype=np.int64)
+        pred_edge = np.full(len(self.nodes), -1, dtype=np.int64)
+        frontier = np.array(sorted({self.node_index[n] for n in start_nodes if n in self.node_index}), dtype=np.int64)
+        depth[frontier] = 0
+        allowed = None
+        if edge_types:
+            allowed = np.zeros(len(self.edge_type_index), dtype=bool)
+            allowed[[self.edge_type_index[t] for t in edge_types if t in self.edge_type_index]] = True
+
+        for level in range(1, max_depth + 1):
+            if len(frontier) == 0 or (target is not None and depth[target] >= 0):
+                break
+            edge_ids: list[np.ndarray] = []
+            next_nodes: list[np.ndarray] = []
+            if direction in ("out", "both"):
+                e = self.__gather__(self.out_indptr, self.out_edges, frontier)
+                edge_ids.append(e)
+                next_nodes.append(self.dst[e])
+            if direction in ("in", "both"):
+                e = self.__gather__(self.in_indptr, self.in_edges, frontier)
+                edge_ids.append(e)
+                next_nodes.append(self.src[e])
+            e = np.concatenate(edge_ids)
+            n = np.concatenate(next_nodes)
+            mask = depth[n] < 0
+            if allowed is not None:
+                mask &= allowed[self.edge_types[e]]
+            # 同じノードに複数の辺で到達した場合は最初の辺を記録する
+            frontier, first = np.unique(n[mask], return_index=True)
+            depth[frontier] = level
+            pred_edge[frontier] = e[mask][first]
+        return depth, pred_edge
+
+    def get_related_nodes(
+            self, start_nodes: list[str], edge_types: list[str], direction: GraphDirection, max_depth: int
+            ) -> list[GraphNodeData]:
+        depth, _ = self.__bfs__(start_nodes, edge_types, direction, max_depth)
+        found = np.nonzero(depth > 0)[0]
+        result = [GraphNodeData(node=self.nodes[i], depth=int(depth[i])) for i in found]
+        return sorted(result, key=lambda x: (x.depth, x.node))
+
+    def get_shortest_path(
+            self, from_node: str, to_node: str, edge_types: list[str], direction: GraphDirection, max_depth: int
+            ) -> list[RelationData]:
+        if from_node not in self.node_index or to_node not in self.node_index:
+            return []
+        target = self.node_index[to_node]
+        depth, pred_edge = self.__bfs__([from_node], edge_types, direction, max_depth, target)
+        if depth[target] <= 0:
+            return []
+        path: list[RelationData] = []
+        current = target
+        while depth[current] > 0:
+            edge = int(pred_edge[current])
+            path.append(self.relations[edge])
+            # bothの場合は辺の向きに関係なく、currentでない側が直前のノード
+            current = int(self.src[edge]) if int(self.dst[edge]) == current else int(self.dst[edge])
+        return list(reversed(path))
@@ -0,0 +1,226 @@
+import itertools, os, sqlite3
+from typing import Any, Iterable, List, Tuple
+
+from langchain_core.documents import Document
+
+import vector_search_util._internal.codec.json_codec as json_codec
+import vector_search_util._internal.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+
+class ChunkMetadataMirror:
+    """Chroma、pgvectorのチャンクのvector idとmetadataをアプリのSQLite DBのchunksテーブルに複製する。
+
+    metadataのみの問い合わせ(metadata_search、cleanup_categories、update_metadata、upsert前の既存チャンクの取得)と、
+    vector_searchのフィルタの選択率の見積もりに使い、ベクトルDBには類似検索のみを問い合わせる。
+    source_id、chunk_index、category、updated_at、content_hashはmetadataから列に取り出し、
+    metadataの条件のうちこれらのキーは列に対して評価する。それ以外のキーはcmetadataのJSONに対して評価する。
+    storeにはベクトルDBの種類(VECTOR_DB_TYPE)とURLから作る識別子を格納し、同じコレクション名のベクトルDBを区別する。
+    """
+    table_name: str = "chunks"
+    # metadataから取り出す列
+    column_names: Tuple[str, ...] = ("source_id", "chunk_index", "category", "updated_at", "content_hash")
+
+    def __init__(
+            self, db_path: str, store: str, collection_name: str,
+            source_id_key: str = "source_id", chunk_index_key: str = "chunk_index", category_key: str = "category",
+            updated_at_key: str = "updated_at", content_hash_key: str = "content_hash"
+            ):
+        self.db_path = db_path
+        self.store = store
+        self.collection_name = collection_name
+        # metadataのキー -> 列名
+        self.columns: dict[str, str] = dict(zip(
+            (source_id_key, chunk_index_key, category_key, updated_at_key, content_hash_key), self.column_names
+        ))
+        dirname = os.path.dirname(self.db_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.__create_table__()
+
+    def _connect_(self) -> sqlite3.Connection:
+        # 複数プロセスからの読み書きを想定し、ロック待ちのタイムアウトを長めにとる
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def __create_table__(self):
+        with self._connect_() as conn:
+            # ミラーはベクトルDBから作り直せるため、列が足りない古いテーブルは削除する
+            existing_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({self.table_name})")}
+            if existing_columns and not set(self.column_names) <= existing_columns:
+                logger.info(f"Recreate {self.table_name} table with columns: {self.column_names}")
+                conn.execute(f"DROP TABLE {self.table_name}")
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    store TEXT NOT NULL,
+                    collection TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    source_id TEXT,
+                    chunk_index INTEGER,
+                    category TEXT,
+                    updated_at TEXT,
+                    content_hash TEXT,
+                    cmetadata TEXT,
+                    PRIMARY KEY (store, collection, id)
+                )
+            ''')
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table_name}_source_id ON {self.table_name} (store, collection, source_id)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table_name}_category ON {self.table_name} (store, collection, category)")
+
+    def __write__(self, statements: Iterable[Tuple[str, List[tuple]]]) -> int:
+        # 複数のSQLを1つのトランザクションで実行し、変更した行数の合計を返す
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                rowcount = 0
+                for sql, params in statements:
+                    cur.executemany(sql, params)
+                    rowcount += max(cur.rowcount, 0)
+                cur.execute("COMMIT")
+                return rowcount
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def __row__(self, doc_id: str, metadata: dict[str, Any]) -> tuple:
+        # (store, collection, id, 列..., cmetadata)
+        values = {column: metadata.get(key) for key, column in self.columns.items()}
+        return (
+            self.store, self.collection_name, doc_id, *[values[column] for column in self.column_names], json_codec.dumps(metadata)
+        )
+
+    def __upsert_sql__(self) -> str:
+        columns = ", ".join(self.column_names)
+        placeholders = ", ".join("?" for _ in range(len(self.column_names) + 4))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in (*self.column_names, "cmetadata"))
+        return f'''
+            INSERT INTO {self.table_name} (store, collection, id, {columns}, cmetadata) VALUES ({placeholders})
+            ON CONFLICT(store, collection, id) DO UPDATE SET {updates}
+        '''
+
+    def upsert(self, ids: List[str], metadatas: List[dict[str, Any]]) -> int:
+        """
+        vector idのmetadataを追加する。同じvector idは上書きする。
+        :return: 新たに追加したチャンク数
+        """
+        params = [self.__row__(doc_id, metadata or {}) for doc_id, metadata in zip(ids, metadatas)]
+        unique_ids = list(dict.fromkeys(ids))
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                existing = 0
+                # SQLiteの変数の上限を超えないよう分割して既存のvector idを数える
+                for i in range(0, len(unique_ids), 500):
+                    batch = unique_ids[i:i + 500]
+                    existing += cur.execute(
+                        f"SELECT count(*) FROM {self.table_name} WHERE store = ? AND collection = ? AND id IN ({', '.join('?' for _ in batch)})",
+                        (self.store, self.collection_name, *batch)
+                    ).fetchone()[0]
+                cur.executemany(self.__upsert_sql__(), params)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return len(unique_ids) - existing
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict[str, Any]]) -> None:
+        """
+        vector idごとにmetadataをマージして更新する。値がNoneのキーは削除する。
+        """
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                params = []
+                for doc_id, metadata in zip(ids, metadatas):
+                    row = cur.execute(
+                        f"SELECT cmetadata FROM {self.table_name} WHERE store = ? AND collection = ? AND id = ?",
+                        (self.store, self.collection_name, doc_id)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    merged = json_codec.loads(row[0]) if row[0] else {}
+                    merged.update(metadata)
+                    params.append(self.__row__(doc_id, {k: v for k, v in merged.items() if v is not None}))
+                cur.executemany(self.__upsert_sql__(), params)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        :return: 削除したチャンク数
+        """
+        params = [(self.store, self.collection_name, doc_id) for doc_id in ids]
+        return self.__write__([(f"DELETE FROM {self.table_name} WHERE store = ? AND collection = ? AND id = ?", params)])
+
+    def rebuild(self, pages: Iterable[Tuple[List[str], List[dict[str, Any]]]]) -> None:
+        """
+        コレクションの行を削除し、(vector idのリスト, metadataのリスト)のページから作り直す。
+        作り直し中の不完全なミラーを他プロセスが読まないよう1つのトランザクションで行い、ページごとに書き込んで全行を保持しない。
+        """
+        self.__write__(itertools.chain(
+            [(f"DELETE FROM {self.table_name} WHERE store = ? AND collection = ?", [(self.store, self.collection_name)])],
+            ((self.__upsert_sql__(), [self.__row__(doc_id, metadata or {}) for doc_id, metadata in zip(ids, metadatas)]) for ids, metadatas in pages),
+        ))
+
+    ########################################
+    # 読み込み
+    ########################################
+    def count_documents(self, where_sql: str = "") -> int:
+        """
+        :param where_sql: ConditionContainer.to_sqlite_sql(columns=self.columns)の条件。空文字の場合はコレクションの全チャンク数
+        """
+        query = f"SELECT count(*) FROM {self.table_name} WHERE store = ? AND collection = ?"
+        if where_sql:
+            query += f" AND {where_sql}"
+        with self._connect_() as conn:
+            row = conn.execute(query, (self.store, self.collection_name)).fetchone()
+        return int(row[0])
+
+    def get_ids(self, where_sql: str = "") -> List[str]:
+        """
+        :param where_sql: ConditionContainer.to_sqlite_sql(columns=self.columns)の条件。空文字の場合はコレクションの全チャンク
+        """
+        query = f"SELECT id FROM {self.table_name} WHERE store = ? AND collection = ?"
+        if where_sql:
+            query += f" AND {where_sql}"
+        with self._connect_() as conn:
+            return [row[0] for row in conn.execute(query + " ORDER BY id", (self.store, self.collection_name))]
+
+    def get_documents(self, where_sql: str = "", after_id: str = "", limit: int = 0) -> Tuple[List[str], List[Document]]:
+        """
+        条件に一致するチャンクのvector idと、本文を空文字としたDocumentをvector idの昇順で返す。
+        :param after_id: limitを指定した場合、このvector idより後のチャンクを返す
+        :param limit: 0より大きい場合、limit件返す
+        """
+        query = f"SELECT id, cmetadata FROM {self.table_name} WHERE store = ? AND collection = ?"
+        params: list[Any] = [self.store, self.collection_name]
+        if where_sql:
+            query += f" AND {where_sql}"
+        if limit > 0:
+            query += " AND id > ? ORDER BY id LIMIT ?"
+            params.extend([after_id, limit])
+        else:
+            query += " ORDER BY id"
+        with self._connect_() as conn:
+            rows = conn.execute(query, params).fetchall()
+        ids = [row[0] for row in rows]
+        documents = [Document(id=row[0], page_content="", metadata=json_codec.loads(row[1]) if row[1] else {}) for row in rows]
+        return ids, documents
+
+    def get_distinct_metadata_values(self, key: str) -> set[Any]:
+        # 列に取り出したキーは列のインデックスで求める
+        value_sql = self.columns.get(key) or "json_extract(cmetadata, '$.\"' || :key || '\"')"
+        with self._connect_() as conn:
+            rows = conn.execute(
+                f'''
+                SELECT DISTINCT {value_sql} AS value
+                FROM {self.table_name}
+                WHERE store = :store AND collection = :collection AND value IS NOT NULL
+                ''',
+                {"key": key, "store": self.store, "collection": self.collection_name}
+            ).fetchall()
+        return {row[0] for row in rows}
@@ -0,0 +1,211 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, ClassVar, Optional, TypeVar
+
+from vector_search_util.model import EmbeddingConfig
+
+import vector_search_util._internal.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+T = TypeVar("T")
+
+def retryable_errors() -> tuple[type[BaseException], ...]:
+    """
+    リトライ対象の例外。これ以外の例外は即座に呼び出し元へ送出する。
+    openaiは埋め込みAPIを呼び出す場合のみ読み込む。
+    """
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+def estimate_tokens(texts: list[str]) -> int:
+    """
+    埋め込み対象テキストのトークン数を概算する。
+    UTF-8のバイト数/4を目安とする(英語は約4文字/token、日本語は約1文字/token)。
+    """
+    return sum(max(1, len(text.encode("utf-8")) // 4) for text in texts)
+
+
+class TokenBucket:
+    """
+    1分あたりの上限値を持つトークンバケット。
+    reserveは残量をマイナスまで前借りし、必要な待ち時間を返す。
+    """
+    def __init__(self, capacity_per_minute: float):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill_(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill_()
+        # 1回のリクエストがバケット容量を超える場合は容量分だけ消費する
+        self.tokens -= min(amount, self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class EmbeddingScheduler:
+    """
+    プロセス全体で共有する埋め込みAPI呼び出しのスケジューラ。レート制限、リトライの設定ごとに1つ作成する。
+    - RPM/TPMをトークンバケットで制御する
+    - RateLimitError時はRetry-Afterを尊重し、ジッター付きで全呼び出しを一時停止する
+    - 同時実行数を429の発生とレイテンシに基づいてAIMDで調整する
+    """
+    _instances: ClassVar[dict[tuple, "EmbeddingScheduler"]] = {}
+
+    def __init__(self, config: EmbeddingConfig):
+        self.request_bucket: Optional[TokenBucket] = TokenBucket(config.requests_per_minute) if config.requests_per_minute > 0 else None
+        self.token_bucket: Optional[TokenBucket] = TokenBucket(config.tokens_per_minute) if config.tokens_per_minute > 0 else None
+        self.max_retries: int = max(1, config.max_retries)
+        self.base_delay: float = config.retry_base_delay
+        self.max_delay: float = config.retry_max_delay
+        self.latency_target: float = config.latency_target
+
+        # AIMDで調整する同時実行数の上限
+        self.max_concurrency: int = max(1, config.concurrency)
+        self.concurrency_limit: float = float(self.max_concurrency)
+        self.in_flight: int = 0
+        self.paused_until: float = 0.0
+        self.last_decreased_at: float = 0.0
+
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @staticmethod
+    def __get_key__(config: EmbeddingConfig) -> tuple:
+        return (
+            config.requests_per_minute, config.tokens_per_minute, config.concurrency, config.max_retries,
+            config.retry_base_delay, config.retry_max_delay, config.latency_target,
+        )
+
+    @classmethod
+    def get_instance(cls, config: EmbeddingConfig) -> "EmbeddingScheduler":
+        """
+        設定が同じ呼び出し元で共有するスケジューラを返す。設定が異なる場合は別のスケジューラとする。
+        """
+        key = cls.__get_key__(config)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = EmbeddingScheduler(config)
+            cls._instances[key] = instance
+        return instance
+
+    def _get_condition_(self) -> asyncio.Condition:
+        # asyncioのプリミティブはイベントループに紐づくため、ループが変わった場合は作り直す
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self.in_flight = 0
+        return self._condition
+
+    async def _wait_for_budget_(self, tokens: int) -> None:
+        wait = max(0.0, self.paused_until - time.monotonic())
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens > 0:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        if wait > 0:
+            logger.debug(f"Waiting {wait:.2f} seconds for embedding rate limit budget.")
+            await asyncio.sleep(wait)
+
+    async def _acquire_slot_(self) -> None:
+        condition = self._get_condition_()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.concurrency_limit))
+            self.in_flight += 1
+
+    async def _release_slot_(self) -> None:
+        condition = self._get_condition_()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def _on_success_(self, latency: float) -> None:
+        if self.latency_target > 0 and latency > self.latency_target:
+            # レイテンシが目標を超えている場合は緩やかに減少させる
+            self.concurrency_limit = max(1.0, self.concurrency_limit * 0.9)
+        else:
+            # 加算的増加: 上限分のリクエストが成功するごとに1増やす
+            self.concurrency_limit = min(float(self.max_concurrency), self.concurrency_limit + 1.0 / self.concurrency_limit)
+
+    def _on_rate_limited_(self) -> None:
+        # 同じバーストで発生した429で何度も半減しないよう、base_delayの間は1回のみ減少させる
+        now = time.monotonic()
+        if now - self.last_decreased_at < self.base_delay:
+            return
+        self.last_decreased_at = now
+        self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+        logger.info(f"Rate limited. Concurrency limit decreased to {int(self.concurrency_limit)}.")
+
+    @classmethod
+    def _get_retry_after_(cls, error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        headers: Any = getattr(response, "headers", None)
+        if not headers:
+            return None
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000.0
+            except ValueError:
+                pass
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return None
+
+    async def run(self, func: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """
+        埋め込みAPIを呼び出す処理をレート制限と同時実行数制御の下で実行する。
+        :param func: 埋め込みAPIを呼び出す非同期関数
+        :param tokens: 消費する概算トークン数
+        :return: funcの戻り値
+        """
+        from openai import RateLimitError
+        errors = retryable_errors()
+        delay = self.base_delay
+        for attempt in range(self.max_retries):
+            await self._wait_for_budget_(tokens)
+            await self._acquire_slot_()
+            start = time.monotonic()
+            try:
+                result = await func()
+            except errors as e:
+                is_rate_limit = isinstance(e, RateLimitError)
+                if is_rate_limit:
+                    self._on_rate_limited_()
+                if attempt >= self.max_retries - 1:
+                    logger.error(f"Max retries reached. {type(e).__name__}: {e}")
+                    raise
+                retry_after = self._get_retry_after_(e)
+                wait = retry_after if retry_after is not None else delay
+                # 同時に失敗した呼び出しが一斉に再試行しないようジッターを加える
+                wait += random.uniform(0, wait * 0.5 if retry_after is not None else wait)
+                if is_rate_limit:
+                    self.paused_until = max(self.paused_until, time.monotonic() + wait)
+                logger.warning(f"{type(e).__name__}: {e}. Retrying in {wait:.2f} seconds... ({attempt + 1}/{self.max_retries})")
+                delay = min(delay * 2, self.max_delay)
+            else:
+                self._on_success_(time.monotonic() - start)
+                return result
+            finally:
+                await self._release_slot_()
+            await asyncio.sleep(max(0.0, wait))
+
+        raise RuntimeError("unreachable")
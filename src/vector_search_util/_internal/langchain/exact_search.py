@@ -0,0 +1,227 @@
+from typing import Any, ClassVar, Optional, Tuple, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from vector_search_util.model import ConditionContainer
+
+import vector_search_util._internal.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+
+class MetadataMaskTranslator:
+    """ConditionContainer.build() の条件を、ExactSearchIndexの各行に対するbool配列に変換する。
+
+    - PostgresJsonbTranslator / SqliteJsonTranslator と同じ条件を解釈する
+    - $regex は他のTranslatorと同様に部分一致として扱う
+    - 比較演算子は数値に変換できない値を不一致として扱う
+    """
+    def __init__(self, index: "ExactSearchIndex"):
+        self.index = index
+
+    def translate(self, condition_dict: dict) -> np.ndarray:
+        return self._translate_dict(condition_dict)
+
+    def _translate_dict(self, d: dict) -> np.ndarray:
+        mask = np.ones(self.index.size, dtype=bool)
+        for key, value in d.items():
+            if key == "$and":
+                for sub in value:
+                    mask &= self._translate_dict(sub)
+            elif key == "$or":
+                sub_mask = np.zeros(self.index.size, dtype=bool)
+                for sub in value:
+                    sub_mask |= self._translate_dict(sub)
+                mask &= sub_mask
+            else:
+                mask &= self._translate_field(key, value)
+        return mask
+
+    def _translate_field(self, field: str, expr: Any) -> np.ndarray:
+        column = self.index.get_column(field)
+
+        if isinstance(expr, dict):
+            if "$in" in expr:
+                values = set(expr["$in"])
+                return np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+
+            if "$regex" in expr:
+                substring = str(expr["$regex"])
+                return np.fromiter((v is not None and substring in str(v) for v in column), dtype=bool, count=len(column))
+
+            for op, func in (("$gte", np.greater_equal), ("$lte", np.less_equal), ("$gt", np.greater), ("$lt", np.less)):
+                if op in expr:
+                    # NaNとの比較は常にFalseとなる
+                    return func(self.index.get_numeric_column(field), float(expr[op]))
+
+            if "$not" in expr:
+                return ~self._translate_field(field, expr["$not"])
+
+        # eq
+        return np.fromiter((v == expr for v in column), dtype=bool, count=len(column))
+
+
+class ExactSearchIndex:
+    """コレクションの埋め込みベクトルを連続したfloat32行列として保持し、全件のコサイン類似度で検索する。
+
+    行列は正規化済みのベクトルを格納し、1回の行列ベクトル積でスコアを計算する。
+    追加時は容量を倍々で拡張し、削除時は末尾の行で穴を埋めるため、行列は常に先頭から詰まった状態となる。
+    インスタンスはコレクションごとにプロセス内でキャッシュする。
+    """
+    indexes: ClassVar[dict[str, "ExactSearchIndex"]] = {}
+
+    def __init__(self):
+        self.ids: list[str] = []
+        self.positions: dict[str, int] = {}
+        self.page_contents: list[str] = []
+        self.metadatas: list[dict[str, Any]] = []
+        self.matrix: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        # メタデータ列のキャッシュ。書き込みのたびに破棄する
+        self.columns: dict[str, np.ndarray] = {}
+        self.numeric_columns: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def get_instance(cls, key: str) -> Optional["ExactSearchIndex"]:
+        return cls.indexes.get(key)
+
+    @classmethod
+    def set_instance(cls, key: str, index: "ExactSearchIndex") -> None:
+        cls.indexes[key] = index
+
+    @classmethod
+    def remove_instance(cls, key: str) -> None:
+        cls.indexes.pop(key, None)
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def __normalize__(cls, embeddings: np.ndarray) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def __reserve__(self, size: int, dim: int) -> None:
+        capacity = self.matrix.shape[0]
+        if self.matrix.shape[1] != dim:
+            if self.size > 0:
+                raise ValueError(f"Embedding dimension mismatch: index={self.matrix.shape[1]}, new={dim}")
+            self.matrix = np.zeros((max(size, 16), dim), dtype=np.float32)
+            return
+        if size <= capacity:
+            return
+        matrix = np.zeros((max(size, capacity * 2), dim), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        self.matrix = matrix
+
+    def load(self, ids: list[str], embeddings: np.ndarray, documents: list[Document]) -> None:
+        self.ids = []
+        self.positions = {}
+        self.page_contents = []
+        self.metadatas = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.upsert(ids, embeddings, documents)
+
+    def upsert(self, ids: list[str], embeddings: np.ndarray, documents: list[Document]) -> None:
+        if not ids:
+            return
+        normalized = self.__normalize__(embeddings)
+        self.__reserve__(self.size + len(ids), normalized.shape[1])
+        for doc_id, vector, doc in zip(ids, normalized, documents):
+            position = self.positions.get(doc_id)
+            if position is None:
+                position = self.size
+                self.positions[doc_id] = position
+                self.ids.append(doc_id)
+                self.page_contents.append(doc.page_content)
+                self.metadatas.append(dict(doc.metadata))
+            else:
+                self.page_contents[position] = doc.page_content
+                self.metadatas[position] = dict(doc.metadata)
+            self.matrix[position] = vector
+        self.columns.clear()
+        self.numeric_columns.clear()
+
+    def remove(self, ids: list[str]) -> None:
+        for doc_id in ids:
+            position = self.positions.pop(doc_id, None)
+            if position is None:
+                continue
+            last = self.size - 1
+            if position != last:
+                # 末尾の行を削除位置に移動する
+                self.matrix[position] = self.matrix[last]
+                self.ids[position] = self.ids[last]
+                self.page_contents[position] = self.page_contents[last]
+                self.metadatas[position] = self.metadatas[last]
+                self.positions[self.ids[position]] = position
+            self.ids.pop()
+            self.page_contents.pop()
+            self.metadatas.pop()
+        self.columns.clear()
+        self.numeric_columns.clear()
+
+    def get_column(self, field: str) -> np.ndarray:
+        column = self.columns.get(field)
+        if column is None:
+            column = np.empty(self.size, dtype=object)
+            column[:] = [metadata.get(field) for metadata in self.metadatas]
+            self.columns[field] = column
+        return column
+
+    def get_numeric_column(self, field: str) -> np.ndarray:
+        column = self.numeric_columns.get(field)
+        if column is None:
+            column = np.full(self.size, np.nan, dtype=np.float64)
+            for i, value in enumerate(self.get_column(field)):
+                try:
+                    column[i] = float(value)
+                except (TypeError, ValueError):
+                    pass
+            self.numeric_columns[field] = column
+        return column
+
+    def get_vectors(self, positions: np.ndarray) -> np.ndarray:
+        return self.matrix[positions]
+
+    def search_positions(self, query_vectors: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        クエリベクトルごとにスコア上位k件の行番号とスコアを返す。
+        :param query_vectors: (クエリ数, 次元数)の行列
+        :param mask: 検索対象とする行のbool配列
+        :return: (行番号, スコア)。いずれも(クエリ数, k)の行列で、スコアの降順
+        """
+        queries = self.__normalize__(np.atleast_2d(query_vectors))
+        scores = queries @ self.matrix[:self.size].T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        k = min(k, self.size if mask is None else int(mask.sum()))
+        if k <= 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        top_k = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top_k, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_k, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def get_vectors_by_ids(self, ids: list[str]) -> np.ndarray:
+        """vector idの順に、正規化済みの埋め込みベクトルの行列を返す。"""
+        return self.matrix[[self.positions[doc_id] for doc_id in ids]]
+
+    def search(self, query_vector: list[float], k: int, conditions: ConditionContainer = ConditionContainer()) -> List[Tuple[Document, float]]:
+        """
+        ConditionContainerの条件に一致するチャンクからコサイン類似度の上位k件を返す。
+        :param query_vector: クエリの埋め込みベクトル
+        :param k: 取得件数
+        :param conditions: メタデータの条件
+        :return: (Document, スコア)のリスト
+        """
+        if self.size == 0:
+            return []
+        condition_dict = conditions.build()
+        mask = MetadataMaskTranslator(self).translate(condition_dict) if condition_dict else None
+        positions, scores = self.search_positions(np.asarray(query_vector), k, mask)
+        return [
+            (Document(id=self.ids[p], page_content=self.page_contents[p], metadata=dict(self.metadatas[p])), float(s))
+            for p, s in zip(positions[0], scores[0])
+        ]
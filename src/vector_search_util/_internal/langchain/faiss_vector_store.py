@@ -0,0 +1,414 @@
+import os, math, sqlite3, threading, time, uuid, atexit
+from functools import wraps
+from typing import Any, Callable, ClassVar, List, Optional, Tuple, TypeVar
+
+import faiss # type: ignore
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from vector_search_util.model import SqliteJsonTranslator
+from vector_search_util._internal.langchain.sqlite_mirror_vector_store import SQLiteMirrorVectorStore
+
+import vector_search_util._internal.codec.json_codec as json_codec
+import vector_search_util._internal.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+def synchronized(func: F) -> F:
+    """
+    FAISSのインデックスは更新と検索を同時に行えないため、インスタンスのロックの下で実行する。
+    検索はイベントループを止めないようスレッドで実行される。
+    """
+    @wraps(func)
+    def wrapper(self: "FaissVectorStore", *args: Any, **kwargs: Any) -> Any:
+        with self.lock:
+            return func(self, *args, **kwargs)
+    return wrapper # type: ignore
+
+
+class FaissVectorStore(SQLiteMirrorVectorStore):
+    """FAISS(CPU)のインデックスでベクトルを保持するローカルVectorStore。
+
+    - index_typeは Flat(厳密検索) / HNSW / IVFPQ(直積量子化による圧縮) から選択する
+    - FAISSのid(faiss_id)は連番で採番し、vector id、source_id、chunk_index、本文、metadataをSQLiteのミラーテーブルに格納する
+    - metadataの条件はミラーテーブルで評価し、該当するfaiss_idのIDSelectorで検索対象を絞り込む
+    - IVFPQは学習が必要なため、train_size件に達するまでは Flat のバッファに追加し、達した時点でサンプルで学習して移し替える
+    - HNSWはインデックスから削除できないため墓標として検索結果から除外し、墓標の割合がrebuild_ratioを超えたら作り直す
+    - インデックスは書き込みのたびに(persist_interval秒以上経過している場合)ファイルに保存する。単一プロセスからの書き込みを前提とする
+    """
+    table_name: ClassVar[str] = "faiss_vectors"
+    key_column: ClassVar[str] = "faiss_id"
+    index_types: ClassVar[tuple[str, ...]] = ("Flat", "HNSW", "IVFPQ")
+
+    def __init__(
+            self, embedding: Embeddings, db_path: str, data_dir: str, collection_name: str,
+            index_type: str = "HNSW", source_id_key: str = "source_id", chunk_index_key: str = "chunk_index",
+            hnsw_m: int = 32, hnsw_construction_ef: int = 200, hnsw_search_ef: int = 64,
+            nlist: int = 0, pq_m: int = 64, pq_nbits: int = 8, nprobe: int = 16, train_size: int = 100000,
+            persist_interval: float = 0.0, rebuild_ratio: float = 0.2
+            ):
+        if index_type not in self.index_types:
+            raise ValueError(f"Unsupported FAISS index type: {index_type}")
+        super().__init__(embedding, db_path, collection_name)
+        self.data_dir = data_dir
+        self.index_type = index_type
+        self.source_id_key = source_id_key
+        self.chunk_index_key = chunk_index_key
+        self.hnsw_m = hnsw_m
+        self.hnsw_construction_ef = hnsw_construction_ef
+        self.hnsw_search_ef = hnsw_search_ef
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.persist_interval = persist_interval
+        self.rebuild_ratio = rebuild_ratio
+
+        self.index: Optional[Any] = None
+        self.lock = threading.RLock()
+        self.index_mtime: float = 0.0
+        self.dirty: bool = False
+        self.persisted_at: float = 0.0
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.__create_tables__()
+        # persist_intervalで保存を間引いた場合に備え、終了時に未保存の変更を書き出す
+        atexit.register(self.persist)
+
+    def __create_tables__(self):
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS faiss_collections (
+                    name TEXT NOT NULL PRIMARY KEY,
+                    dim INTEGER NOT NULL DEFAULT 0,
+                    index_type TEXT NOT NULL,
+                    next_id INTEGER NOT NULL DEFAULT 0,
+                    trained INTEGER NOT NULL DEFAULT 0,
+                    deleted_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS faiss_vectors (
+                    collection TEXT NOT NULL,
+                    faiss_id INTEGER NOT NULL,
+                    id TEXT NOT NULL,
+                    source_id TEXT,
+                    chunk_index INTEGER,
+                    document TEXT,
+                    cmetadata TEXT,
+                    PRIMARY KEY (collection, faiss_id),
+                    UNIQUE (collection, id)
+                )
+            ''')
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_faiss_vectors_source_id ON faiss_vectors (collection, source_id)")
+            cur.execute(
+                "INSERT INTO faiss_collections (name, index_type) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
+                (self.collection_name, self.index_type)
+            )
+            row = cur.execute("SELECT index_type FROM faiss_collections WHERE name = ?", (self.collection_name,)).fetchone()
+            if row and row[0] != self.index_type:
+                # インデックスの種類はコレクション作成時の値に固定する
+                logger.warning(f"Collection {self.collection_name} is stored as {row[0]}. Ignore index_type={self.index_type}.")
+                self.index_type = row[0]
+
+    def __get_collection__(self, cur: sqlite3.Cursor) -> Tuple[int, int, int, int]:
+        return cur.execute(
+            "SELECT dim, next_id, trained, deleted_count FROM faiss_collections WHERE name = ?", (self.collection_name,)
+        ).fetchone()
+
+    def __get_index_path__(self) -> str:
+        return os.path.join(self.data_dir, f"{self.collection_name}.faiss")
+
+    def __create_index__(self, dim: int, trained: bool) -> Any:
+        if self.index_type == "HNSW":
+            index = faiss.index_factory(dim, f"IDMap2,HNSW{self.hnsw_m}", faiss.METRIC_INNER_PRODUCT)
+            faiss.downcast_index(index.index).hnsw.efConstruction = self.hnsw_construction_ef
+            return index
+        if self.index_type == "IVFPQ" and trained:
+            raise ValueError("IVFPQ index must be created by training.")
+        # Flat、および学習前のIVFPQのバッファ
+        return faiss.index_factory(dim, "IDMap2,Flat", faiss.METRIC_INNER_PRODUCT)
+
+    def __load_index__(self, dim: int = 0) -> Optional[Any]:
+        # 未保存の変更がない場合、他プロセスによる保存を検知したらファイルから読み直す
+        path = self.__get_index_path__()
+        if os.path.exists(path):
+            mtime = os.path.getmtime(path)
+            if self.index is None or (not self.dirty and mtime != self.index_mtime):
+                self.index = faiss.read_index(path)
+                self.index_mtime = mtime
+        if self.index is None and dim > 0:
+            with self._connect_() as conn:
+                _, _, trained, _ = self.__get_collection__(conn.cursor())
+            self.index = self.__create_index__(dim, bool(trained))
+        return self.index
+
+    def close(self) -> None:
+        """
+        未保存の変更を書き出し、終了時の保存の登録を解除する。インスタンスを破棄する前に呼び出す。
+        """
+        self.persist()
+        atexit.unregister(self.persist)
+
+    @synchronized
+    def persist(self, force: bool = True) -> None:
+        """
+        インデックスをファイルに保存する。一時ファイルに書き出してから置き換える。
+        """
+        if self.index is None or not self.dirty:
+            return
+        if not force and time.monotonic() - self.persisted_at < self.persist_interval:
+            return
+        path = self.__get_index_path__()
+        tmp_path = f"{path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, path)
+        self.index_mtime = os.path.getmtime(path)
+        self.persisted_at = time.monotonic()
+        self.dirty = False
+
+    def __get_pq_m__(self, dim: int) -> int:
+        # 直積量子化の分割数は次元数の約数である必要がある
+        for m in range(min(self.pq_m, dim), 0, -1):
+            if dim % m == 0:
+                return m
+        return 1
+
+    def __train__(self) -> None:
+        """
+        バッファのベクトルからサンプルを取り出してIVFPQを学習し、バッファの全件を移し替える。
+        """
+        buffer = self.index
+        if buffer is None:
+            return
+        ids = faiss.vector_to_array(buffer.id_map).astype(np.int64)
+        vectors = buffer.index.reconstruct_n(0, buffer.ntotal)
+        dim = vectors.shape[1]
+        # nlistの既定値は 4*sqrt(n)。1クラスタあたり39件以上の学習データを確保する
+        nlist = self.nlist if self.nlist > 0 else int(4 * math.sqrt(len(ids)))
+        nlist = max(1, min(nlist, len(ids) // 39))
+        pq_m = self.__get_pq_m__(dim)
+        index = faiss.index_factory(dim, f"IVF{nlist},PQ{pq_m}x{self.pq_nbits}", faiss.METRIC_INNER_PRODUCT)
+        sample = vectors[np.random.default_rng(0).choice(len(vectors), size=min(self.train_size, len(vectors)), replace=False)]
+        start = time.perf_counter()
+        index.train(sample)
+        index.add_with_ids(vectors, ids)
+        logger.info(f"Trained IVF{nlist},PQ{pq_m}x{self.pq_nbits} with {len(sample)} vectors in {time.perf_counter() - start:.1f} seconds.")
+        self.index = index
+        self.dirty = True
+        with self._connect_() as conn:
+            conn.execute("UPDATE faiss_collections SET trained = 1 WHERE name = ?", (self.collection_name,))
+
+    def __is_buffer__(self) -> bool:
+        # 学習前のIVFPQは IDMap2,Flat のバッファに追加している
+        return self.index_type == "IVFPQ" and isinstance(self.index, faiss.IndexIDMap2)
+
+    def __rebuild__(self) -> None:
+        """
+        HNSWの墓標が増えた場合に、生存しているベクトルのみでインデックスを作り直す。
+        """
+        with self._connect_() as conn:
+            faiss_ids = [row[0] for row in conn.execute(
+                "SELECT faiss_id FROM faiss_vectors WHERE collection = ? ORDER BY faiss_id", (self.collection_name,)
+            )]
+        vectors = self.__reconstruct__(faiss_ids)
+        index = self.__create_index__(self.index.d, False) # type: ignore
+        if faiss_ids:
+            index.add_with_ids(vectors, np.asarray(faiss_ids, dtype=np.int64))
+        self.index = index
+        self.dirty = True
+        with self._connect_() as conn:
+            conn.execute("UPDATE faiss_collections SET deleted_count = 0 WHERE name = ?", (self.collection_name,))
+        logger.info(f"Rebuilt HNSW index of collection {self.collection_name} with {len(faiss_ids)} vectors.")
+
+    def __remove_ids__(self, faiss_ids: List[int]) -> int:
+        # HNSWはインデックスから削除できないため、SQLiteの行のみを削除した墓標として扱い、件数を返す
+        if not faiss_ids or self.index is None:
+            return 0
+        try:
+            self.index.remove_ids(np.asarray(faiss_ids, dtype=np.int64))
+            return 0
+        except RuntimeError:
+            return len(faiss_ids)
+
+    ########################################
+    # 書き込み
+    ########################################
+    @synchronized
+    def add_embeddings(
+            self, texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None
+            ) -> List[str]:
+        if not texts:
+            return []
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+
+        index = self.__load_index__(vectors.shape[1])
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                dim, next_id, _, _ = self.__get_collection__(cur)
+                if dim != 0 and dim != vectors.shape[1]:
+                    raise ValueError(f"Embedding dimension mismatch: collection={dim}, new={vectors.shape[1]}")
+
+                # 既存のidは削除して新しいfaiss_idで追加し直す(upsert)
+                placeholders = ",".join("?" for _ in ids)
+                replaced_ids = [row[0] for row in cur.execute(
+                    f"SELECT faiss_id FROM faiss_vectors WHERE collection = ? AND id IN ({placeholders})",
+                    (self.collection_name, *ids)
+                )]
+                cur.execute(
+                    f"DELETE FROM faiss_vectors WHERE collection = ? AND id IN ({placeholders})", (self.collection_name, *ids)
+                )
+                tombstones = self.__remove_ids__(replaced_ids)
+
+                faiss_ids = np.arange(next_id, next_id + len(ids), dtype=np.int64)
+                cur.executemany(
+                    '''
+                    INSERT INTO faiss_vectors (collection, faiss_id, id, source_id, chunk_index, document, cmetadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''',
+                    [
+                        (
+                            self.collection_name, int(faiss_id), doc_id,
+                            (metadata or {}).get(self.source_id_key), (metadata or {}).get(self.chunk_index_key),
+                            text, json_codec.dumps(metadata or {})
+                        )
+                        for faiss_id, doc_id, text, metadata in zip(faiss_ids, ids, texts, metadatas)
+                    ]
+                )
+                cur.execute(
+                    "UPDATE faiss_collections SET dim = ?, next_id = ?, deleted_count = deleted_count + ? WHERE name = ?",
+                    (vectors.shape[1], next_id + len(ids), tombstones, self.collection_name)
+                )
+                index.add_with_ids(vectors, faiss_ids)
+                self.dirty = True
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+        if self.__is_buffer__() and self.index is not None and self.index.ntotal >= self.train_size:
+            self.__train__()
+        self.persist(force=False)
+        return ids
+
+    @synchronized
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        self.__load_index__()
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" for _ in ids)
+                faiss_ids: list[int] = [row[0] for row in cur.execute(
+                    f"SELECT faiss_id FROM faiss_vectors WHERE collection = ? AND id IN ({placeholders})",
+                    (self.collection_name, *ids)
+                )]
+                cur.execute(
+                    f"DELETE FROM faiss_vectors WHERE collection = ? AND id IN ({placeholders})", (self.collection_name, *ids)
+                )
+                tombstones = self.__remove_ids__(faiss_ids)
+                cur.execute(
+                    "UPDATE faiss_collections SET deleted_count = deleted_count + ? WHERE name = ?", (tombstones, self.collection_name)
+                )
+                self.dirty = self.dirty or bool(faiss_ids)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            _, _, _, deleted_count = self.__get_collection__(cur)
+        if deleted_count > 0 and deleted_count / max(self.index.ntotal, 1) > self.rebuild_ratio: # type: ignore
+            self.__rebuild__()
+        self.persist(force=False)
+        return True
+
+    ########################################
+    # 読み込み
+    ########################################
+    def __reconstruct__(self, faiss_ids: List[int]) -> np.ndarray:
+        index = self.index
+        if index is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        if not faiss_ids:
+            return np.zeros((0, index.d), dtype=np.float32)
+        if not isinstance(index, faiss.IndexIDMap2):
+            # IVFはid指定の復元にダイレクトマップが必要。PQは近似値となる
+            ivf = faiss.extract_index_ivf(index)
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return np.vstack([index.reconstruct(int(faiss_id)) for faiss_id in faiss_ids]).astype(np.float32)
+
+    @synchronized
+    def get_embeddings(self, ids: Optional[List[str]] = None, include_documents: bool = False) -> Tuple[List[str], np.ndarray, List[Document]]:
+        self.__load_index__()
+        query = "SELECT faiss_id, id, document, cmetadata FROM faiss_vectors WHERE collection = ?"
+        params: list[Any] = [self.collection_name]
+        if ids is not None:
+            if not ids:
+                return [], np.zeros((0, 0), dtype=np.float32), []
+            query += f" AND id IN ({','.join('?' for _ in ids)})"
+            params.extend(ids)
+        with self._connect_() as conn:
+            rows = conn.execute(query + " ORDER BY faiss_id", params).fetchall()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32), []
+        embeddings = self.__reconstruct__([row[0] for row in rows])
+        documents: list[Document] = []
+        if include_documents:
+            documents = [self._row_to_document_(row[1], row[2], row[3]) for row in rows]
+        return [row[1] for row in rows], embeddings, documents
+
+    ########################################
+    # 検索
+    ########################################
+    def __create_search_params__(self, selector: Optional[Any], search_ef: Optional[int]) -> Any:
+        kwargs: dict[str, Any] = {}
+        if selector is not None:
+            kwargs["sel"] = selector
+        if self.index_type == "HNSW":
+            return faiss.SearchParametersHNSW(efSearch=search_ef or self.hnsw_search_ef, **kwargs)
+        if self.index_type == "IVFPQ" and not self.__is_buffer__():
+            # IVFPQではsearch_efを探索するクラスタ数(nprobe)として扱う
+            return faiss.SearchParametersIVF(nprobe=search_ef or self.nprobe, **kwargs)
+        return faiss.SearchParameters(**kwargs)
+
+    @synchronized
+    def similarity_search_with_score_by_vector(
+            self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, search_ef: Optional[int] = None, **kwargs: Any
+            ) -> List[Tuple[Document, float]]:
+        index = self.__load_index__()
+        if index is None or index.ntotal == 0 or k <= 0:
+            return []
+        query = np.ascontiguousarray([embedding], dtype=np.float32)
+        faiss.normalize_L2(query)
+
+        selector = None
+        if filter:
+            faiss_ids = self._get_keys_by_condition_(SqliteJsonTranslator().translate(filter))
+            if not faiss_ids:
+                return []
+            selector = faiss.IDSelectorBatch(np.asarray(faiss_ids, dtype=np.int64))
+
+        # HNSWの墓標は検索結果から除外されるため、その分を多めに取得する
+        with self._connect_() as conn:
+            _, _, _, deleted_count = self.__get_collection__(conn.cursor())
+        fetch_k = min(k + deleted_count, index.ntotal)
+        scores, faiss_ids = index.search(query, fetch_k, params=self.__create_search_params__(selector, search_ef))
+
+        results = [(int(faiss_id), float(score)) for faiss_id, score in zip(faiss_ids[0], scores[0]) if faiss_id >= 0]
+        documents = self._get_documents_by_keys_([faiss_id for faiss_id, _ in results])
+        # PQの近似により1を超える場合があるため丸める
+        return [(documents[faiss_id], min(score, 1.0)) for faiss_id, score in results if faiss_id in documents][:k]
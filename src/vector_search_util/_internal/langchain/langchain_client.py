@@ -1,23 +1,31 @@
-from langchain_core.embeddings import Embeddings
+from __future__ import annotations
+from typing import TYPE_CHECKING
 
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain_openai import OpenAIEmbeddings
 from vector_search_util.model import EmbeddingConfig
 
 import vector_search_util._internal.log.log_settings as log_settings
 logger = log_settings.getLogger(__name__)
 
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
 class LangchainClient:
 
-    llm_config: EmbeddingConfig = EmbeddingConfig()
+    llm_config: EmbeddingConfig
     embedding: Embeddings | None = None
 
+    def __init__(self, llm_config: EmbeddingConfig|None = None) -> None:
+        # 環境変数はインスタンス作成時に読み込む
+        self.llm_config = llm_config or EmbeddingConfig()
+
         
 class LangchainOpenAIClient(LangchainClient):
 
     def __init__(self, llm_config: EmbeddingConfig|None = None) -> None:
-        if llm_config:
-            self.llm_config = llm_config
+        # langchain_openai(openai)は埋め込みクライアントの作成時に読み込む
+        from langchain_openai import OpenAIEmbeddings
+
+        super().__init__(llm_config)
 
         params = {}
         params["api_key"] = self.llm_config.api_key
@@ -25,6 +33,10 @@ class LangchainOpenAIClient(LangchainClient):
             params["base_url"] = self.llm_config.base_url
 
         params["model"] = self.llm_config.embedding_model
+        if self.llm_config.embedding_dimensions:
+            params["dimensions"] = self.llm_config.embedding_dimensions
+        # リトライはEmbeddingSchedulerで行う
+        params["max_retries"] = 0
         self.embedding = OpenAIEmbeddings(
                 **params
             )
@@ -32,8 +44,9 @@ class LangchainOpenAIClient(LangchainClient):
 class LangchainAzureOpenAIClient(LangchainClient):
 
     def __init__(self, llm_config: EmbeddingConfig|None = None) -> None:
-        if llm_config:
-            self.llm_config = llm_config
+        from langchain_openai import AzureOpenAIEmbeddings
+
+        super().__init__(llm_config)
 
         params = {}
         params["api_key"] = self.llm_config.api_key
@@ -43,6 +56,10 @@ class LangchainAzureOpenAIClient(LangchainClient):
             params["api_version"] = self.llm_config.api_version
 
         params["model"] = self.llm_config.embedding_model
+        if self.llm_config.embedding_dimensions:
+            params["dimensions"] = self.llm_config.embedding_dimensions
+        # リトライはEmbeddingSchedulerで行う
+        params["max_retries"] = 0
 
         self.embedding = AzureOpenAIEmbeddings(
                 **params
@@ -1,4 +1,4 @@
-from langchain_core.embeddings import Embeddings
+from typing import Optional
 
 from vector_search_util.model import EmbeddingConfig
 from vector_search_util._internal.langchain.langchain_client import LangchainClient, LangchainOpenAIClient, LangchainAzureOpenAIClient
@@ -9,7 +9,9 @@ logger = log_settings.getLogger(__name__)
 class LangchainFactory:
 
     @classmethod
-    def create_client(cls, llm_config: EmbeddingConfig = EmbeddingConfig()) -> LangchainClient:
+    def create_client(cls, llm_config: Optional[EmbeddingConfig] = None) -> LangchainClient:
+        if llm_config is None:
+            llm_config = EmbeddingConfig()
 
         if llm_config.llm_provider == "openai":
             client = LangchainOpenAIClient(llm_config)
@@ -1,27 +1,32 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from typing import Tuple, List, Any, Optional
-import asyncio, os, json
+from typing import Tuple, List, Any, Callable, Optional, ClassVar, AsyncIterator, TYPE_CHECKING
+from contextvars import ContextVar
+import asyncio, hashlib, math, os, time, uuid, weakref
+from collections import OrderedDict
+
+import numpy as np
 
 from pydantic import Field
 from langchain_core.documents import Document
-from langchain_core.vectorstores import VectorStore
-
-import chromadb
-import chromadb.config
-
-from langchain_chroma.vectorstores import Chroma # type: ignore
-from langchain_postgres.vectorstores import PGVector
-
-import sqlalchemy
-from sqlalchemy.orm import Session
-from sqlalchemy.sql import text
 
-from openai import RateLimitError
-from vector_search_util.model import ConditionContainer
+from vector_search_util.model import ConditionContainer, EmbeddingConfig
 
 
 from vector_search_util._internal.langchain.langchain_client import LangchainClient
+from vector_search_util._internal.langchain.langchain_factory import LangchainFactory
+from vector_search_util._internal.langchain.embedding_scheduler import EmbeddingScheduler, estimate_tokens
+from vector_search_util._internal.langchain.exact_search import ExactSearchIndex
+from vector_search_util._internal.langchain.chunk_metadata_mirror import ChunkMetadataMirror
+from vector_search_util._internal.langchain.mmr import maximal_marginal_relevance
+import vector_search_util._internal.codec.json_codec as json_codec
 import vector_search_util._internal.log.log_settings as log_settings
+
+# VectorStoreの実装(langchain_core.vectorstores)はベクトルDBを開く時に読み込む
+if TYPE_CHECKING:
+    from langchain_core.vectorstores import VectorStore
+    from vector_search_util._internal.langchain.sqlite_mirror_vector_store import SQLiteMirrorVectorStore
 logger = log_settings.getLogger(__name__)
 
 
@@ -33,10 +38,37 @@ class LangChainVectorDB(ABC):
     vector_db_url: str = Field(..., description="Vector DBのURL")
     collection_name: str = Field(default="", description="コレクション名")
     db: Optional[VectorStore] = Field(default=None, description="LangChainのVectorStoreインスタンス")
+    # 確認済みのコレクションのmetadata。Noneの場合は未確認
+    collection_metadata: Optional[dict[str, Any]] = None
+    # チャンクのvector idとmetadataのミラー。vector id、metadataをアプリのSQLite DBに格納しないベクトルDB(Chroma、pgvector)で使い、
+    # metadataのみの問い合わせはベクトルDBではなくミラーに対して行う
+    chunk_mirror: Optional[ChunkMetadataMirror] = None
+    # ミラーの件数をベクトルDBと照合済みの場合True
+    chunk_mirror_verified: bool = False
+    # コレクションのチャンク数。フィルタ付きの検索の選択率の見積もりに使い、書き込み時に更新する。Noneの場合は未取得
+    chunk_count: Optional[int] = None
+    # 近似検索(HNSW、IVFPQ)のベクトルDBの場合True。Falseの場合はフィルタ付きの検索でも常に指定件数を返すため、検索計画を立てない
+    approximate_search: ClassVar[bool] = True
+
+    # コレクションのmetadataに記録する埋め込みモデルと次元数のキー
+    embedding_model_key: ClassVar[str] = "embedding_model"
+    embedding_dimensions_key: ClassVar[str] = "embedding_dimensions"
+
+    # プロセス内で共有するコレクションごとのインスタンスと最終使用時刻。先頭が最も古い
+    instances: ClassVar[OrderedDict[str, Tuple["LangChainVectorDB", float]]] = OrderedDict()
+    # キャッシュから外した時点で使用中(EmbeddingClient、処理中のリクエストが参照している)だったインスタンス。
+    # 最後の参照が解放された時に閉じる。それまでに同じコレクションを取得した場合は同じインスタンスを返す
+    evicted: ClassVar["weakref.WeakValueDictionary[str, LangChainVectorDB]"] = weakref.WeakValueDictionary()
+    evicted_finalizers: ClassVar[dict[str, weakref.finalize]] = {}
+
+    @abstractmethod
+    # document_idのリストとmetadataのリストを返す。include_documentsがFalseの場合、本文は取得せず空文字とする
+    def _get_documents_(self, conditions: ConditionContainer = ConditionContainer(), include_documents: bool = True) -> Tuple[List[str], List[Document]]:
+        pass
 
     @abstractmethod
-    # document_idのリストとmetadataのリストを返す
-    def _get_documents_(self, conditions: ConditionContainer = ConditionContainer()) -> Tuple[List[str], List[Document]]:
+    # cursorより後のチャンクをlimit件返す。次のページがない場合、next_cursorは空文字
+    def _get_documents_page_(self, conditions: ConditionContainer, cursor: str, limit: int, include_documents: bool = True) -> Tuple[List[str], List[Document], str]:
         pass
 
     @abstractmethod
@@ -44,6 +76,101 @@ class LangChainVectorDB(ABC):
     def _update_metadata_(self, doc_ids: list[str], metadata: dict[str, Any]) -> bool:
         pass
 
+    @abstractmethod
+    # vector idごとに異なるメタデータで一括更新する。値がNoneのキーは削除する
+    def _update_metadatas_(self, doc_ids: list[str], metadatas: list[dict[str, Any]]) -> bool:
+        pass
+
+    @abstractmethod
+    # 指定したメタデータキーの値の集合を、チャンク本文を取得せずに返す
+    def _get_distinct_metadata_values_(self, key: str) -> set[Any]:
+        pass
+
+    @abstractmethod
+    # vector idと埋め込みベクトル(float32の行列)を返す。idsを省略した場合は全チャンク。
+    # include_documentsがTrueの場合は本文とmetadataのDocumentも返す
+    def _get_embeddings_(self, ids: Optional[List[str]] = None, include_documents: bool = False) -> Tuple[List[str], np.ndarray, List[Document]]:
+        pass
+
+    @abstractmethod
+    # コレクションのチャンク数を返す
+    def _get_count_(self) -> int:
+        pass
+
+    @abstractmethod
+    # コレクションの全チャンクのvector idを返す
+    def _get_ids_(self) -> List[str]:
+        pass
+
+    @abstractmethod
+    # 埋め込み済みのベクトルをそのまま格納する(同じvector idは上書き)。埋め込みAPIは呼び出さない
+    def _add_embeddings_(self, ids: List[str], embeddings: np.ndarray, documents: List[Document]) -> None:
+        pass
+
+    @abstractmethod
+    # コレクションのmetadata(埋め込みモデル、次元数など)を返す
+    def _get_collection_metadata_(self) -> dict[str, Any]:
+        pass
+
+    @abstractmethod
+    # コレクションのmetadataに指定したキーを上書きする
+    def _update_collection_metadata_(self, metadata: dict[str, Any]) -> None:
+        pass
+
+    def _get_metadata_page_(self, cursor: str, limit: int) -> Tuple[List[str], List[dict[str, Any]], str]:
+        # チャンクのmetadataのミラーを作り直す際に、ベクトルDBの全チャンクのmetadataをcursorより後からlimit件返す。
+        # ミラーから読み込むベクトルDBはオーバーライドしてベクトルDBを直接読み込む
+        ids, documents, next_cursor = self._get_documents_page_(ConditionContainer(), cursor, limit, include_documents=False)
+        return ids, [doc.metadata for doc in documents], next_cursor
+
+    def _close_(self) -> None:
+        # インスタンスを破棄する前に呼び出す。未保存のデータがあるベクトルDBはオーバーライドして保存する
+        self._get_close_callback_()()
+
+    def _get_close_callback_(self) -> Callable[[], None]:
+        # _close_と同じ処理を行う関数を返す。インスタンスの解放時に呼び出すため、インスタンス自身を参照しないこと
+        return lambda: None
+
+    def _similarity_search_(
+            self, query: str, k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None, include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        # search_efの上書き、本文を取得しない検索(include_documents=False)はベクトルDBごとにオーバーライドして対応する
+        if self.db is None:
+            raise ValueError("db is None")
+        return self.db.similarity_search_with_relevance_scores(query, **search_kwargs)
+
+    @abstractmethod
+    # 埋め込みベクトルで検索する。戻り値のDocumentにはvector idを設定する。
+    # include_documents=Falseの場合、本文を別に取得するベクトルDBは本文を取得せず空文字とする
+    def _similarity_search_by_vector_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        pass
+
+    def _similarity_search_with_embeddings_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        # 検索結果と、結果の順の埋め込みベクトルの行列を返す。
+        # 検索結果とベクトルを1回の問い合わせで取得できるベクトルDBはオーバーライドする
+        docs_and_scores = self._similarity_search_by_vector_(embedding, k, search_kwargs, search_ef)
+        ids, embeddings, _ = self._get_embeddings_([doc.id for doc, _ in docs_and_scores if doc.id])
+        positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        docs_and_scores = [(doc, score) for doc, score in docs_and_scores if doc.id in positions]
+        return docs_and_scores, embeddings[[positions[doc.id] for doc, _ in docs_and_scores]].reshape(len(docs_and_scores), -1)
+
+    def _count_documents_(self, conditions: ConditionContainer = ConditionContainer()) -> int:
+        # 条件に一致するチャンク数をチャンクのmetadataのミラーで数える。
+        # vector id、metadataをアプリのSQLite DBに格納するベクトルDBはオーバーライドする
+        mirror = self.__get_chunk_mirror__()
+        return mirror.count_documents(conditions.to_sqlite_sql(columns=mirror.columns))
+
+    def _get_ids_by_conditions_(self, conditions: ConditionContainer) -> List[str]:
+        # 条件に一致するチャンクのvector idをチャンクのmetadataのミラーから取得する
+        mirror = self.__get_chunk_mirror__()
+        return mirror.get_ids(conditions.to_sqlite_sql(columns=mirror.columns))
+
     def _create_search_kwargs_(self, k: int, conditions: ConditionContainer = ConditionContainer()) -> dict[str, Any]:
         search_kwargs: dict[str, Any] = {"k": k}
         filter = conditions.build()
@@ -62,23 +189,281 @@ class LangChainVectorDB(ABC):
         elif vector_db_type == "pgvector":
             vector_db = LangChainVectorDBPGVector(client, vector_db_url, collection_name)
             return vector_db
+        elif vector_db_type == "numpy":
+            vector_db = LangChainVectorDBNumpy(client, vector_db_url, collection_name)
+            return vector_db
+        elif vector_db_type == "faiss":
+            vector_db = LangChainVectorDBFaiss(client, vector_db_url, collection_name)
+            return vector_db
         else:
             raise ValueError(f"Unsupported vector_db_type: {vector_db_type}")
 
+    @classmethod
+    def get_vector_db(cls, config: EmbeddingConfig) -> 'LangChainVectorDB':
+        """
+        コレクションごとのインスタンスをプロセス内で共有して返す。未作成の場合は作成する。
+        VECTOR_DB_CACHE_SIZEを超えた場合は最も長く使用されていないものから、
+        VECTOR_DB_IDLE_SECONDSを超えて使用されていないものは取得時にキャッシュから外し、最後の参照が解放された時に閉じる。
+        :param config: コレクション名、埋め込みの設定
+        :return: ベクトルDB
+        """
+        if config.vector_db_cache_size <= 0:
+            return cls.create_vector_db(LangchainFactory.create_client(config))
+
+        key = ":".join([
+            config.vector_db_type, config.vector_db_url, config.vector_db_collection_name,
+            config.embedding_model, str(config.embedding_dimensions or "")
+        ])
+        now = time.monotonic()
+        entry = cls.instances.pop(key, None)
+        if config.vector_db_idle_seconds > 0:
+            for idle_key in [k for k, (_, used_at) in cls.instances.items() if now - used_at > config.vector_db_idle_seconds]:
+                cls.__close_instance__(idle_key)
+        vector_db = entry[0] if entry is not None else cls.__revive_instance__(key)
+        if vector_db is None:
+            vector_db = cls.create_vector_db(LangchainFactory.create_client(config))
+        cls.instances[key] = (vector_db, now)
+        while len(cls.instances) > config.vector_db_cache_size:
+            cls.__close_instance__(next(iter(cls.instances)))
+        return vector_db
+
+    @classmethod
+    def __close_instance__(cls, key: str) -> None:
+        # キャッシュから外し、最後の参照(EmbeddingClient、処理中のリクエスト)が解放された時に閉じる。他に参照がない場合はすぐに閉じる。
+        # 使用中のインスタンスを閉じて同じコレクションの別のインスタンスを作ると、
+        # 単一の書き込みを前提とするベクトルDB(FAISS)で互いの書き込みを上書きするため
+        vector_db, _ = cls.instances.pop(key)
+        logger.info(f"Release collection {vector_db.collection_name}")
+        # 厳密検索用のインデックスは再作成できるため、あわせて解放する
+        ExactSearchIndex.remove_instance(vector_db.__get_exact_index_key__())
+        cls.evicted[key] = vector_db
+        cls.evicted_finalizers[key] = weakref.finalize(
+            vector_db, cls.__close_released__, key, vector_db.collection_name, vector_db._get_close_callback_())
+
+    @classmethod
+    def __close_released__(cls, key: str, collection_name: str, close: Callable[[], None]) -> None:
+        logger.info(f"Close collection {collection_name}")
+        cls.evicted_finalizers.pop(key, None)
+        close()
+
+    @classmethod
+    def __revive_instance__(cls, key: str) -> Optional["LangChainVectorDB"]:
+        # キャッシュから外した後も使用中のインスタンスがあれば、閉じずにキャッシュに戻す
+        vector_db = cls.evicted.pop(key, None)
+        if vector_db is not None:
+            cls.evicted_finalizers.pop(key).detach()
+        return vector_db
+
     ########################################
     # パブリック
     ########################################
-    async def get_documents(self, conditions: ConditionContainer = ConditionContainer()) -> Tuple[List[str], List[Document]]:
+    async def get_documents(self, conditions: ConditionContainer = ConditionContainer(), include_documents: bool = True) -> Tuple[List[str], List[Document]]:
+        # 本文が不要な場合、チャンクのmetadataのミラーを持つベクトルDBはミラーから読み込む
+        if not include_documents and self.chunk_mirror is not None:
+            mirror = self.__get_chunk_mirror__()
+            return mirror.get_documents(conditions.to_sqlite_sql(columns=mirror.columns))
+        return self._get_documents_(conditions, include_documents)
 
-        return self._get_documents_(conditions)
-    
+
+    async def get_documents_page(
+            self, conditions: ConditionContainer, cursor: str = "", limit: int = 100, include_documents: bool = True
+            ) -> Tuple[List[str], List[Document], str]:
+        """
+        条件に一致するチャンクのうち、cursorより後のチャンクをlimit件返す。
+        :param include_documents: Falseの場合、チャンク本文は取得せず空文字とする
+        :return: vector id、Document、次のページのcursor(最後のページの場合は空文字)
+        """
+        if not include_documents and self.chunk_mirror is not None:
+            # ミラーはvector idのキーセットで読み込む
+            mirror = self.__get_chunk_mirror__()
+            ids, documents = mirror.get_documents(conditions.to_sqlite_sql(columns=mirror.columns), cursor, limit)
+            return ids, documents, ids[-1] if len(ids) == limit else ""
+        return self._get_documents_page_(conditions, cursor, limit, include_documents)
+
+    async def iter_documents(self, conditions: ConditionContainer = ConditionContainer(), page_size: int = 1000) -> AsyncIterator[Tuple[List[str], List[Document]]]:
+        """
+        条件に一致するチャンクのvector idとDocumentを、ベクトルDBから読み込みながらpage_size件ずつ返す。
+        """
+        cursor = ""
+        while True:
+            ids, documents, cursor = self._get_documents_page_(conditions, cursor, page_size)
+            if ids:
+                yield ids, documents
+            if not cursor:
+                break
+
+    async def get_distinct_metadata_values(self, key: str) -> set[Any]:
+        if self.chunk_mirror is not None:
+            return self.__get_chunk_mirror__().get_distinct_metadata_values(key)
+        return self._get_distinct_metadata_values_(key)
+
+    async def get_embeddings(self) -> Tuple[List[str], np.ndarray]:
+        ids, embeddings, _ = self._get_embeddings_()
+        return ids, embeddings
+
+    async def get_collection_metadata(self) -> dict[str, Any]:
+        return self._get_collection_metadata_()
+
+    def __get_exact_index_key__(self) -> str:
+        return f"{self.client.llm_config.vector_db_type}:{self.vector_db_url}:{self.collection_name}"
+
+    async def get_exact_index(self) -> ExactSearchIndex:
+        """
+        厳密検索用のインデックスを返す。未読み込み、または件数が一致しない(他プロセスで更新された)場合は全件を読み込む。
+        """
+        key = self.__get_exact_index_key__()
+        index = ExactSearchIndex.get_instance(key)
+        count = self._get_count_()
+        if index is None or index.size != count:
+            logger.info(f"Load exact search index: collection={self.collection_name}, count={count}")
+            ids, embeddings, documents = self._get_embeddings_(include_documents=True)
+            index = ExactSearchIndex()
+            index.load(ids, embeddings, documents)
+            ExactSearchIndex.set_instance(key, index)
+        return index
+
+    def __sync_exact_index__(self, upserted_ids: list[str] = [], removed_ids: list[str] = []):
+        # 厳密検索用のインデックスが読み込まれている場合のみ、書き込み内容を差分反映する
+        index = ExactSearchIndex.get_instance(self.__get_exact_index_key__())
+        if index is None:
+            return
+        if removed_ids:
+            index.remove(removed_ids)
+        if upserted_ids:
+            ids, embeddings, documents = self._get_embeddings_(upserted_ids, include_documents=True)
+            index.upsert(ids, embeddings, documents)
+
+    def __create_chunk_mirror__(self) -> ChunkMetadataMirror:
+        # Chromaと同様、コレクション名が未指定の場合は langchain とする。
+        # 同じ種類・コレクション名の別のベクトルDBを区別するため、storeにはベクトルDBのURLを含める。
+        # URLは接続情報(パスワード)を含む場合があるため、ハッシュ値を格納する
+        config = self.client.llm_config
+        url_hash = hashlib.sha256(self.vector_db_url.encode("utf-8")).hexdigest()[:16]
+        return ChunkMetadataMirror(
+            os.path.join(config.app_data_path, "vector_db_search_app.db"), f"{config.vector_db_type}:{url_hash}", self.collection_name or "langchain",
+            source_id_key=config.source_id_key, chunk_index_key=config.chunk_index_key, category_key=config.category_key,
+            updated_at_key=config.updated_at_key, content_hash_key=config.content_hash_key,
+        )
+
+    def __get_chunk_mirror__(self) -> ChunkMetadataMirror:
+        # インスタンスの初回の使用時に、ミラーの件数がベクトルDBと一致しない(ミラーの作成前に格納した、他の方法で更新された)場合は作り直す。
+        # 以降はベクトルDBへの書き込みと同時にミラーを更新するため、ベクトルDBの件数は数えない
+        if self.chunk_mirror is None:
+            raise ValueError("chunk_mirror is None")
+        if not self.chunk_mirror_verified:
+            count = self._get_count_()
+            if self.chunk_mirror.count_documents() != count:
+                logger.info(f"Rebuild chunk metadata mirror: collection={self.collection_name}, count={count}")
+                self.chunk_mirror.rebuild(self.__iter_metadata_pages__())
+                self.chunk_count = None
+            self.chunk_mirror_verified = True
+        return self.chunk_mirror
+
+    def __iter_metadata_pages__(self, page_size: int = 1000):
+        cursor = ""
+        while True:
+            ids, metadatas, cursor = self._get_metadata_page_(cursor, page_size)
+            yield ids, metadatas
+            if not cursor:
+                break
+
+    def __sync_chunk_mirror__(
+            self, upserted_ids: list[str] = [], upserted_metadatas: list[dict[str, Any]] = [],
+            updated_ids: list[str] = [], updated_metadatas: list[dict[str, Any]] = [], removed_ids: list[str] = []
+            ):
+        # チャンクのmetadataのミラーを持つベクトルDBのみ、書き込み内容を反映する。updatedはmetadataをマージする。
+        # ミラーがない場合は追加・削除したチャンク数が分からないため、チャンク数を次の検索時に数え直す
+        if self.chunk_mirror is None:
+            if upserted_ids or removed_ids:
+                self.chunk_count = None
+            return
+        if removed_ids:
+            removed = self.chunk_mirror.delete(removed_ids)
+            if self.chunk_count is not None:
+                self.chunk_count -= removed
+        if updated_ids:
+            self.chunk_mirror.update_metadatas(updated_ids, updated_metadatas)
+        if upserted_ids:
+            inserted = self.chunk_mirror.upsert(upserted_ids, upserted_metadatas)
+            if self.chunk_count is not None:
+                self.chunk_count += inserted
+
+    def __check_embedding_dimensions__(self, dimensions: Optional[int] = None) -> None:
+        """
+        コレクションに記録した埋め込みベクトルの次元数と、書き込み・検索するベクトルの次元数が一致するか確認する。
+        :param dimensions: ベクトルの次元数。Noneの場合はEMBEDDING_DIMENSIONSの設定値で確認する
+        埋め込みモデルが記録と異なる場合も、次元数が同じでもベクトル空間が異なるためエラーとする。
+        """
+        if self.collection_metadata is None:
+            self.collection_metadata = self._get_collection_metadata_()
+        recorded_dimensions = self.collection_metadata.get(self.embedding_dimensions_key)
+        recorded_model = self.collection_metadata.get(self.embedding_model_key)
+        config = self.client.llm_config
+        dimensions = dimensions or config.embedding_dimensions
+        if recorded_dimensions is not None and dimensions is not None and int(recorded_dimensions) != dimensions:
+            raise ValueError(
+                f"Embedding dimensions mismatch in collection '{self.collection_name}': "
+                f"collection={recorded_dimensions} (model={recorded_model}), current={dimensions} (model={config.embedding_model}). "
+                "Use another collection or re-embed the collection with the current settings."
+            )
+        if recorded_model and recorded_model != config.embedding_model:
+            raise ValueError(
+                f"Embedding model mismatch in collection '{self.collection_name}': "
+                f"collection={recorded_model}, current={config.embedding_model}. "
+                "Use another collection or re-embed the collection with the current settings."
+            )
+
+    def __record_embedding_dimensions__(self, ids: list[str]) -> None:
+        # 最初の書き込み時に、実際に格納したベクトルの次元数と埋め込みモデルをコレクションのmetadataに記録する
+        if not ids or (self.collection_metadata or {}).get(self.embedding_dimensions_key) is not None:
+            return
+        _, embeddings, _ = self._get_embeddings_(ids[:1])
+        if embeddings.size == 0:
+            return
+        metadata = {
+            self.embedding_model_key: self.client.llm_config.embedding_model,
+            self.embedding_dimensions_key: int(embeddings.shape[1]),
+        }
+        self._update_collection_metadata_(metadata)
+        self.collection_metadata = {**(self.collection_metadata or {}), **metadata}
+        logger.info(f"Record embedding settings of collection {self.collection_name}: {metadata}")
+
+    async def iter_embeddings(self, page_size: int = 1000) -> AsyncIterator[Tuple[List[str], np.ndarray, List[Document]]]:
+        """
+        全チャンクのvector id、埋め込みベクトル、Documentをpage_size件ずつ返す。
+        """
+        ids = self._get_ids_()
+        for offset in range(0, len(ids), page_size):
+            yield self._get_embeddings_(ids[offset:offset + page_size], include_documents=True)
+
+    async def add_embeddings(self, ids: List[str], embeddings: np.ndarray, documents: List[Document]) -> None:
+        """
+        埋め込み済みのベクトルを埋め込みAPIを呼び出さずに格納する。
+        """
+        if not ids:
+            return
+        self.__check_embedding_dimensions__(int(embeddings.shape[1]))
+        self._add_embeddings_(ids, embeddings, documents)
+        self.__record_embedding_dimensions__(ids)
+        self.__sync_exact_index__(upserted_ids=ids)
+        self.__sync_chunk_mirror__(upserted_ids=ids, upserted_metadatas=[doc.metadata for doc in documents])
 
     async def add_documents(self, documents: list[Document]) -> bool:
 
         if self.db is None:
             raise ValueError("db is None")
- 
-        await self.add_doucment_with_retry(self.db, documents)
+
+        if not documents:
+            return True
+        self.__check_embedding_dimensions__()
+        # 埋め込みと格納を分け、格納する前に実際のベクトルの次元数を確認する
+        embeddings = await self.embed_documents_with_retry(documents)
+        self.__check_embedding_dimensions__(int(embeddings.shape[1]))
+        ids = [doc.id or str(uuid.uuid4()) for doc in documents]
+        self._add_embeddings_(ids, embeddings, documents)
+        self.__record_embedding_dimensions__(ids)
+        self.__sync_exact_index__(upserted_ids=ids)
+        self.__sync_chunk_mirror__(upserted_ids=ids, upserted_metadatas=[doc.metadata for doc in documents])
         return True
 
     async def delete_documents_by_ids(self, doc_ids:list=[]):
@@ -88,12 +473,14 @@ class LangChainVectorDB(ABC):
             raise ValueError("db is None")
 
         await self.db.adelete(ids=doc_ids)
+        self.__sync_exact_index__(removed_ids=doc_ids)
+        self.__sync_chunk_mirror__(removed_ids=doc_ids)
 
         return len(doc_ids)    
 
     async def delete_documents_by_tags(self, conditions: ConditionContainer = ConditionContainer()):
-        # ベクトルDB固有のvector id取得メソッドを呼び出し。
-        vector_ids, _ = self._get_documents_(conditions)
+        # ベクトルDB固有のvector id取得メソッド、またはチャンクのmetadataのミラーを呼び出し。
+        vector_ids, _ = await self.get_documents(conditions, include_documents=False)
 
         # vector_idsが空の場合は何もしない
         if len(vector_ids) == 0:
@@ -111,68 +498,176 @@ class LangChainVectorDB(ABC):
             condition = ConditionContainer().add_eq_condition(
                 self.client.llm_config.source_id_key, source_id
                 )
-            ids, _ = await self.get_documents(condition)
+            ids, _ = await self.get_documents(condition, include_documents=False)
             if len(ids) == 0:
                 logger.info(f"Document not found for metadata update: {metadata}")
                 continue
             doc_ids = ids
             self._update_metadata_(doc_ids, metadata)
+            self.__sync_exact_index__(upserted_ids=doc_ids)
+            self.__sync_chunk_mirror__(updated_ids=doc_ids, updated_metadatas=[metadata for _ in doc_ids])
 
         return True
 
     async def upsert_documents(self, data_list: list[Document], append_vectors: bool = False) -> bool:
-        
-        if not append_vectors:
-            # 既に存在するドキュメントを削除
-            conditions = ConditionContainer().add_in_condition(
-                self.client.llm_config.source_id_key, [ data.metadata.get(self.client.llm_config.source_id_key, "") for data in data_list ]
-                )
-            await self.delete_documents_by_tags(conditions)
+        added_docs = await self.prepare_upsert(data_list, append_vectors)
+        # 追加・変更されたチャンクを格納する。
+        if added_docs:
+            await self.add_documents(added_docs)
 
-        else:
+        return True
+
+    async def prepare_upsert(self, data_list: list[Document], append_vectors: bool = False) -> list[Document]:
+        """
+        upsertのうち、埋め込みを必要としない処理(不要なチャンクの削除、変更のないチャンクのmetadataの更新)を行う。
+        :return: ベクトル化して格納する必要のあるチャンク
+        """
+        if append_vectors:
             logger.info("append_vectors is True. skip delete existing documents.")
-            
-        # ドキュメントを格納する。
-        await self.add_documents(data_list)
+            if data_list:
+                self.__check_embedding_dimensions__()
+            return data_list
 
-        return True
+        # 既存チャンクとの差分を取り、追加・変更されたチャンクのみをベクトル化する
+        source_id_key = self.client.llm_config.source_id_key
+        source_ids = list(dict.fromkeys([data.metadata.get(source_id_key, "") for data in data_list]))
+        conditions = ConditionContainer().add_in_condition(source_id_key, source_ids)
+        existing_ids, existing_docs = await self.get_documents(conditions, include_documents=False)
 
-    # RateLimitErrorが発生した場合は、指数バックオフを行う
-    async def add_doucment_with_retry(self, vector_db: VectorStore, documents: list[Document], max_retries: int = 5, delay: float = 1.0):
-        for attempt in range(max_retries):
-            try:
-                await vector_db.aadd_documents(documents=documents)
-                return
-            except RateLimitError as e:
-                if attempt < max_retries - 1:
-                    logger.warning(f"RateLimitError: {e}. Retrying in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    delay *= 2
-                else:
-                    logger.error(f"Max retries reached. Failed to add documents: {e}")
-                    break
-            except Exception as e:
-                logger.error(f"Error adding documents: {e}")
-                break
+        added_docs, unchanged_ids, unchanged_metadatas, removed_ids = self._diff_chunks_(existing_ids, existing_docs, data_list)
+        logger.debug(f"upsert diff: added={len(added_docs)}, unchanged={len(unchanged_ids)}, removed={len(removed_ids)}")
+
+        # 新しいチャンク分割に存在しないチャンクを削除
+        await self.delete_documents_by_ids(removed_ids)
+        # 変更のないチャンクはベクトルを保持したままメタデータのみ更新
+        if unchanged_ids:
+            self._update_metadatas_(unchanged_ids, unchanged_metadatas)
+            self.__sync_exact_index__(upserted_ids=unchanged_ids)
+            self.__sync_chunk_mirror__(updated_ids=unchanged_ids, updated_metadatas=unchanged_metadatas)
+        # 埋め込みAPIを呼び出す前に、設定の次元数とコレクションの次元数を確認する
+        if added_docs:
+            self.__check_embedding_dimensions__()
+        return added_docs
+
+    def _diff_chunks_(
+            self, existing_ids: list[str], existing_docs: list[Document], data_list: list[Document]
+            ) -> Tuple[List[Document], List[str], List[dict[str, Any]], List[str]]:
+        """
+        既存チャンクと新しいチャンクをsource_idとcontent_hashで突き合わせる。
+        :return: (追加するDocument, 変更のないvector id, 変更のないチャンクの新しいmetadata, 削除するvector id)
+        """
+        source_id_key = self.client.llm_config.source_id_key
+        content_hash_key = self.client.llm_config.content_hash_key
+
+        # (source_id, content_hash) -> (vector id, metadata)のリスト。content_hashを持たない既存チャンクは再ベクトル化の対象とする
+        existing_map: dict[Tuple[str, str], list[Tuple[str, dict[str, Any]]]] = {}
+        removed_ids: list[str] = []
+        for vector_id, doc in zip(existing_ids, existing_docs):
+            content_hash = doc.metadata.get(content_hash_key, None)
+            if not content_hash:
+                removed_ids.append(vector_id)
+                continue
+            key = (doc.metadata.get(source_id_key, ""), content_hash)
+            existing_map.setdefault(key, []).append((vector_id, doc.metadata))
+
+        added_docs: list[Document] = []
+        unchanged_ids: list[str] = []
+        unchanged_metadatas: list[dict[str, Any]] = []
+        for doc in data_list:
+            key = (doc.metadata.get(source_id_key, ""), doc.metadata.get(content_hash_key, ""))
+            matched = existing_map.get(key)
+            if matched:
+                vector_id, old_metadata = matched.pop()
+                # 新しいmetadataに存在しないキー(first_documentなど)はNoneにして削除対象とする
+                metadata = {k: None for k in old_metadata if k not in doc.metadata}
+                metadata.update(doc.metadata)
+                unchanged_ids.append(vector_id)
+                unchanged_metadatas.append(metadata)
+            else:
+                added_docs.append(doc)
 
-    async def vector_search(self, query: str, category: str = "", conditions: ConditionContainer = ConditionContainer(), k: int = 5) -> List[Document]:
+        for entries in existing_map.values():
+            removed_ids.extend([vector_id for vector_id, _ in entries])
+
+        return added_docs, unchanged_ids, unchanged_metadatas, removed_ids
+
+    # 埋め込みAPIの呼び出しはプロセス共通のEmbeddingSchedulerを経由し、レート制限とリトライを行う
+    async def embed_documents_with_retry(self, documents: list[Document]) -> np.ndarray:
+        scheduler = EmbeddingScheduler.get_instance(self.client.llm_config)
+        texts = [doc.page_content for doc in documents]
+        try:
+            embeddings = await scheduler.run(lambda: self.client.embedding.aembed_documents(texts), estimate_tokens(texts))
+        except Exception as e:
+            logger.error(f"Failed to embed documents: {e}")
+            raise
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+    async def vector_search(
+            self, query: str, category: str = "", conditions: ConditionContainer = ConditionContainer(), k: int = 5,
+            search_ef: Optional[int] = None, exact: bool = False, include_documents: bool = True,
+            mmr: bool = False, fetch_k: int = 20, lambda_mult: float = 0.5
+            ) -> List[Document]:
         """
         ベクトルDBからドキュメントを検索する。
         :param query: 検索クエリ
         :param search_kwargs: 検索キーワード
+        :param search_ef: このクエリのみに適用するHNSWのef。Noneの場合はコレクションの設定値
+        :param exact: Trueの場合はHNSWを使わず、全チャンクとのコサイン類似度で厳密検索する
+        :param include_documents: Falseの場合、チャンク本文を取得しないベクトルDBでは本文を空文字とする
+        :param mmr: Trueの場合、fetch_k件の候補を埋め込みベクトルとともに取得し、MMRでk件に絞る
+        :param fetch_k: MMRの候補数。kより小さい場合はk
+        :param lambda_mult: MMRでクエリとの類似度に掛ける重み。0に近いほど多様性を重視する
         :return: 検索結果のドキュメントリスト
         """
         if self.db is None:
             raise ValueError("db is None")
 
         # categoryが指定されている場合はconditionsに追加
+        # 呼び出し元(デフォルト引数を含む)のConditionContainerを変更しないようコピーしてから追加する
         if category:
             category_key = self.client.llm_config.category_key
-            conditions.add_in_condition(category_key, [category])
+            conditions = conditions.model_copy(deep=True).add_in_condition(category_key, [category])
 
-        search_kwargs: dict[str, Any] = self._create_search_kwargs_(k, conditions)
+        self.__check_embedding_dimensions__()
+        scheduler = EmbeddingScheduler.get_instance(self.client.llm_config)
+        if exact:
+            exact_search_max_chunks = self.client.llm_config.exact_search_max_chunks
+            if self._get_count_() > exact_search_max_chunks:
+                logger.warning(f"Collection exceeds EXACT_SEARCH_MAX_CHUNKS({exact_search_max_chunks}). Fall back to HNSW search.")
+                exact = False
 
-        docs_and_scores = self.db.similarity_search_with_relevance_scores(query, **search_kwargs)
+        if mmr:
+            # 埋め込みは1回とし、候補とベクトルを取得してNumPyの行列演算で並べ替える
+            fetch_k = max(fetch_k, k)
+            query_vector = await scheduler.run(lambda: self.client.embedding.aembed_query(query), estimate_tokens([query]))
+            self.__check_embedding_dimensions__(len(query_vector))
+            if exact:
+                index = await self.get_exact_index()
+                docs_and_scores = index.search(query_vector, fetch_k, conditions)
+                embeddings = index.get_vectors_by_ids([doc.id for doc, _ in docs_and_scores])
+            else:
+                docs_and_scores, embeddings = await asyncio.to_thread(
+                    self._similarity_search_with_embeddings_,
+                    query_vector, fetch_k, self._create_search_kwargs_(fetch_k, conditions), search_ef, include_documents)
+            selected = maximal_marginal_relevance(np.asarray(query_vector), embeddings, k, lambda_mult)
+            docs_and_scores = [docs_and_scores[i] for i in selected]
+        elif exact:
+            index = await self.get_exact_index()
+            query_vector = await scheduler.run(lambda: self.client.embedding.aembed_query(query), estimate_tokens([query]))
+            self.__check_embedding_dimensions__(len(query_vector))
+            docs_and_scores = index.search(query_vector, k, conditions)
+        elif conditions.conditions and self.approximate_search and self.client.llm_config.filter_planner:
+            query_vector = await scheduler.run(lambda: self.client.embedding.aembed_query(query), estimate_tokens([query]))
+            self.__check_embedding_dimensions__(len(query_vector))
+            docs_and_scores = await self.__filtered_search__(query_vector, k, conditions, search_ef, include_documents)
+        else:
+            search_kwargs: dict[str, Any] = self._create_search_kwargs_(k, conditions)
+
+            # クエリの埋め込み(同期のHTTP呼び出し)と検索はブロッキングのため、イベントループを止めないようスレッドで実行する
+            async def _search_():
+                return await asyncio.to_thread(self._similarity_search_, query, k, search_kwargs, search_ef, include_documents)
+
+            docs_and_scores = await scheduler.run(_search_, estimate_tokens([query]))
         # documentのmetadataにscoreを追加
         doc_ids: set[str] = set()
         documents: List[Document] = []
@@ -185,6 +680,85 @@ class LangChainVectorDB(ABC):
 
         return documents  
 
+    async def __filtered_search__(
+            self, query_vector: List[float], k: int, conditions: ConditionContainer, search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        """
+        フィルタに一致するチャンク数から検索方法を選び、一致するチャンクがk件以上あれば必ずk件返す。
+        - 一致数がFILTER_PREFILTER_MAX_CHUNKS以下: 一致するチャンクのベクトルのみを取得して厳密検索する
+        - 一致する割合がFILTER_ANN_MIN_SELECTIVITY未満: k / 割合 件を取得する近似検索
+        - それ以外: k件の近似検索
+        近似検索の結果がk件に満たない場合は取得件数を倍にして再検索し、チャンク数まで増やしても満たない場合は厳密検索する。
+        """
+        config = self.client.llm_config
+        if self.chunk_count is None:
+            self.chunk_count = self._count_documents_()
+        total = self.chunk_count
+        matched = self._count_documents_(conditions)
+        if matched == 0:
+            return []
+        selectivity = matched / max(total, 1)
+        if matched <= config.filter_prefilter_max_chunks:
+            logger.debug(f"Filtered search plan: prefilter, matched={matched}, selectivity={selectivity:.4f}")
+            return await self.__prefilter_search__(query_vector, k, conditions, include_documents)
+
+        expected = min(k, matched)
+        fetch_k = k if selectivity >= config.filter_ann_min_selectivity else math.ceil(k / selectivity)
+        logger.debug(f"Filtered search plan: ann, matched={matched}, selectivity={selectivity:.4f}, fetch_k={fetch_k}")
+        default_search_ef = config.get_hnsw_params(self.collection_name)["search_ef"]
+        while True:
+            fetch_k = min(fetch_k, total)
+            # 取得件数がefを超える場合は、取得件数をefとして探索範囲を広げる
+            ef = fetch_k if fetch_k > (search_ef or default_search_ef) else search_ef
+            docs_and_scores = await asyncio.to_thread(
+                self._similarity_search_by_vector_,
+                query_vector, fetch_k, self._create_search_kwargs_(fetch_k, conditions), ef, include_documents)
+            if len(docs_and_scores) >= expected:
+                return docs_and_scores[:k]
+            if fetch_k >= total:
+                break
+            fetch_k *= 2
+        logger.info(f"Approximate search returned {len(docs_and_scores)} of {expected} chunks. Fall back to exact search over {matched} chunks.")
+        return await self.__prefilter_search__(query_vector, k, conditions, include_documents)
+
+    async def __prefilter_search__(
+            self, query_vector: List[float], k: int, conditions: ConditionContainer, include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        # 条件に一致するチャンクのベクトルのみを読み込み、コサイン類似度で厳密検索する
+        if include_documents:
+            ids, embeddings, documents = await asyncio.to_thread(
+                self._get_embeddings_, self._get_ids_by_conditions_(conditions), include_documents=True)
+        else:
+            # 本文を取得しない場合、metadataはミラー(ミラーがない場合はベクトルDB)から、ベクトルのみをベクトルDBから取得する
+            metadata_ids, metadata_documents = await self.get_documents(conditions, include_documents=False)
+            if not metadata_ids:
+                return []
+            ids, embeddings, _ = await asyncio.to_thread(self._get_embeddings_, metadata_ids)
+            documents_by_id = dict(zip(metadata_ids, metadata_documents))
+            documents = [
+                Document(id=doc_id, page_content="", metadata=documents_by_id[doc_id].metadata) for doc_id in ids
+            ]
+        if not ids:
+            return []
+        index = ExactSearchIndex()
+        index.load(ids, embeddings, documents)
+        return index.search(query_vector, k)
+
+    async def vector_search_by_vector(
+            self, embedding: List[float], k: int = 5, conditions: ConditionContainer = ConditionContainer(),
+            search_ef: Optional[int] = None
+            ) -> List[Tuple[Document, float]]:
+        """
+        埋め込みベクトルでHNSWインデックスを検索する。埋め込みAPIは呼び出さない。
+        :return: (Document, スコア)のリスト。Documentのidにvector idを設定する
+        """
+        if self.db is None:
+            raise ValueError("db is None")
+        self.__check_embedding_dimensions__(len(embedding))
+        search_kwargs: dict[str, Any] = self._create_search_kwargs_(k, conditions)
+        return await asyncio.to_thread(self._similarity_search_by_vector_, embedding, k, search_kwargs, search_ef)
+
 class LangChainVectorDBChroma(LangChainVectorDB):
 
     def __init__(self, client: LangchainClient, vector_db_url: str, collection_name: str = "") -> None:
@@ -198,17 +772,24 @@ class LangChainVectorDBChroma(LangChainVectorDB):
             os.makedirs(self.vector_db_url)
             # ディレクトリが作成されたことをログに出力
             logger.info(f"create directory:{self.vector_db_url}")
+        # chromadb、langchain_chromaはVECTOR_DB_TYPE=chromaの場合のみ読み込む
+        import chromadb
+        import chromadb.config
+        from langchain_chroma.vectorstores import Chroma # type: ignore
+
         # params
         settings = chromadb.config.Settings(anonymized_telemetry=False)
 
         params: dict[str, Any]= {}
         params["client"] = chromadb.PersistentClient(path=self.vector_db_url, settings=settings)
         params["embedding_function"] = self.client.embedding
+        # HNSWのパラメータはコレクションごとに設定から取得する。M, construction_efはコレクション作成時のみ有効
+        hnsw_params = self.client.llm_config.get_hnsw_params(self.collection_name)
         params["collection_metadata"] = {
             "hnsw:space":"cosine", 
-            "hnsw:construction_ef": 400, 
-            "hnsw:search_ef": 200,
-            "hnsw:M": 24,
+            "hnsw:construction_ef": hnsw_params["construction_ef"], 
+            "hnsw:search_ef": hnsw_params["search_ef"],
+            "hnsw:M": hnsw_params["M"],
         }
         # collectionが指定されている場合
         logger.info(f"collection_name:{self.collection_name}")
@@ -219,6 +800,147 @@ class LangChainVectorDBChroma(LangChainVectorDB):
             **params
             )
         self.db = db
+        self.__apply_search_ef__(hnsw_params["search_ef"])
+        self.chunk_mirror = self.__create_chunk_mirror__()
+
+    def __apply_search_ef__(self, search_ef: int):
+        # 既存コレクションのsearch_efが設定値と異なる場合は更新する(次回のコレクション読み込みから有効)
+        collection = self.db._collection # type: ignore
+        configuration = getattr(collection, "configuration", None) or {}
+        hnsw_configuration = configuration.get("hnsw") or {}
+        current_search_ef = hnsw_configuration.get("ef_search")
+        if current_search_ef is not None and current_search_ef != search_ef:
+            logger.info(f"Update hnsw search_ef of collection {self.collection_name}: {current_search_ef} -> {search_ef}")
+            try:
+                collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+            except Exception as e:
+                logger.warning(f"Failed to update hnsw search_ef: {e}")
+
+    def _similarity_search_(
+            self, query: str, k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None, include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        if self.db is None:
+            raise ValueError("db is None")
+        # HNSWは max(ef, 取得件数) で探索するため、efを上げる場合はef件取得して上位k件に絞る。
+        # コレクションのsearch_efより小さい値にはできない
+        if search_ef is not None and search_ef > k:
+            search_kwargs = {**search_kwargs, "k": search_ef}
+        if not include_documents:
+            return self.__query_without_documents__(self.client.embedding.embed_query(query), search_kwargs)[:k]
+        return self.db.similarity_search_with_relevance_scores(query, **search_kwargs)[:k]
+
+    def __query_without_documents__(self, embedding: List[float], search_kwargs: dict[str, Any]) -> List[Tuple[Document, float]]:
+        # langchain_chromaは常に本文を取得するため、コレクションに直接問い合わせてmetadataと距離のみ取得する
+        params: dict[str, Any] = {
+            "query_embeddings": [embedding],
+            "n_results": search_kwargs["k"],
+            "include": ["metadatas", "distances"],
+        }
+        if search_kwargs.get("filter"):
+            params["where"] = search_kwargs["filter"]
+        result = self.db._collection.query(**params) # type: ignore
+        # コサイン距離を類似度に変換する(langchain_chromaの関連度と同じ)
+        return [
+            (Document(id=doc_id, page_content="", metadata=metadata or {}), 1.0 - distance)
+            for doc_id, metadata, distance in zip(result["ids"][0], result["metadatas"][0], result["distances"][0])
+        ]
+
+    def _similarity_search_by_vector_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        if self.db is None:
+            raise ValueError("db is None")
+        if search_ef is not None and search_ef > k:
+            search_kwargs = {**search_kwargs, "k": search_ef}
+        if not include_documents:
+            return self.__query_without_documents__(embedding, search_kwargs)[:k]
+        return self.db.similarity_search_by_vector_with_relevance_scores(embedding, **search_kwargs)[:k] # type: ignore
+
+    def _similarity_search_with_embeddings_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        if self.db is None:
+            raise ValueError("db is None")
+        # 検索結果の埋め込みベクトルも同じ問い合わせで取得する
+        include = ["metadatas", "distances", "embeddings"] + (["documents"] if include_documents else [])
+        params: dict[str, Any] = {"query_embeddings": [embedding], "n_results": max(k, search_ef or 0), "include": include}
+        if search_kwargs.get("filter"):
+            params["where"] = search_kwargs["filter"]
+        result = self.db._collection.query(**params) # type: ignore
+        page_contents = result["documents"][0] if include_documents else [""] * len(result["ids"][0])
+        docs_and_scores = [
+            (Document(id=doc_id, page_content=page_content or "", metadata=metadata or {}), 1.0 - distance)
+            for doc_id, page_content, metadata, distance in zip(result["ids"][0], page_contents, result["metadatas"][0], result["distances"][0])
+        ][:k]
+        embeddings = np.asarray(result["embeddings"][0], dtype=np.float32)[:len(docs_and_scores)]
+        return docs_and_scores, embeddings.reshape(len(docs_and_scores), -1)
+
+    def _get_count_(self) -> int:
+        if self.db is None:
+            raise ValueError("db is None")
+        return self.db._collection.count() # type: ignore
+
+    def _get_ids_(self) -> List[str]:
+        if self.db is None:
+            raise ValueError("db is None")
+        return self.db.get(include=[])["ids"] # type: ignore
+
+    def _add_embeddings_(self, ids: List[str], embeddings: np.ndarray, documents: List[Document]) -> None:
+        if self.db is None:
+            raise ValueError("db is None")
+        # Chromaは空のmetadataを許容しないためNoneとする。1回の書き込み件数はクライアントの上限に合わせて分割する
+        batch_size = self.db._client.get_max_batch_size() # type: ignore
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self.db._collection.upsert( # type: ignore
+                ids=ids[start:end], embeddings=embeddings[start:end], documents=[doc.page_content for doc in documents[start:end]],
+                metadatas=[doc.metadata or None for doc in documents[start:end]] # type: ignore
+            )
+
+    def _get_collection_metadata_(self) -> dict[str, Any]:
+        if self.db is None:
+            raise ValueError("db is None")
+        return dict(self.db._collection.metadata or {}) # type: ignore
+
+    def _update_collection_metadata_(self, metadata: dict[str, Any]) -> None:
+        if self.db is None:
+            raise ValueError("db is None")
+        collection = self.db._collection # type: ignore
+        # hnsw:*のキーは作成後に変更できないため、それ以外のキーのみ引き継いで更新する
+        merged = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+        merged.update(metadata)
+        collection.modify(metadata=merged)
+
+    def _get_embeddings_(
+            self, ids: Optional[List[str]] = None, include_documents: bool = False, page_size: int = 1000
+            ) -> Tuple[List[str], np.ndarray, List[Document]]:
+        if self.db is None:
+            raise ValueError("db is None")
+        include = ["embeddings", "documents", "metadatas"] if include_documents else ["embeddings"]
+        result_ids: list[str] = []
+        pages: list[np.ndarray] = []
+        documents: list[Document] = []
+        offset = 0
+        while True:
+            if ids is None:
+                doc_dict = self.db.get(include=include, limit=page_size, offset=offset) # type: ignore
+            else:
+                doc_dict = self.db.get(ids=ids[offset:offset + page_size], include=include) # type: ignore
+            page_ids = doc_dict.get("ids", []) or []
+            if page_ids:
+                result_ids.extend(page_ids)
+                pages.append(np.asarray(doc_dict.get("embeddings"), dtype=np.float32))
+                if include_documents:
+                    for doc_id, page_content, metadata in zip(page_ids, doc_dict["documents"], doc_dict["metadatas"]):
+                        documents.append(Document(id=doc_id, page_content=page_content or "", metadata=metadata or {}))
+            offset += page_size
+            if (ids is None and len(page_ids) < page_size) or (ids is not None and offset >= len(ids)):
+                break
+        if not pages:
+            return result_ids, np.zeros((0, 0), dtype=np.float32), documents
+        return result_ids, np.vstack(pages), documents
 
     # メタデータのみ更新する
     def _update_metadata_(self, doc_ids: list[str], metadata: dict[str, Any]) -> bool:
@@ -228,23 +950,46 @@ class LangChainVectorDBChroma(LangChainVectorDB):
             self.db._collection.update(ids=[doc_id], metadatas=[metadata]) # type: ignore
         return True
 
-    def _get_documents_(self, conditions: ConditionContainer = ConditionContainer()) -> Tuple[List[str], List[Document]]:
+    def _update_metadatas_(self, doc_ids: list[str], metadatas: list[dict[str, Any]]) -> bool:
+        if self.db is None:
+            raise ValueError("db is None")
+        self.db._collection.update(ids=doc_ids, metadatas=metadatas) # type: ignore
+        return True
+
+    def _get_distinct_metadata_values_(self, key: str, page_size: int = 1000) -> set[Any]:
+        if self.db is None:
+            raise ValueError("db is None")
+        # metadataのみをページ単位で取得する
+        values: set[Any] = set()
+        offset = 0
+        while True:
+            doc_dict = self.db.get(include=["metadatas"], limit=page_size, offset=offset) # type: ignore
+            metadata_list: list[dict[str, Any]] = doc_dict.get("metadatas", []) or []
+            for metadata in metadata_list:
+                if metadata and key in metadata:
+                    values.add(metadata[key])
+            if len(metadata_list) < page_size:
+                break
+            offset += page_size
+        return values
+
+    def _get_documents_(self, conditions: ConditionContainer = ConditionContainer(), include_documents: bool = True) -> Tuple[List[str], List[Document]]:
         ids=[]
         logger.debug(f"conditions:{conditions}")
         
+        params: dict[str, Any] = {"include": ["documents", "metadatas"] if include_documents else ["metadatas"]}
         condition_dict = conditions.build()
         if condition_dict:
-            doc_dict = self.db.get(where=condition_dict) # type: ignore
-        else:
-            doc_dict = self.db.get() # type: ignore
+            params["where"] = condition_dict
+        doc_dict = self.db.get(**params) # type: ignore
 
         # デバッグ用
         logger.debug(f"_get_document_ids_by_tag doc_dict: {doc_dict}")
 
         # vector idを取得してidsに追加
         ids.extend(doc_dict.get("ids", []))
-        content_list = doc_dict.get("documents", [])
         metadata_list: list[dict[str, Any]] = doc_dict.get("metadatas", [])
+        content_list = doc_dict.get("documents") or [""] * len(metadata_list)
 
         documents = [
             Document(
@@ -254,10 +999,44 @@ class LangChainVectorDBChroma(LangChainVectorDB):
         ]   
         return ids, documents
 
+    def _get_documents_page_(self, conditions: ConditionContainer, cursor: str, limit: int, include_documents: bool = True) -> Tuple[List[str], List[Document], str]:
+        if self.db is None:
+            raise ValueError("db is None")
+        # Chromaのgetはvector idの範囲で絞り込めないため、ページのvector idはチャンクのmetadataのミラーからキーセットで求め、
+        # Chromaからはvector idを指定して読み込む。cursorはミラーから読み込む場合と同じvector idとする
+        mirror = self.__get_chunk_mirror__()
+        page_ids, mirror_documents = mirror.get_documents(conditions.to_sqlite_sql(columns=mirror.columns), cursor, limit)
+        next_cursor = page_ids[-1] if len(page_ids) == limit else ""
+        if not include_documents or not page_ids:
+            return page_ids, mirror_documents, next_cursor
+        doc_dict = self.db.get(ids=page_ids, include=["documents", "metadatas"])
+        # getの結果はvector idの順とは限らないため、ページのvector idの順に並べる
+        found = {
+            doc_id: Document(page_content=content or "", metadata=metadata or {})
+            for doc_id, content, metadata in zip(doc_dict.get("ids", []), doc_dict.get("documents") or [], doc_dict.get("metadatas") or [])
+        }
+        ids = [doc_id for doc_id in page_ids if doc_id in found]
+        return ids, [found[doc_id] for doc_id in ids], next_cursor
+
+    def _get_metadata_page_(self, cursor: str, limit: int) -> Tuple[List[str], List[dict[str, Any]], str]:
+        if self.db is None:
+            raise ValueError("db is None")
+        # ミラーを作り直すため、Chromaの全チャンクを格納順のoffsetで読み込む
+        offset = int(cursor or 0)
+        doc_dict = self.db.get(limit=limit, offset=offset, include=["metadatas"])
+        ids = doc_dict.get("ids", [])
+        metadatas = [metadata or {} for metadata in doc_dict.get("metadatas", []) or []]
+        next_cursor = str(offset + len(ids)) if len(ids) == limit else ""
+        return ids, metadatas, next_cursor
+
     
 class LangChainVectorDBPGVector(LangChainVectorDB):
 
     def __init__(self, client: LangchainClient, vector_db_url: str, collection_name: str = ""):
+        # langchain_postgres、sqlalchemyはVECTOR_DB_TYPE=pgvectorの場合のみ読み込む
+        from langchain_postgres.vectorstores import PGVector
+        from sqlalchemy import event
+
         self.client: LangchainClient = client
         self.vector_db_url: str = vector_db_url
         self.collection_name: str = collection_name
@@ -266,6 +1045,9 @@ class LangChainVectorDBPGVector(LangChainVectorDB):
         params["connection"] = self.vector_db_url
         params["embeddings"] = self.client.embedding
         params["use_jsonb"] = True
+        # 次元数が決まっている場合はembedding列をvector(次元数)で作成し、異なる次元数のベクトルをDBでも拒否する
+        if self.client.llm_config.embedding_dimensions:
+            params["embedding_length"] = self.client.llm_config.embedding_dimensions
         
         # collectionが指定されている場合
         logger.info("collection_name:", self.collection_name)
@@ -276,48 +1058,274 @@ class LangChainVectorDBPGVector(LangChainVectorDB):
             **params
             )
         self.db = db
+        self.chunk_mirror = self.__create_chunk_mirror__()
+
+        # hnsw.ef_searchは検索クエリと同じトランザクションでSET LOCALする
+        self.search_ef: int = self.client.llm_config.get_hnsw_params(self.collection_name)["search_ef"]
+        self.search_ef_var: ContextVar[Optional[int]] = ContextVar(f"search_ef_{id(self)}", default=None)
+        engine = getattr(db, "_engine", None)
+        if engine is not None:
+            event.listen(engine, "before_cursor_execute", self.__set_search_ef__)
+
+    def __session__(self) -> Any:
+        import sqlalchemy
+        from sqlalchemy.orm import Session
+        return Session(sqlalchemy.create_engine(self.vector_db_url))
+
+    @staticmethod
+    def __text__(sql: str) -> Any:
+        from sqlalchemy.sql import text
+        return text(sql)
+
+    def __set_search_ef__(self, conn, cursor, statement, parameters, context, executemany):
+        search_ef = self.search_ef_var.get()
+        if search_ef is not None and not executemany:
+            cursor.execute(f"SET LOCAL hnsw.ef_search = {int(search_ef)}")
+
+    def _similarity_search_(
+            self, query: str, k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None, include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        if self.db is None:
+            raise ValueError("db is None")
+        token = self.search_ef_var.set(search_ef if search_ef is not None else self.search_ef)
+        try:
+            if not include_documents:
+                return self.__query_without_documents__(self.client.embedding.embed_query(query), k, search_kwargs.get("filter"))
+            return self.db.similarity_search_with_relevance_scores(query, **search_kwargs)
+        finally:
+            self.search_ef_var.reset(token)
+
+    def __query_without_documents__(self, embedding: List[float], k: int, filter: Optional[dict[str, Any]]) -> List[Tuple[Document, float]]:
+        # PGVectorは常にdocument列を取得するため、同じフィルタと距離でid、cmetadataのみをSELECTする
+        import sqlalchemy
+        db: Any = self.db
+        with db._make_sync_session() as session: # type: ignore
+            collection = db.get_collection(session)
+            if not collection:
+                raise ValueError("Collection not found")
+            filter_by = [db.EmbeddingStore.collection_id == collection.uuid]
+            if filter:
+                filter_clause = db._create_filter_clause(filter)
+                if filter_clause is not None:
+                    filter_by.append(filter_clause)
+            rows = (
+                session.query(
+                    db.EmbeddingStore.id, db.EmbeddingStore.cmetadata, db.distance_strategy(embedding).label("distance")
+                )
+                .filter(*filter_by)
+                .order_by(sqlalchemy.asc("distance"))
+                .limit(k)
+                .all()
+            )
+        # コサイン距離を類似度に変換する
+        return [(Document(id=str(row[0]), page_content="", metadata=row[1] or {}), 1.0 - float(row[2])) for row in rows]
+
+    def _similarity_search_by_vector_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        if self.db is None:
+            raise ValueError("db is None")
+        token = self.search_ef_var.set(search_ef if search_ef is not None else self.search_ef)
+        try:
+            if not include_documents:
+                return self.__query_without_documents__(embedding, k, search_kwargs.get("filter"))
+            # PGVectorはコサイン距離を返すため類似度に変換する
+            docs_and_distances = self.db.similarity_search_with_score_by_vector(embedding, **search_kwargs) # type: ignore
+            return [(doc, 1.0 - distance) for doc, distance in docs_and_distances]
+        finally:
+            self.search_ef_var.reset(token)
+
+    def _similarity_search_with_embeddings_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> Tuple[List[Tuple[Document, float]], np.ndarray]:
+        # 検索結果のembedding列も同じSELECTで取得する
+        import sqlalchemy
+        db: Any = self.db
+        token = self.search_ef_var.set(search_ef if search_ef is not None else self.search_ef)
+        try:
+            with db._make_sync_session() as session: # type: ignore
+                collection = db.get_collection(session)
+                if not collection:
+                    raise ValueError("Collection not found")
+                filter_by = [db.EmbeddingStore.collection_id == collection.uuid]
+                filter = search_kwargs.get("filter")
+                if filter:
+                    filter_clause = db._create_filter_clause(filter)
+                    if filter_clause is not None:
+                        filter_by.append(filter_clause)
+                document_column = db.EmbeddingStore.document if include_documents else sqlalchemy.null()
+                rows = (
+                    session.query(
+                        db.EmbeddingStore.id, document_column, db.EmbeddingStore.cmetadata, db.EmbeddingStore.embedding,
+                        db.distance_strategy(embedding).label("distance")
+                    )
+                    .filter(*filter_by)
+                    .order_by(sqlalchemy.asc("distance"))
+                    .limit(k)
+                    .all()
+                )
+        finally:
+            self.search_ef_var.reset(token)
+        docs_and_scores = [
+            (Document(id=str(row[0]), page_content=row[1] or "", metadata=row[2] or {}), 1.0 - float(row[4])) for row in rows
+        ]
+        embeddings = np.asarray([np.asarray(row[3], dtype=np.float32) for row in rows], dtype=np.float32)
+        return docs_and_scores, embeddings.reshape(len(rows), -1)
+
+    def _get_count_(self) -> int:
+        with self.__session__() as session:
+            stmt = self.__text__('''
+                SELECT count(*)
+                FROM langchain_pg_embedding e
+                JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                WHERE c.name = :name
+            ''').bindparams(name=self.collection_name)
+            return int(session.execute(stmt).scalar() or 0)
+
+    def _get_ids_(self) -> List[str]:
+        with self.__session__() as session:
+            stmt = self.__text__('''
+                SELECT e.id
+                FROM langchain_pg_embedding e
+                JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                WHERE c.name = :name
+                ORDER BY e.id
+            ''').bindparams(name=self.collection_name)
+            return [str(row[0]) for row in session.execute(stmt).all()]
+
+    def _add_embeddings_(self, ids: List[str], embeddings: np.ndarray, documents: List[Document]) -> None:
+        if self.db is None:
+            raise ValueError("db is None")
+        self.db.add_embeddings( # type: ignore
+            texts=[doc.page_content for doc in documents], embeddings=embeddings.tolist(),
+            metadatas=[doc.metadata for doc in documents], ids=ids
+        )
+
+    def _get_collection_metadata_(self) -> dict[str, Any]:
+        with self.__session__() as session:
+            stmt = self.__text__("SELECT cmetadata FROM langchain_pg_collection WHERE name = :name").bindparams(name=self.collection_name)
+            row = session.execute(stmt).fetchone()
+        if not row or not row[0]:
+            return {}
+        return row[0] if isinstance(row[0], dict) else json_codec.loads(row[0])
+
+    def _update_collection_metadata_(self, metadata: dict[str, Any]) -> None:
+        with self.__session__() as session:
+            stmt = self.__text__('''
+                UPDATE langchain_pg_collection
+                SET cmetadata = (COALESCE(cmetadata::jsonb, '{}'::jsonb) || CAST(:metadata AS jsonb))::json
+                WHERE name = :name
+            ''').bindparams(metadata=json_codec.dumps(metadata), name=self.collection_name)
+            session.execute(stmt)
+            session.commit()
+
+    def _get_embeddings_(self, ids: Optional[List[str]] = None, include_documents: bool = False) -> Tuple[List[str], np.ndarray, List[Document]]:
+        columns = "e.id, e.embedding::text, e.document, e.cmetadata" if include_documents else "e.id, e.embedding::text"
+        query = f'''
+            SELECT {columns}
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+            WHERE c.name = :name
+        '''
+        params: dict[str, Any] = {"name": self.collection_name}
+        if ids is not None:
+            query += " AND e.id = ANY(:ids)"
+            params["ids"] = list(ids)
+        with self.__session__() as session:
+            rows = session.execute(self.__text__(query), params).all()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32), []
+        result_ids = [str(row[0]) for row in rows]
+        embeddings = np.asarray([json_codec.loads(row[1]) for row in rows], dtype=np.float32)
+        documents: list[Document] = []
+        if include_documents:
+            documents = [Document(id=str(row[0]), page_content=row[2] or "", metadata=row[3] or {}) for row in rows]
+        return result_ids, embeddings, documents
 
     # メタデータのみ更新する
     def _update_metadata_(self, doc_ids: list[str], metadata: dict[str, Any]) -> bool:
         if self.db is None:
             raise ValueError("db is None")
-        metadata_json = json.dumps(metadata, ensure_ascii=False)
-        engine = sqlalchemy.create_engine(self.vector_db_url)
-        with Session(engine) as session:
-            stmt = text("UPDATE langchain_pg_embedding SET metadata: metadata  WHERE document_id in :document_ids").bindparams(
+        metadata_json = json_codec.dumps(metadata)
+        with self.__session__() as session:
+            stmt = self.__text__("UPDATE langchain_pg_embedding SET metadata: metadata  WHERE document_id in :document_ids").bindparams(
                 metadata=metadata_json,
                 document_ids=doc_ids)
             session.execute(stmt)
             session.commit()
         return True
+
+    def _update_metadatas_(self, doc_ids: list[str], metadatas: list[dict[str, Any]]) -> bool:
+        if self.db is None:
+            raise ValueError("db is None")
+        params = [
+            {"id": doc_id, "cmetadata": json_codec.dumps({k: v for k, v in metadata.items() if v is not None})}
+            for doc_id, metadata in zip(doc_ids, metadatas)
+        ]
+        with self.__session__() as session:
+            stmt = self.__text__("UPDATE langchain_pg_embedding SET cmetadata = CAST(:cmetadata AS jsonb) WHERE id = :id")
+            session.execute(stmt, params)
+            session.commit()
+        return True
         
-    def _get_documents_(self, conditions: Optional[ConditionContainer] = None) -> Tuple[List[str], List[Document]]:
-        engine = sqlalchemy.create_engine(self.vector_db_url)
-        with Session(engine) as session:
-            stmt = text("SELECT uuid FROM langchain_pg_collection WHERE name=:name").bindparams(name=self.collection_name)
+    def _get_distinct_metadata_values_(self, key: str) -> set[Any]:
+        with self.__session__() as session:
+            stmt = self.__text__('''
+                SELECT DISTINCT e.cmetadata->>:key
+                FROM langchain_pg_embedding e
+                JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+                WHERE c.name = :name AND e.cmetadata ? :key
+            ''').bindparams(key=key, name=self.collection_name)
+            rows = session.execute(stmt).all()
+            return {row[0] for row in rows}
+
+    def _get_documents_(self, conditions: Optional[ConditionContainer] = None, include_documents: bool = True) -> Tuple[List[str], List[Document]]:
+        return self.__select_documents__(conditions, include_documents=include_documents)
+
+    def _get_documents_page_(self, conditions: ConditionContainer, cursor: str, limit: int, include_documents: bool = True) -> Tuple[List[str], List[Document], str]:
+        # vector idのキーセットで読み込む
+        ids, documents = self.__select_documents__(conditions, cursor, limit, include_documents)
+        next_cursor = str(ids[-1]) if len(ids) == limit else ""
+        return ids, documents, next_cursor
+
+    def __select_documents__(
+            self, conditions: Optional[ConditionContainer] = None, after_id: str = "", limit: int = 0, include_documents: bool = True
+            ) -> Tuple[List[str], List[Document]]:
+        with self.__session__() as session:
+            stmt = self.__text__("SELECT uuid FROM langchain_pg_collection WHERE name=:name").bindparams(name=self.collection_name)
             row = session.execute(stmt).fetchone()
             if not row:
                 return ([], [])
             collection_id = row[0]
             logger.debug(f"collection_id: {collection_id}")
 
-            params = {"collection_id": collection_id}
-            if conditions:
+            params: dict[str, Any] = {"collection_id": collection_id}
+            # 本文が不要な場合はdocument列を読み込まない
+            document_column = "document" if include_documents else "''"
+            if conditions and conditions.conditions:
                 where_sql = conditions.to_postgres_sql()
                 query = f"""
-                    SELECT id, document, cmetadata
+                    SELECT id, {document_column}, cmetadata
                     FROM langchain_pg_embedding
                     WHERE collection_id=:collection_id AND {where_sql}
                 """
             else:
-                query = """
-                    SELECT id, document, cmetadata
+                query = f"""
+                    SELECT id, {document_column}, cmetadata
                     FROM langchain_pg_embedding
                     WHERE collection_id=:collection_id
                 """
+            if limit > 0:
+                if after_id:
+                    query += " AND id > :after_id"
+                    params["after_id"] = after_id
+                query += " ORDER BY id LIMIT :limit"
+                params["limit"] = limit
 
             try:
-                rows = session.execute(text(query), params).all()
+                rows = session.execute(self.__text__(query), params).all()
             except Exception as e:
                 logger.error(f"Query execution failed: {e}")
                 return ([], [])
@@ -327,11 +1335,168 @@ class LangChainVectorDBPGVector(LangChainVectorDB):
             for row in rows:
                 ids.append(row[0])
                 content = row[1]
-                cmetadata_dict = json.loads(row[2])
+                cmetadata_dict = row[2] if isinstance(row[2], dict) else json_codec.loads(row[2])
                 doc = Document(
                     page_content=content, 
                     metadata=cmetadata_dict
                 )
                 documents.append(doc)
 
-            return ids, documents
\ No newline at end of file
+            return ids, documents
+
+
+class LangChainVectorDBSQLiteMirror(LangChainVectorDB):
+    """
+    vector id、本文、metadataをアプリのSQLite DBに格納するローカルのベクトルDBの基底クラス。
+    """
+
+    def _get_store_(self) -> SQLiteMirrorVectorStore:
+        if self.db is None:
+            raise ValueError("db is None")
+        return self.db # type: ignore
+
+    def _get_count_(self) -> int:
+        return self._get_store_().get_count()
+
+    def _count_documents_(self, conditions: ConditionContainer = ConditionContainer()) -> int:
+        return self._get_store_().count_documents(conditions.to_sqlite_sql())
+
+    def _get_ids_by_conditions_(self, conditions: ConditionContainer) -> List[str]:
+        return self._get_store_().get_ids(conditions.to_sqlite_sql())
+
+    def _get_embeddings_(self, ids: Optional[List[str]] = None, include_documents: bool = False) -> Tuple[List[str], np.ndarray, List[Document]]:
+        return self._get_store_().get_embeddings(ids, include_documents)
+
+    def _update_metadata_(self, doc_ids: list[str], metadata: dict[str, Any]) -> bool:
+        self._get_store_().update_metadatas(doc_ids, [metadata for _ in doc_ids])
+        return True
+
+    def _update_metadatas_(self, doc_ids: list[str], metadatas: list[dict[str, Any]]) -> bool:
+        self._get_store_().update_metadatas(doc_ids, metadatas)
+        return True
+
+    def _get_distinct_metadata_values_(self, key: str) -> set[Any]:
+        return self._get_store_().get_distinct_metadata_values(key)
+
+    def _get_documents_(self, conditions: ConditionContainer = ConditionContainer(), include_documents: bool = True) -> Tuple[List[str], List[Document]]:
+        return self._get_store_().get_documents(conditions.to_sqlite_sql(), include_documents=include_documents)
+
+    def _get_documents_page_(self, conditions: ConditionContainer, cursor: str, limit: int, include_documents: bool = True) -> Tuple[List[str], List[Document], str]:
+        # vector idのキーセットで読み込む
+        ids, documents = self._get_store_().get_documents(conditions.to_sqlite_sql(), cursor, limit, include_documents)
+        next_cursor = ids[-1] if len(ids) == limit else ""
+        return ids, documents, next_cursor
+
+    def _get_ids_(self) -> List[str]:
+        return self._get_store_().get_ids()
+
+    def _add_embeddings_(self, ids: List[str], embeddings: np.ndarray, documents: List[Document]) -> None:
+        self._get_store_().add_embeddings(
+            [doc.page_content for doc in documents], embeddings.tolist(), [doc.metadata for doc in documents], ids
+        )
+
+    def _get_collection_metadata_(self) -> dict[str, Any]:
+        return self._get_store_().get_collection_metadata()
+
+    def _update_collection_metadata_(self, metadata: dict[str, Any]) -> None:
+        self._get_store_().update_collection_metadata(metadata)
+
+
+class LangChainVectorDBNumpy(LangChainVectorDBSQLiteMirror):
+    """
+    メモリマップしたNumPyファイルにベクトルを保持するローカルのベクトルDB。
+    vector id、本文、metadataはアプリのSQLite DBに格納する。検索は常に全件の厳密検索となる。
+    """
+    approximate_search: ClassVar[bool] = False
+
+    def __init__(self, client: LangchainClient, vector_db_url: str, collection_name: str = "") -> None:
+        self.client: LangchainClient = client
+        self.vector_db_url: str = vector_db_url
+        # Chromaと同様、コレクション名が未指定の場合は langchain とする
+        self.collection_name: str = collection_name or "langchain"
+
+        from vector_search_util._internal.langchain.numpy_vector_store import NumpyVectorStore
+
+        config = self.client.llm_config
+        db_path = os.path.join(config.app_data_path, "vector_db_search_app.db")
+        logger.info(f"collection_name:{self.collection_name}")
+        db: VectorStore = NumpyVectorStore(
+            embedding=self.client.embedding,
+            db_path=db_path,
+            data_dir=self.vector_db_url,
+            collection_name=self.collection_name,
+            dtype=config.numpy_vector_dtype,
+            compaction_ratio=config.numpy_compaction_ratio,
+            max_workers=config.numpy_search_workers,
+        )
+        self.db = db
+
+    def _similarity_search_by_vector_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        # 全件の厳密検索のためsearch_efは使用しない
+        return self._get_store_().similarity_search_with_score_by_vector(embedding, **search_kwargs)
+
+
+class LangChainVectorDBFaiss(LangChainVectorDBSQLiteMirror):
+    """
+    FAISS(CPU)のインデックスにベクトルを保持するローカルのベクトルDB。
+    vector id、source_id、chunk_index、本文、metadataはアプリのSQLite DBにミラーする。
+    """
+
+    def __init__(self, client: LangchainClient, vector_db_url: str, collection_name: str = "") -> None:
+        # faissはVECTOR_DB_TYPE=faissの場合のみ読み込む。faissは追加の依存関係(vector_search_util[faiss])とする
+        try:
+            from vector_search_util._internal.langchain.faiss_vector_store import FaissVectorStore
+        except ModuleNotFoundError as e:
+            if e.name != "faiss":
+                raise
+            raise ModuleNotFoundError(
+                "VECTOR_DB_TYPE=faiss requires faiss. Install it with: pip install 'vector_search_util[faiss]' "
+                "(or uv sync --extra faiss)", name=e.name
+            ) from e
+
+        self.client: LangchainClient = client
+        self.vector_db_url: str = vector_db_url
+        self.collection_name: str = collection_name or "langchain"
+
+        config = self.client.llm_config
+        hnsw_params = config.get_hnsw_params(self.collection_name)
+        logger.info(f"collection_name:{self.collection_name}")
+        db: VectorStore = FaissVectorStore(
+            embedding=self.client.embedding,
+            db_path=os.path.join(config.app_data_path, "vector_db_search_app.db"),
+            data_dir=self.vector_db_url,
+            collection_name=self.collection_name,
+            index_type=config.faiss_index_type,
+            source_id_key=config.source_id_key,
+            chunk_index_key=config.chunk_index_key,
+            hnsw_m=hnsw_params["M"],
+            hnsw_construction_ef=hnsw_params["construction_ef"],
+            hnsw_search_ef=hnsw_params["search_ef"],
+            nlist=config.faiss_nlist,
+            pq_m=config.faiss_pq_m,
+            pq_nbits=config.faiss_pq_nbits,
+            nprobe=config.faiss_nprobe,
+            train_size=config.faiss_train_size,
+            persist_interval=config.faiss_persist_interval,
+            rebuild_ratio=config.faiss_rebuild_ratio,
+        )
+        self.db = db
+
+    def _get_close_callback_(self) -> Callable[[], None]:
+        # FAISS_PERSIST_INTERVALにより保存していない変更を書き出し、atexitからの参照を外してインデックスを解放できるようにする
+        return self._get_store_().close
+
+    def _similarity_search_(
+            self, query: str, k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None, include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        # search_efはHNSWではefSearch、IVFPQではnprobeとして扱う。本文はmetadataと同じ行から読み込むため常に返す
+        return self._get_store_().similarity_search_with_relevance_scores(query, search_ef=search_ef, **search_kwargs)
+
+    def _similarity_search_by_vector_(
+            self, embedding: List[float], k: int, search_kwargs: dict[str, Any], search_ef: Optional[int] = None,
+            include_documents: bool = True
+            ) -> List[Tuple[Document, float]]:
+        return self._get_store_().similarity_search_with_score_by_vector(embedding, search_ef=search_ef, **search_kwargs)
@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def maximal_marginal_relevance(query_vector: np.ndarray, embeddings: np.ndarray, k: int, lambda_mult: float = 0.5) -> list[int]:
+    """
+    MMR(Maximal Marginal Relevance)で候補からk件を選び、選んだ順の行番号を返す。
+
+    スコアは lambda_mult * クエリとの類似度 - (1 - lambda_mult) * 選択済みの候補との類似度の最大値。
+    候補同士のコサイン類似度行列を1回で計算し、選択済みとの最大類似度は配列で更新するため、
+    1件選ぶごとの処理は候補数の長さの配列演算のみとなる。
+    :param query_vector: クエリの埋め込みベクトル
+    :param embeddings: (候補数, 次元数)の候補の埋め込みベクトル
+    :param lambda_mult: 1に近いほどクエリとの類似度を、0に近いほど多様性を重視する
+    """
+    if not 0.0 <= lambda_mult <= 1.0:
+        raise ValueError("lambda_mult must be between 0 and 1")
+    num_candidates = len(embeddings)
+    k = min(k, num_candidates)
+    if k <= 0:
+        return []
+
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    candidates = normalize(embeddings)
+    query_similarity = candidates @ normalize(query_vector)
+    candidate_similarity = candidates @ candidates.T
+
+    relevance = lambda_mult * query_similarity
+    max_similarity = np.full(num_candidates, -np.inf, dtype=np.float32)
+    selected_mask = np.zeros(num_candidates, dtype=bool)
+    selected: list[int] = []
+    for _ in range(k):
+        # 1件目は選択済みがないため、クエリとの類似度のみで選ぶ
+        penalty = (1.0 - lambda_mult) * max_similarity if selected else 0.0
+        scores = np.where(selected_mask, -np.inf, relevance - penalty)
+        index = int(np.argmax(scores))
+        selected.append(index)
+        selected_mask[index] = True
+        np.maximum(max_similarity, candidate_similarity[index], out=max_similarity)
+    return selected
@@ -0,0 +1,354 @@
+import os, sqlite3, threading, uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, ClassVar, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from vector_search_util.model import SqliteJsonTranslator
+from vector_search_util._internal.langchain.sqlite_mirror_vector_store import SQLiteMirrorVectorStore
+
+import vector_search_util._internal.codec.json_codec as json_codec
+import vector_search_util._internal.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+
+class NumpyVectorStore(SQLiteMirrorVectorStore):
+    """埋め込みベクトルをメモリマップしたファイルで保持する、依存ライブラリなしのローカルVectorStore。
+
+    - ベクトルは正規化して {data_dir}/{collection}.{generation}.{dtype} に追記のみで書き込む(float32/float16の生データ)
+    - vector id、本文、metadataはアプリのSQLite DBに格納し、SQLiteの行番号(row_num)がファイル上の位置となる
+    - 削除はSQLiteの行のみを削除する(ファイル上のベクトルは墓標として残す)。墓標の割合がcompaction_ratioを超えたら
+      生存行のみを新しい世代のファイルに書き出す
+    - ファイルは読み取り専用でメモリマップするため、複数のワーカープロセスでページキャッシュを共有する
+    - 検索はブロック単位の行列ベクトル積をスレッドプールで並列に実行する(全件の厳密検索)
+    """
+    table_name: ClassVar[str] = "numpy_vectors"
+    key_column: ClassVar[str] = "row_num"
+    # 検索用のスレッドプール。NumPyの行列演算はGILを解放するため、スレッドでCPUコアを使い切れる
+    executors: ClassVar[dict[int, ThreadPoolExecutor]] = {}
+
+    def __init__(
+            self, embedding: Embeddings, db_path: str, data_dir: str, collection_name: str,
+            dtype: str = "float32", compaction_ratio: float = 0.2, block_size: int = 65536, max_workers: int = 0
+            ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        super().__init__(embedding, db_path, collection_name)
+        self.data_dir = data_dir
+        self.dtype = dtype
+        self.compaction_ratio = compaction_ratio
+        self.block_size = block_size
+        self.max_workers = max_workers if max_workers > 0 else (os.cpu_count() or 1)
+
+        # (generation, version)ごとに読み込んだメモリマップと生存行のマスク
+        self.state_key: Optional[Tuple[int, int]] = None
+        self.vectors: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self.alive: np.ndarray = np.zeros(0, dtype=bool)
+        # 検索はスレッドで実行されるため、メモリマップと生存行のマスクの読み直しと参照をロックで守る
+        self.state_lock = threading.Lock()
+
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.__create_tables__()
+
+    def __create_tables__(self):
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS numpy_collections (
+                    name TEXT NOT NULL PRIMARY KEY,
+                    dim INTEGER NOT NULL DEFAULT 0,
+                    dtype TEXT NOT NULL,
+                    generation INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    row_count INTEGER NOT NULL DEFAULT 0,
+                    deleted_count INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS numpy_vectors (
+                    collection TEXT NOT NULL,
+                    row_num INTEGER NOT NULL,
+                    id TEXT NOT NULL,
+                    document TEXT,
+                    cmetadata TEXT,
+                    PRIMARY KEY (collection, row_num),
+                    UNIQUE (collection, id)
+                )
+            ''')
+            cur.execute(
+                "INSERT INTO numpy_collections (name, dtype) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
+                (self.collection_name, self.dtype)
+            )
+            row = cur.execute("SELECT dtype FROM numpy_collections WHERE name = ?", (self.collection_name,)).fetchone()
+            if row and row[0] != self.dtype:
+                # ファイル形式はコレクション作成時のdtypeに固定する
+                logger.warning(f"Collection {self.collection_name} is stored as {row[0]}. Ignore dtype={self.dtype}.")
+                self.dtype = row[0]
+
+    def __get_collection__(self, cur: sqlite3.Cursor) -> Tuple[int, int, int, int, int]:
+        row = cur.execute(
+            "SELECT dim, generation, version, row_count, deleted_count FROM numpy_collections WHERE name = ?",
+            (self.collection_name,)
+        ).fetchone()
+        return row
+
+    def __get_file_path__(self, generation: int) -> str:
+        return os.path.join(self.data_dir, f"{self.collection_name}.{generation}.{self.dtype}")
+
+    def __load_state__(self, max_attempts: int = 3) -> None:
+        # 他プロセスの書き込みを検知した場合のみメモリマップと生存行のマスクを読み直す。
+        # 読み込み中に他プロセスのcompactが2回続き、読もうとした世代のファイルが削除された場合は読み直す
+        for attempt in range(max_attempts):
+            try:
+                with self.state_lock:
+                    self.__read_state__()
+                return
+            except FileNotFoundError:
+                if attempt + 1 >= max_attempts:
+                    raise
+                logger.info(f"Vector file of collection {self.collection_name} was compacted. Reload the state.")
+
+    def __read_state__(self) -> None:
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            # コレクションの行とrow_numを同じスナップショットから読み込む
+            cur.execute("BEGIN")
+            try:
+                dim, generation, version, row_count, _ = self.__get_collection__(cur)
+                if self.state_key == (generation, version):
+                    return
+                alive = np.zeros(row_count, dtype=bool)
+                row_nums = [row[0] for row in cur.execute(
+                    "SELECT row_num FROM numpy_vectors WHERE collection = ?", (self.collection_name,)
+                )]
+                alive[row_nums] = True
+                if row_count == 0 or dim == 0:
+                    vectors = np.zeros((0, dim), dtype=self.dtype)
+                else:
+                    vectors = np.memmap(self.__get_file_path__(generation), dtype=self.dtype, mode="r", shape=(row_count, dim))
+            finally:
+                cur.execute("COMMIT")
+        self.vectors = vectors
+        self.alive = alive
+        self.state_key = (generation, version)
+
+    @classmethod
+    def __get_executor__(cls, max_workers: int) -> ThreadPoolExecutor:
+        executor = cls.executors.get(max_workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="numpy_vector_store")
+            cls.executors[max_workers] = executor
+        return executor
+
+    def __get_state__(self) -> Tuple[np.ndarray, np.ndarray]:
+        # 同じ世代のメモリマップと生存行のマスクを返す
+        self.__load_state__()
+        with self.state_lock:
+            return self.vectors, self.alive
+
+    def __filter_mask__(self, filter: Optional[dict], alive: np.ndarray) -> np.ndarray:
+        if not filter:
+            return alive
+        row_nums = np.asarray(self._get_keys_by_condition_(SqliteJsonTranslator().translate(filter)), dtype=np.int64)
+        mask = np.zeros(len(alive), dtype=bool)
+        mask[row_nums[row_nums < len(alive)]] = True
+        return mask & alive
+
+    def __search_rows__(self, embedding: List[float], k: int, filter: Optional[dict] = None) -> List[Tuple[int, float]]:
+        vectors, alive = self.__get_state__()
+        if len(vectors) == 0 or k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        mask = self.__filter_mask__(filter, alive)
+
+        def _search_block_(start: int) -> Tuple[np.ndarray, np.ndarray]:
+            end = min(start + self.block_size, len(vectors))
+            block_mask = mask[start:end]
+            if not block_mask.any():
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            scores = np.asarray(vectors[start:end], dtype=np.float32) @ query
+            scores[~block_mask] = -np.inf
+            block_k = min(k, int(block_mask.sum()))
+            top_k = np.argpartition(-scores, block_k - 1)[:block_k]
+            return top_k + start, scores[top_k]
+
+        starts = range(0, len(vectors), self.block_size)
+        if len(starts) == 1:
+            results = [_search_block_(0)]
+        else:
+            results = list(self.__get_executor__(self.max_workers).map(_search_block_, starts))
+        row_nums = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        order = np.argsort(-scores)[:k]
+        # 丸め誤差で1をわずかに超える場合があるため丸める
+        return [(int(row_nums[i]), min(float(scores[i]), 1.0)) for i in order]
+
+    ########################################
+    # 書き込み
+    ########################################
+    def add_embeddings(
+            self, texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None
+            ) -> List[str]:
+        if not texts:
+            return []
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            # ファイルへの追記とSQLiteへの行の追加を同じロックの下で行う
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                dim, generation, _, row_count, deleted_count = self.__get_collection__(cur)
+                if dim == 0:
+                    dim = vectors.shape[1]
+                elif dim != vectors.shape[1]:
+                    raise ValueError(f"Embedding dimension mismatch: collection={dim}, new={vectors.shape[1]}")
+
+                # 既存のidは墓標にして末尾に追加し直す(upsert)
+                placeholders = ",".join("?" for _ in ids)
+                replaced = cur.execute(
+                    f"DELETE FROM numpy_vectors WHERE collection = ? AND id IN ({placeholders})",
+                    (self.collection_name, *ids)
+                ).rowcount
+
+                # 前回の中断で書き込まれた未確定のデータはrow_countの位置から上書きする
+                file_path = self.__get_file_path__(generation)
+                with open(file_path, "r+b" if os.path.exists(file_path) else "wb") as f:
+                    f.seek(row_count * dim * np.dtype(self.dtype).itemsize)
+                    f.write(vectors.astype(self.dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                cur.executemany(
+                    "INSERT INTO numpy_vectors (collection, row_num, id, document, cmetadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (self.collection_name, row_count + i, doc_id, text, json_codec.dumps(metadata or {}))
+                        for i, (doc_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                    ]
+                )
+                cur.execute(
+                    "UPDATE numpy_collections SET dim = ?, row_count = ?, deleted_count = ?, version = version + 1 WHERE name = ?",
+                    (dim, row_count + len(ids), deleted_count + max(replaced, 0), self.collection_name)
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" for _ in ids)
+                deleted = cur.execute(
+                    f"DELETE FROM numpy_vectors WHERE collection = ? AND id IN ({placeholders})",
+                    (self.collection_name, *ids)
+                ).rowcount
+                cur.execute(
+                    "UPDATE numpy_collections SET deleted_count = deleted_count + ?, version = version + 1 WHERE name = ?",
+                    (deleted, self.collection_name)
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            _, _, _, row_count, deleted_count = self.__get_collection__(cur)
+        if row_count > 0 and deleted_count / row_count > self.compaction_ratio:
+            self.compact()
+        return True
+
+    def _on_metadata_updated_(self, cur: sqlite3.Cursor) -> None:
+        cur.execute("UPDATE numpy_collections SET version = version + 1 WHERE name = ?", (self.collection_name,))
+
+    def compact(self) -> None:
+        """
+        生存行のベクトルのみを新しい世代のファイルに書き出し、row_numを詰め直す。
+        旧世代のファイルをメモリマップしている他プロセスは、次回の検索時に新しい世代を読み直す。
+        旧世代の情報を読み込んだ直後の他プロセスがファイルを開けるよう、直前の世代のファイルは次のcompactまで残す。
+        """
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                dim, generation, _, row_count, _ = self.__get_collection__(cur)
+                row_nums = [row[0] for row in cur.execute(
+                    "SELECT row_num FROM numpy_vectors WHERE collection = ? ORDER BY row_num", (self.collection_name,)
+                )]
+                new_generation = generation + 1
+                new_file_path = self.__get_file_path__(new_generation)
+                if row_count > 0 and dim > 0:
+                    vectors = np.memmap(self.__get_file_path__(generation), dtype=self.dtype, mode="r", shape=(row_count, dim))
+                    with open(new_file_path, "wb") as f:
+                        for i in range(0, len(row_nums), self.block_size):
+                            f.write(np.asarray(vectors[row_nums[i:i + self.block_size]]).tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    del vectors
+                # 主キーの衝突を避けるため、一度負の値を経由して詰め直す
+                cur.executemany(
+                    "UPDATE numpy_vectors SET row_num = ? WHERE collection = ? AND row_num = ?",
+                    [(-(new_row_num + 1), self.collection_name, row_num) for new_row_num, row_num in enumerate(row_nums)]
+                )
+                cur.execute(
+                    "UPDATE numpy_vectors SET row_num = -row_num - 1 WHERE collection = ? AND row_num < 0", (self.collection_name,)
+                )
+                cur.execute(
+                    "UPDATE numpy_collections SET generation = ?, row_count = ?, deleted_count = 0, version = version + 1 WHERE name = ?",
+                    (new_generation, len(row_nums), self.collection_name)
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        logger.info(f"Compacted collection {self.collection_name}: {row_count} -> {len(row_nums)} rows (generation {new_generation})")
+        try:
+            old_file_path = self.__get_file_path__(generation - 1)
+            if generation > 0 and os.path.exists(old_file_path):
+                os.remove(old_file_path)
+        except OSError as e:
+            # Windowsなどでメモリマップ中のファイルを削除できない場合は残す
+            logger.warning(f"Failed to remove old vector file: {e}")
+
+    ########################################
+    # 読み込み
+    ########################################
+    def get_embeddings(self, ids: Optional[List[str]] = None, include_documents: bool = False) -> Tuple[List[str], np.ndarray, List[Document]]:
+        vectors, _ = self.__get_state__()
+        query = "SELECT row_num, id, document, cmetadata FROM numpy_vectors WHERE collection = ? AND row_num < ?"
+        params: list[Any] = [self.collection_name, len(vectors)]
+        if ids is not None:
+            if not ids:
+                return [], np.zeros((0, 0), dtype=np.float32), []
+            query += f" AND id IN ({','.join('?' for _ in ids)})"
+            params.extend(ids)
+        with self._connect_() as conn:
+            rows = conn.execute(query + " ORDER BY row_num", params).fetchall()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32), []
+        result_ids = [row[1] for row in rows]
+        embeddings = np.asarray(vectors[[row[0] for row in rows]], dtype=np.float32)
+        documents: list[Document] = []
+        if include_documents:
+            documents = [self._row_to_document_(row[1], row[2], row[3]) for row in rows]
+        return result_ids, embeddings, documents
+
+    ########################################
+    # 検索
+    ########################################
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        rows = self.__search_rows__(embedding, k, filter)
+        documents = self._get_documents_by_keys_([row_num for row_num, _ in rows])
+        return [(documents[row_num], score) for row_num, score in rows if row_num in documents]
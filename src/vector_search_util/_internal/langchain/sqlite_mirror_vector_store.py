@@ -0,0 +1,258 @@
+import os, sqlite3
+from abc import abstractmethod
+from typing import Any, ClassVar, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+import vector_search_util._internal.codec.json_codec as json_codec
+import vector_search_util._internal.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+
+class SQLiteMirrorVectorStore(VectorStore):
+    """vector id、本文、metadataをアプリのSQLite DBに格納するローカルVectorStoreの基底クラス。
+
+    サブクラスはtable_nameのテーブルに (collection, key_column, id, document, cmetadata) の列を持ち、
+    key_columnの整数値でベクトルファイル/インデックス上の位置を表す。
+    metadataの条件はSqliteJsonTranslatorのSQLでこのテーブルに対して評価する。
+    """
+    table_name: ClassVar[str] = ""
+    key_column: ClassVar[str] = ""
+
+    def __init__(self, embedding: Embeddings, db_path: str, collection_name: str):
+        self.embedding = embedding
+        self.db_path = db_path
+        self.collection_name = collection_name
+        dirname = os.path.dirname(self.db_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.__create_collection_metadata_table__()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def _connect_(self) -> sqlite3.Connection:
+        # 複数プロセスからの読み書きを想定し、ロック待ちのタイムアウトを長めにとる
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def __create_collection_metadata_table__(self):
+        # コレクション単位のmetadata(埋め込みモデル、次元数など)。storeにはサブクラスのtable_nameを格納する
+        with self._connect_() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS mirror_collection_metadata (
+                    store TEXT NOT NULL,
+                    collection TEXT NOT NULL,
+                    cmetadata TEXT,
+                    PRIMARY KEY (store, collection)
+                )
+            ''')
+
+    def get_collection_metadata(self) -> dict[str, Any]:
+        with self._connect_() as conn:
+            row = conn.execute(
+                "SELECT cmetadata FROM mirror_collection_metadata WHERE store = ? AND collection = ?",
+                (self.table_name, self.collection_name)
+            ).fetchone()
+        return json_codec.loads(row[0]) if row and row[0] else {}
+
+    def update_collection_metadata(self, metadata: dict[str, Any]) -> None:
+        """
+        コレクションのmetadataに指定したキーを上書きする。
+        """
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                row = cur.execute(
+                    "SELECT cmetadata FROM mirror_collection_metadata WHERE store = ? AND collection = ?",
+                    (self.table_name, self.collection_name)
+                ).fetchone()
+                merged = json_codec.loads(row[0]) if row and row[0] else {}
+                merged.update(metadata)
+                cur.execute(
+                    '''
+                    INSERT INTO mirror_collection_metadata (store, collection, cmetadata) VALUES (?, ?, ?)
+                    ON CONFLICT(store, collection) DO UPDATE SET cmetadata = excluded.cmetadata
+                    ''',
+                    (self.table_name, self.collection_name, json_codec.dumps(merged))
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    @classmethod
+    def _row_to_document_(cls, doc_id: str, document: Optional[str], cmetadata: Optional[str]) -> Document:
+        return Document(id=doc_id, page_content=document or "", metadata=json_codec.loads(cmetadata) if cmetadata else {})
+
+    def _get_documents_by_keys_(self, keys: List[int]) -> dict[int, Document]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" for _ in keys)
+        with self._connect_() as conn:
+            rows = conn.execute(
+                f"SELECT {self.key_column}, id, document, cmetadata FROM {self.table_name} "
+                f"WHERE collection = ? AND {self.key_column} IN ({placeholders})",
+                (self.collection_name, *keys)
+            ).fetchall()
+        return {row[0]: self._row_to_document_(row[1], row[2], row[3]) for row in rows}
+
+    def _get_keys_by_condition_(self, where_sql: str) -> List[int]:
+        with self._connect_() as conn:
+            return [row[0] for row in conn.execute(
+                f"SELECT {self.key_column} FROM {self.table_name} WHERE collection = ? AND {where_sql}",
+                (self.collection_name,)
+            )]
+
+    def _on_metadata_updated_(self, cur: sqlite3.Cursor) -> None:
+        # metadataの更新を検知する必要があるサブクラスでオーバーライドする
+        pass
+
+    ########################################
+    # 書き込み
+    ########################################
+    @abstractmethod
+    def add_embeddings(
+            self, texts: List[str], embeddings: List[List[float]], metadatas: Optional[List[dict]] = None,
+            ids: Optional[List[str]] = None
+            ) -> List[str]:
+        pass
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        embeddings = self.embedding.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas, ids)
+
+    async def aadd_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        embeddings = await self.embedding.aembed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas, ids)
+
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        return self.delete(ids, **kwargs)
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict[str, Any]]) -> None:
+        """
+        vector idごとにmetadataをマージして更新する。値がNoneのキーは削除する。
+        """
+        with self._connect_() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                params = []
+                for doc_id, metadata in zip(ids, metadatas):
+                    row = cur.execute(
+                        f"SELECT cmetadata FROM {self.table_name} WHERE collection = ? AND id = ?", (self.collection_name, doc_id)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    merged = json_codec.loads(row[0]) if row[0] else {}
+                    merged.update(metadata)
+                    merged = {k: v for k, v in merged.items() if v is not None}
+                    params.append((json_codec.dumps(merged), self.collection_name, doc_id))
+                cur.executemany(f"UPDATE {self.table_name} SET cmetadata = ? WHERE collection = ? AND id = ?", params)
+                self._on_metadata_updated_(cur)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    ########################################
+    # 読み込み
+    ########################################
+    def get_count(self) -> int:
+        with self._connect_() as conn:
+            row = conn.execute(f"SELECT count(*) FROM {self.table_name} WHERE collection = ?", (self.collection_name,)).fetchone()
+        return int(row[0])
+
+    def count_documents(self, where_sql: str = "") -> int:
+        """
+        :param where_sql: cmetadataに対する条件。空文字の場合はコレクションの全チャンク数
+        """
+        if not where_sql:
+            return self.get_count()
+        with self._connect_() as conn:
+            row = conn.execute(
+                f"SELECT count(*) FROM {self.table_name} WHERE collection = ? AND {where_sql}", (self.collection_name,)
+            ).fetchone()
+        return int(row[0])
+
+    def get_ids(self, where_sql: str = "") -> List[str]:
+        """
+        :param where_sql: cmetadataに対する条件。空文字の場合はコレクションの全チャンク
+        """
+        query = f"SELECT id FROM {self.table_name} WHERE collection = ?"
+        if where_sql:
+            query += f" AND {where_sql}"
+        with self._connect_() as conn:
+            return [row[0] for row in conn.execute(query + f" ORDER BY {self.key_column}", (self.collection_name,))]
+
+    def get_documents(self, where_sql: str = "", after_id: str = "", limit: int = 0, include_documents: bool = True) -> Tuple[List[str], List[Document]]:
+        """
+        :param where_sql: cmetadataに対する条件
+        :param after_id: limitを指定した場合、このvector idより後のチャンクを返す
+        :param limit: 0より大きい場合、vector idの昇順でlimit件返す
+        :param include_documents: Falseの場合、document列を読み込まず本文を空文字とする
+        """
+        document_column = "document" if include_documents else "NULL"
+        query = f"SELECT id, {document_column}, cmetadata FROM {self.table_name} WHERE collection = ?"
+        params: list[Any] = [self.collection_name]
+        if where_sql:
+            query += f" AND {where_sql}"
+        if limit > 0:
+            query += " AND id > ? ORDER BY id LIMIT ?"
+            params.extend([after_id, limit])
+        else:
+            query += f" ORDER BY {self.key_column}"
+        with self._connect_() as conn:
+            rows = conn.execute(query, params).fetchall()
+        ids = [row[0] for row in rows]
+        documents = [self._row_to_document_(row[0], row[1], row[2]) for row in rows]
+        return ids, documents
+
+    @abstractmethod
+    def get_embeddings(self, ids: Optional[List[str]] = None, include_documents: bool = False) -> Tuple[List[str], np.ndarray, List[Document]]:
+        pass
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        _, _, documents = self.get_embeddings(ids, include_documents=True)
+        return documents
+
+    def get_distinct_metadata_values(self, key: str) -> set[Any]:
+        with self._connect_() as conn:
+            rows = conn.execute(
+                f'''
+                SELECT DISTINCT json_extract(cmetadata, '$."' || ? || '"') AS value
+                FROM {self.table_name}
+                WHERE collection = ? AND value IS NOT NULL
+                ''',
+                (key, self.collection_name)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    ########################################
+    # 検索
+    ########################################
+    @abstractmethod
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        pass
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # 正規化済みベクトルの内積(コサイン類似度)をそのまま関連度とする
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> "SQLiteMirrorVectorStore":
+        store = cls(embedding=embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
@@ -1,5 +1,7 @@
-from typing import Annotated
+import inspect
+from typing import Annotated, Any, AsyncIterator, Callable
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import StreamingResponse, JSONResponse
 from langchain_core.documents import Document
 from vector_search_util.core.client import (
     EmbeddingClient, EmbeddingBatchClient, RelationBatchClient, CategoryBatchClient, TagBatchClient
@@ -9,11 +11,36 @@ from vector_search_util.model import (
 )
 
 import vector_search_util.core.app as app_module
+import vector_search_util._internal.codec.json_codec as json_codec
 
 
-app = FastAPI()
+class JSONCodecResponse(JSONResponse):
+    """
+    json_codec(orjsonがある場合はorjson)でボディを出力するレスポンスクラス。全エンドポイントのデフォルトとする。
+    """
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumps_bytes(content)
+
+
+app = FastAPI(default_response_class=JSONCodecResponse)
 router = APIRouter()
 
+def ndjson_endpoint(stream_function: Callable[..., AsyncIterator[Any]]) -> Callable[..., Any]:
+    """
+    1件ずつ返すasync generatorの関数を、各要素を1行のJSON(NDJSON)として逐次送信するエンドポイントに変換する。
+    パラメータはstream_functionのシグネチャをそのまま使用する。
+    """
+    async def endpoint(*args, **kwargs) -> StreamingResponse:
+        async def lines():
+            async for item in stream_function(*args, **kwargs):
+                yield item.model_dump_json() + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    endpoint.__name__ = stream_function.__name__
+    endpoint.__doc__ = stream_function.__doc__
+    endpoint.__signature__ = inspect.signature(stream_function).replace(return_annotation=StreamingResponse) # type: ignore
+    return endpoint
+
 # vector searchでLangChainのDocumentsを返すAPI
 router.add_api_route(
     path="/vector_search_langchain_documents", 
@@ -32,17 +59,54 @@ router.add_api_route(
     methods=["GET"])
 
 
+# metadata search page
+router.add_api_route(
+    path="/metadata_search_page",
+    endpoint=app_module.metadata_search_page,
+    methods=["GET"])
+
 router.add_api_route(
     path="/vector_search",
     endpoint=app_module.vector_search,
     methods=["GET"])
 
+# get documents page
+router.add_api_route(
+    path="/get_documents_page",
+    endpoint=app_module.get_documents_page,
+    methods=["GET"])
+
 # get documents
 router.add_api_route(
     path="/get_documents",
     endpoint=app_module.get_documents,
     methods=["GET"])
 
+# 大量の読み込み結果をNDJSONで逐次返すAPI
+router.add_api_route(
+    path="/stream/get_langchain_documents",
+    endpoint=ndjson_endpoint(app_module.stream_langchain_documents),
+    response_model=None,
+    methods=["GET"])
+
+router.add_api_route(
+    path="/stream/get_documents",
+    endpoint=ndjson_endpoint(app_module.stream_documents),
+    response_model=None,
+    methods=["GET"])
+
+router.add_api_route(
+    path="/stream/metadata_search",
+    endpoint=ndjson_endpoint(app_module.stream_metadata_search),
+    response_model=None,
+    methods=["GET"])
+
+router.add_api_route(
+    path="/stream/get_relations",
+    endpoint=ndjson_endpoint(app_module.stream_relations),
+    response_model=None,
+    methods=["GET"])
+
 # upsert documents
 router.add_api_route(
     path="/upsert_documents",
@@ -67,6 +131,12 @@ router.add_api_route(
     endpoint=app_module.get_categories,
     methods=["GET"])
 
+# get categories page
+router.add_api_route(
+    path="/get_categories_page",
+    endpoint=app_module.get_categories_page,
+    methods=["GET"])
+
 # upsert categories
 router.add_api_route(
     path="/upsert_categories",
@@ -79,12 +149,48 @@ router.add_api_route(
     endpoint=app_module.delete_categories,
     methods=["DELETE"])
 
+# cleanup categories
+router.add_api_route(
+    path="/cleanup_categories",
+    endpoint=app_module.cleanup_categories,
+    methods=["POST"])
+
+# reembed
+router.add_api_route(
+    path="/reembed",
+    endpoint=app_module.reembed,
+    methods=["POST"])
+
+# get reembed jobs
+router.add_api_route(
+    path="/get_reembed_jobs",
+    endpoint=app_module.get_reembed_jobs,
+    methods=["GET"])
+
+# export snapshot
+router.add_api_route(
+    path="/export_snapshot",
+    endpoint=app_module.export_snapshot,
+    methods=["POST"])
+
+# import snapshot
+router.add_api_route(
+    path="/import_snapshot",
+    endpoint=app_module.import_snapshot,
+    methods=["POST"])
+
 # get relations
 router.add_api_route(
     path="/get_relations",
     endpoint=app_module.get_relations,
     methods=["GET"])
 
+# get relations page
+router.add_api_route(
+    path="/get_relations_page",
+    endpoint=app_module.get_relations_page,
+    methods=["GET"])
+
 # upsert relations
 router.add_api_route(
     path="/upsert_relations",
@@ -97,12 +203,30 @@ router.add_api_route(
     endpoint=app_module.delete_relations,
     methods=["DELETE"])
 
+# get related nodes
+router.add_api_route(
+    path="/get_related_nodes",
+    endpoint=app_module.get_related_nodes,
+    methods=["GET"])
+
+# get shortest path
+router.add_api_route(
+    path="/get_shortest_path",
+    endpoint=app_module.get_shortest_path,
+    methods=["GET"])
+
 # get tags
 router.add_api_route(
     path="/get_tags",
     endpoint=app_module.get_tags,
     methods=["GET"])
 
+# get tags page
+router.add_api_route(
+    path="/get_tags_page",
+    endpoint=app_module.get_tags_page,
+    methods=["GET"])
+
 # upsert tags
 router.add_api_route(
     path="/upsert_tags",
@@ -186,6 +310,12 @@ router.add_api_route(
     endpoint=app_module.get_conditions,
     methods=["GET"])
 
+# get conditions page
+router.add_api_route(
+    path="/get_conditions_page",
+    endpoint=app_module.get_conditions_page,
+    methods=["GET"])
+
 router.add_api_route(
     path="/upsert_conditions",
     endpoint=app_module.upsert_conditions,
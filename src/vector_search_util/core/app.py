@@ -1,10 +1,11 @@
-from typing import Annotated, Optional
+from typing import Annotated, Optional, AsyncIterator
 from langchain_core.documents import Document
 from vector_search_util.core.client import (
-    EmbeddingClient, EmbeddingBatchClient, RelationBatchClient, CategoryBatchClient, TagBatchClient
+    EmbeddingClient, EmbeddingBatchClient, RelationBatchClient, CategoryBatchClient, TagBatchClient, IndexTuningClient, ReembedClient, SnapshotClient
 )   
 from vector_search_util.model import (
-    EmbeddingConfig, ConditionContainer, SourceDocumentData, CategoryData, RelationData, TagData
+    EmbeddingConfig, ConditionContainer, SourceDocumentData, CategoryData, RelationData, TagData, LoadFailureData, IndexTuningResult, RecallAuditResult,
+    ReembedJobData, SnapshotData, PageData, ContentMode, GraphNodeData, GraphDirection
 )
 
 async def vector_search_langchain_documents(
@@ -12,6 +13,9 @@ async def vector_search_langchain_documents(
     category: Annotated[Optional[str], "The category to filter the search by."] = "",
     conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter the search by. "] = ConditionContainer(),
     num_results: Annotated[Optional[int], "The number of results to return."] = 5,
+    search_ef: Annotated[Optional[int], "HNSW ef for this query only. Uses the collection setting if omitted."] = None,
+    exact: Annotated[bool, "If True, search all chunks exactly by cosine similarity instead of HNSW."] = False,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
 ) -> list[Document]:
     
     """Perform a vector search in the vector database and return Langchain Documents.
@@ -21,35 +25,40 @@ async def vector_search_langchain_documents(
         category (Optional[str]): The category to filter the search by.
         conditions (Optional[ConditionContainer]): A dictionary of tags to filter the search by.
         num_results (Optional[int]): The number of results to return.
+        search_ef (Optional[int]): HNSW ef for this query only.
+        exact (bool): If true, search all chunks exactly by cosine similarity instead of HNSW.
+        collection_name (str): The collection to use.
 
     Returns:
         list: A list of Langchain Documents as search results.
     """
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     if category is None:
         category = ""
     if not conditions:
         conditions = ConditionContainer()
     if not num_results:
         num_results = 5
-    results = await embedding_client.vector_search_langchain_documents(query, category, conditions, num_results)
+    results = await embedding_client.vector_search_langchain_documents(query, category, conditions, num_results, search_ef, exact)
     return results
 
 async def get_langchain_documents(
     source_ids: Annotated[Optional[list[str]], "A list of source IDs of documents to retrieve."] = [],
     category_ids: Annotated[Optional[list[str]], "A list of category IDs to filter documents by."] = [],
     conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter documents by. "] = ConditionContainer(),
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
 ) -> list[Document]:
     """Retrieve Langchain Documents from the vector database based on a list of source IDs.
     Args:
         source_ids (Optional[list[str]]): A list of source IDs of documents to retrieve.
         category_ids (Optional[list[str]]): A list of category IDs to filter documents by.
         conditions (Optional[ConditionContainer]): A dictionary of tags to filter documents by.
+        collection_name (str): The collection to use.
     Returns:
         list[Document]: A list of Langchain Documents retrieved from the vector database.
     """
 
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     if not source_ids:
         source_ids = []
     if not category_ids:
@@ -60,27 +69,69 @@ async def get_langchain_documents(
     return documents
 
 async def metadata_search(
-        conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter the search by. "] = ConditionContainer()
+        conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter the search by. "] = ConditionContainer(),
+        fields: Annotated[Optional[list[str]], "Metadata keys to return. Returns all metadata if omitted."] = [],
+        include_content: Annotated[ContentMode, "How to return source_content: full, snippet (the matched chunk, truncated) or false (empty)."] = "full",
+        collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
     ) -> list[SourceDocumentData]:
     """Perform a metadata search in the vector database.
 
     Args:
         conditions (Optional[ConditionContainer]): A dictionary of tags to filter the search by.
+        fields (Optional[list[str]]): Metadata keys to return. The score is always returned.
+        include_content (ContentMode): full reads the whole content, snippet returns the matched chunk truncated to SNIPPET_LENGTH, false returns no content.
+        collection_name (str): The collection to use.
     Returns:
         list: A list of search results.
     """
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     if not conditions:
         conditions = ConditionContainer()
-    _, results =  await embedding_client.metadata_search(conditions)
+    _, results =  await embedding_client.metadata_search(conditions, fields, include_content)
     return results
 
+# metadata search page
+async def metadata_search_page(
+    conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter the search by. "] = ConditionContainer(),
+    limit: Annotated[int, "The maximum number of items to return in one page."] = 100,
+    cursor: Annotated[str, "The next_cursor of the previous page. Starts from the first page if omitted."] = "",
+    fields: Annotated[Optional[list[str]], "Metadata keys to return. Returns all metadata if omitted."] = [],
+    include_content: Annotated[ContentMode, "How to return source_content: full, snippet (the matched chunk, truncated) or false (empty)."] = "full",
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> PageData[SourceDocumentData]:
+    """Perform a metadata search and return one page of the results.
+
+    Args:
+        conditions (Optional[ConditionContainer]): A dictionary of tags to filter the search by.
+        limit (int): The maximum number of items to return in one page.
+        cursor (str): The next_cursor of the previous page.
+        fields (Optional[list[str]]): Metadata keys to return. The score is always returned.
+        include_content (ContentMode): full reads the whole content, snippet returns the matched chunk truncated to SNIPPET_LENGTH, false returns no content.
+        collection_name (str): The collection to use.
+    Returns:
+        PageData[SourceDocumentData]: The results and the cursor of the next page. next_cursor is empty on the last page.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
+    if not conditions:
+        conditions = ConditionContainer()
+    return await embedding_client.metadata_search_page(conditions, limit, cursor, fields, include_content)
+
 async def vector_search(
     query: Annotated[str, "The search query string."],
     category: Annotated[Optional[str], "The category to filter the search by."] = "",
     conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter the search by. "] = ConditionContainer(),
     num_results: Annotated[Optional[int], "The number of results to return."] = 5,
-
+    search_ef: Annotated[Optional[int], "HNSW ef for this query only. Uses the collection setting if omitted."] = None,
+    exact: Annotated[bool, "If True, search all chunks exactly by cosine similarity instead of HNSW."] = False,
+    fields: Annotated[Optional[list[str]], "Metadata keys to return. Returns all metadata if omitted."] = [],
+    include_content: Annotated[ContentMode, "How to return source_content: full, snippet (the matched chunk, truncated) or false (empty)."] = "full",
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+    expand_category_depth: Annotated[int, "If greater than 0, also search the categories reachable from category within this many relation hops."] = 0,
+    edge_types: Annotated[list[str], "The edge types to follow when expanding the category. Follows all edge types if omitted."] = [],
+    expand_direction: Annotated[GraphDirection, "The direction to follow when expanding the category: out (from_node to to_node), in or both."] = "out",
+    mmr: Annotated[bool, "If True, rerank fetch_k candidates with maximal marginal relevance to avoid near-duplicate results."] = False,
+    fetch_k: Annotated[int, "The number of candidates to rerank when mmr is True."] = 20,
+    lambda_mult: Annotated[float, "The MMR trade-off between relevance (1.0) and diversity (0.0)."] = 0.5,
 ) -> list[SourceDocumentData]:
     
     """Perform a vector search in the vector database.
@@ -90,11 +141,22 @@ async def vector_search(
         category (Optional[str]): The category to filter the search by.
         filter (Optional[ConditionContainer]): A dictionary of tags to filter the search by.
         num_results (Optional[int]): The number of results to return.
+        search_ef (Optional[int]): HNSW ef for this query only.
+        exact (bool): If true, search all chunks exactly by cosine similarity instead of HNSW.
+        fields (Optional[list[str]]): Metadata keys to return. The score is always returned.
+        include_content (ContentMode): full reads the whole content, snippet returns the matched chunk truncated to SNIPPET_LENGTH, false returns no content.
+        collection_name (str): The collection to use.
+        expand_category_depth (int): If greater than 0, the category is expanded through relations and searched in one query.
+        edge_types (list[str]): The edge types to follow when expanding the category.
+        expand_direction (GraphDirection): The direction to follow when expanding the category.
+        mmr (bool): If true, fetch_k candidates are retrieved with their embeddings and reranked by maximal marginal relevance.
+        fetch_k (int): The number of candidates to rerank.
+        lambda_mult (float): The trade-off between relevance (1.0) and diversity (0.0).
 
     Returns:
         list: A list of search results.
     """
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     if category is None:
         category = ""
     if not conditions:
@@ -102,7 +164,9 @@ async def vector_search(
     if not num_results:
         num_results = 5
 
-    results = await embedding_client.vector_search(query, category, conditions, num_results)
+    results = await embedding_client.vector_search(
+        query, category, conditions, num_results, search_ef, exact, fields, include_content,
+        expand_category_depth, edge_types, expand_direction, mmr, fetch_k, lambda_mult)
     return results
 
 # get documents
@@ -110,6 +174,9 @@ async def get_documents(
     source_ids: Annotated[Optional[list[str]], "A list of source IDs of documents to retrieve."] = [],
     category_ids: Annotated[Optional[list[str]], "A list of category IDs to filter documents by."] = [],
     conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter documents by. "] = ConditionContainer(),
+    fields: Annotated[Optional[list[str]], "Metadata keys to return. Returns all metadata if omitted."] = [],
+    include_content: Annotated[ContentMode, "How to return source_content: full, snippet (the matched chunk, truncated) or false (empty)."] = "full",
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
 ) -> list[SourceDocumentData]:
     """Retrieve documents from the vector database based on a list of source IDs.
 
@@ -117,10 +184,13 @@ async def get_documents(
         source_ids (Optional[list[str]]): A list of source IDs of documents to retrieve.
         category_ids (Optional[list[str]]): A list of category IDs to filter documents by.
         filter (Optional[ConditionContainer]): A dictionary of tags to filter documents by.
+        fields (Optional[list[str]]): Metadata keys to return. The score is always returned.
+        include_content (ContentMode): full reads the whole content, snippet returns the matched chunk truncated to SNIPPET_LENGTH, false returns no content.
+        collection_name (str): The collection to use.
     Returns:
         list[EmbeddingData]: A list of documents retrieved from the vector database.
     """
-    config = EmbeddingConfig()
+    config = EmbeddingConfig(collection_name)
     embedding_client = EmbeddingClient(config)
     if not source_ids:
         source_ids = []
@@ -128,20 +198,118 @@ async def get_documents(
         category_ids = []
     if not conditions:
         conditions = ConditionContainer()
-    _, documents = await embedding_client.get_documents(source_ids, category_ids, conditions)
+    _, documents = await embedding_client.get_documents(source_ids, category_ids, conditions, fields, include_content)
     return documents
 
+# get documents page
+async def get_documents_page(
+    source_ids: Annotated[Optional[list[str]], "A list of source IDs of documents to retrieve."] = [],
+    category_ids: Annotated[Optional[list[str]], "A list of category IDs to filter documents by."] = [],
+    conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter documents by. "] = ConditionContainer(),
+    limit: Annotated[int, "The maximum number of items to return in one page."] = 100,
+    cursor: Annotated[str, "The next_cursor of the previous page. Starts from the first page if omitted."] = "",
+    fields: Annotated[Optional[list[str]], "Metadata keys to return. Returns all metadata if omitted."] = [],
+    include_content: Annotated[ContentMode, "How to return source_content: full, snippet (the matched chunk, truncated) or false (empty)."] = "full",
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> PageData[SourceDocumentData]:
+    """Retrieve one page of documents from the vector database.
+
+    Args:
+        source_ids (Optional[list[str]]): A list of source IDs of documents to retrieve.
+        category_ids (Optional[list[str]]): A list of category IDs to filter documents by.
+        conditions (Optional[ConditionContainer]): A dictionary of tags to filter documents by.
+        limit (int): The maximum number of items to return in one page.
+        cursor (str): The next_cursor of the previous page.
+        fields (Optional[list[str]]): Metadata keys to return. The score is always returned.
+        include_content (ContentMode): full reads the whole content, snippet returns the matched chunk truncated to SNIPPET_LENGTH, false returns no content.
+        collection_name (str): The collection to use.
+    Returns:
+        PageData[SourceDocumentData]: The documents and the cursor of the next page. next_cursor is empty on the last page.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
+    return await embedding_client.get_documents_page(source_ids or [], category_ids or [], conditions or ConditionContainer(), limit, cursor, fields, include_content)
+
+# stream langchain documents
+async def stream_langchain_documents(
+    source_ids: Annotated[Optional[list[str]], "A list of source IDs of documents to retrieve."] = [],
+    category_ids: Annotated[Optional[list[str]], "A list of category IDs to filter documents by."] = [],
+    conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter documents by. "] = ConditionContainer(),
+    page_size: Annotated[int, "The number of chunks read from the vector database at a time."] = 1000,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> AsyncIterator[Document]:
+    """Yield Langchain Documents while reading them page by page from the vector database.
+
+    Args:
+        source_ids (Optional[list[str]]): A list of source IDs of documents to retrieve.
+        category_ids (Optional[list[str]]): A list of category IDs to filter documents by.
+        conditions (Optional[ConditionContainer]): A dictionary of tags to filter documents by.
+        page_size (int): The number of chunks read from the vector database at a time.
+        collection_name (str): The collection to use.
+    Yields:
+        Document: The Langchain Documents retrieved from the vector database.
+    """
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    async for documents in embedding_client.iter_langchain_documents(source_ids or [], category_ids or [], conditions or ConditionContainer(), page_size):
+        for document in documents:
+            yield document
+
+# stream documents
+async def stream_documents(
+    source_ids: Annotated[Optional[list[str]], "A list of source IDs of documents to retrieve."] = [],
+    category_ids: Annotated[Optional[list[str]], "A list of category IDs to filter documents by."] = [],
+    conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter documents by. "] = ConditionContainer(),
+    page_size: Annotated[int, "The number of chunks read from the vector database at a time."] = 1000,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> AsyncIterator[SourceDocumentData]:
+    """Yield documents while reading them page by page from the vector database.
+
+    Args:
+        source_ids (Optional[list[str]]): A list of source IDs of documents to retrieve.
+        category_ids (Optional[list[str]]): A list of category IDs to filter documents by.
+        conditions (Optional[ConditionContainer]): A dictionary of tags to filter documents by.
+        page_size (int): The number of chunks read from the vector database at a time.
+        collection_name (str): The collection to use.
+    Yields:
+        SourceDocumentData: The documents retrieved from the vector database.
+    """
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    async for data_list in embedding_client.iter_documents(source_ids or [], category_ids or [], conditions or ConditionContainer(), page_size):
+        for data in data_list:
+            yield data
+
+# stream metadata search
+async def stream_metadata_search(
+    conditions: Annotated[Optional[ConditionContainer], "A dictionary of tags to filter the search by. "] = ConditionContainer(),
+    page_size: Annotated[int, "The number of chunks read from the vector database at a time."] = 1000,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> AsyncIterator[SourceDocumentData]:
+    """Yield the results of a metadata search while reading them page by page from the vector database.
+
+    Args:
+        conditions (Optional[ConditionContainer]): A dictionary of tags to filter the search by.
+        page_size (int): The number of chunks read from the vector database at a time.
+        collection_name (str): The collection to use.
+    Yields:
+        SourceDocumentData: The documents matching the conditions.
+    """
+    async for data in stream_documents([], [], conditions, page_size, collection_name):
+        yield data
+
 # upsert documents
 async def upsert_documents(
-    data_list: Annotated[list[SourceDocumentData], "A list of documents to update embeddings for."]
+    data_list: Annotated[list[SourceDocumentData], "A list of documents to update embeddings for."],
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
 ):
     """Update embeddings for a list of documents in the vector database.
 
     Args:
         data_list (list[SourceDocumentData]): A list of documents to update embeddings for.
+        collection_name (str): The collection to use.
     """
 
-    config = EmbeddingConfig()
+    config = EmbeddingConfig(collection_name)
     embedding_client = EmbeddingClient(config)
     await embedding_client.upsert_documents(data_list)
 
@@ -149,30 +317,34 @@ async def upsert_documents(
 async def delete_documents(
     source_id_list: Annotated[list[str], "A list of source IDs of documents to delete."],
     filter: Annotated[ConditionContainer, "A dictionary of tags to filter documents by. "] = ConditionContainer(),
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
 ):
     """Delete documents from the vector database based on a list of source IDs.
 
     Args:
         source_id_list (list[str]): A list of source IDs of documents to delete.
         filter (ConditionContainer): A dictionary of tags to filter documents by.
+        collection_name (str): The collection to use.
     """
 
-    config = EmbeddingConfig()
+    config = EmbeddingConfig(collection_name)
     embedding_client = EmbeddingClient(config)
     await embedding_client.delete_documents_by_source_ids(source_id_list, filter)
 
 async def update_document_metadata(
     source_id: Annotated[str, "A source ID of a document to update metadata for."],
     metadata: Annotated[dict[str, str], "A dictionary of metadata to update for the documents."],
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
 ):
     """Update metadata for a list of documents in the vector database.
 
     Args:
         source_id (str): A source ID of a document to update metadata for.
         metadata (dict[str, str]): A dictionary of metadata to update for the documents.
+        collection_name (str): The collection to use.
     """
 
-    config = EmbeddingConfig()
+    config = EmbeddingConfig(collection_name)
     embedding_client = EmbeddingClient(config)
     await embedding_client.update_metadata([source_id], metadata)
 
@@ -193,6 +365,25 @@ async def get_categories(
     categories = await embedding_client.get_categories(name_list, conditions)
     return categories
 
+# get categories page
+async def get_categories_page(
+    name_list: Annotated[list[str], "A list of category names to retrieve."] = [],
+    conditions: Annotated[ConditionContainer, "A dictionary of tags to filter categories by. "] = ConditionContainer(),
+    limit: Annotated[int, "The maximum number of items to return in one page."] = 100,
+    cursor: Annotated[str, "The next_cursor of the previous page. Starts from the first page if omitted."] = "",
+) -> PageData[CategoryData]:
+    """Retrieve one page of categories ordered by name.
+
+    Args:
+        name_list (list[str]): A list of category names to retrieve.
+        limit (int): The maximum number of items to return in one page.
+        cursor (str): The next_cursor of the previous page.
+    Returns:
+        PageData[CategoryData]: The categories and the cursor of the next page. next_cursor is empty on the last page.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig())
+    return await embedding_client.get_categories_page(name_list, conditions, limit, cursor)
+
 # upsert categories
 async def upsert_categories(
     categories: Annotated[list[CategoryData], "The list of categories to update."],
@@ -221,6 +412,163 @@ async def delete_categories(
     embedding_client = EmbeddingClient(config)
     await embedding_client.delete_categories(name_list)
 
+# cleanup categories
+async def cleanup_categories(
+    dry_run: Annotated[bool, "If True, only report the categories to delete without deleting them."] = False,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> list[str]:
+    """Delete categories that are no longer referenced by any document in the vector database.
+
+    Args:
+        dry_run (bool): If true, only report the categories to delete without deleting them.
+        collection_name (str): The collection to use.
+    Returns:
+        list[str]: The names of the categories that were (or would be) deleted.
+    """
+
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    return await embedding_client.cleanup_categories(dry_run)
+
+# tune index
+async def tune_index(
+    k: Annotated[int, "The number of neighbors used to compute recall@k."] = 10,
+    num_queries: Annotated[int, "The number of stored vectors sampled as queries."] = 100,
+    m_values: Annotated[list[int], "Candidate values of HNSW M."] = [16, 24, 32],
+    construction_ef_values: Annotated[list[int], "Candidate values of HNSW construction_ef."] = [100, 200, 400],
+    search_ef_values: Annotated[list[int], "Candidate values of HNSW search_ef."] = [10, 50, 100, 200],
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> list[IndexTuningResult]:
+    """Measure recall@k and query latency of the stored vectors for each HNSW parameter combination.
+
+    Args:
+        k (int): The number of neighbors used to compute recall@k.
+        num_queries (int): The number of stored vectors sampled as queries.
+        m_values (list[int]): Candidate values of HNSW M.
+        construction_ef_values (list[int]): Candidate values of HNSW construction_ef.
+        search_ef_values (list[int]): Candidate values of HNSW search_ef.
+        collection_name (str): The collection to use.
+    Returns:
+        list[IndexTuningResult]: The measured recall and latency for each combination.
+    """
+
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    tuning_client = IndexTuningClient(embedding_client)
+    return await tuning_client.run(k, num_queries, m_values, construction_ef_values, search_ef_values)
+
+# audit recall
+async def audit_recall(
+    k: Annotated[int, "The number of neighbors used to compute recall@k."] = 10,
+    num_queries: Annotated[int, "The number of stored vectors sampled as queries."] = 100,
+    search_ef: Annotated[Optional[int], "HNSW ef applied to the audited searches. Uses the collection setting if omitted."] = None,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> RecallAuditResult:
+    """Measure recall@k of the collection's HNSW index against exact search.
+
+    Args:
+        k (int): The number of neighbors used to compute recall@k.
+        num_queries (int): The number of stored vectors sampled as queries.
+        search_ef (Optional[int]): HNSW ef applied to the audited searches.
+        collection_name (str): The collection to use.
+    Returns:
+        RecallAuditResult: The measured recall and latency.
+    """
+
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    tuning_client = IndexTuningClient(embedding_client)
+    return await tuning_client.audit_recall(k, num_queries, search_ef)
+
+# reembed
+async def reembed(
+    target_collection: Annotated[str, "The collection to embed into. Defaults to {VECTOR_DB_COLLECTION_NAME}_{timestamp}."] = "",
+    embedding_model: Annotated[str, "The embedding model. Uses the current setting if omitted."] = "",
+    embedding_dimensions: Annotated[Optional[int], "The embedding dimensions. Uses the current setting if omitted, 0 for the model default."] = None,
+    chunk_size: Annotated[int, "The chunk size. Uses the current setting if 0."] = 0,
+    batch_size: Annotated[int, "The number of documents embedded per checkpoint. Uses LOAD_BATCH_SIZE if 0."] = 0,
+    tokens_per_minute: Annotated[int, "The token rate limit of the migration. Uses REEMBED_TOKENS_PER_MINUTE if 0."] = 0,
+    resume: Annotated[bool, "If True, resume the unfinished job of the same target collection."] = False,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> ReembedJobData:
+    """Re-embed all source documents into a new collection, then switch VECTOR_DB_COLLECTION_NAME to it.
+
+    Searches are served from the current collection until the switch, and writes are applied to both collections.
+
+    Args:
+        target_collection (str): The collection to embed into.
+        embedding_model (str): The embedding model.
+        embedding_dimensions (Optional[int]): The embedding dimensions.
+        chunk_size (int): The chunk size.
+        batch_size (int): The number of documents embedded per checkpoint.
+        tokens_per_minute (int): The token rate limit of the migration.
+        resume (bool): If true, resume the unfinished job of the same target collection.
+        collection_name (str): The collection to use.
+    Returns:
+        ReembedJobData: The final state of the job.
+    """
+
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    reembed_client = ReembedClient(embedding_client)
+    return await reembed_client.run(
+        target_collection, embedding_model, embedding_dimensions, chunk_size, batch_size, tokens_per_minute, resume
+    )
+
+# get reembed jobs
+async def get_reembed_jobs() -> list[ReembedJobData]:
+    """Get the progress of the reembed jobs.
+
+    Returns:
+        list[ReembedJobData]: The reembed jobs ordered by the last update.
+    """
+
+    config = EmbeddingConfig()
+    embedding_client = EmbeddingClient(config)
+    return await embedding_client.sqlite_client.get_reembed_jobs()
+
+# export snapshot
+async def export_snapshot(
+    path: Annotated[str, "The directory to write the snapshot to. Must not contain a snapshot."],
+    page_size: Annotated[int, "The number of chunks and table rows written per page."] = 1000,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> SnapshotData:
+    """Export the chunks with their embedding vectors and the SQLite tables to a snapshot directory.
+
+    Args:
+        path (str): The directory to write the snapshot to.
+        page_size (int): The number of chunks and table rows written per page.
+        collection_name (str): The collection to use.
+    Returns:
+        SnapshotData: The manifest of the exported snapshot.
+    """
+
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    snapshot_client = SnapshotClient(embedding_client)
+    return await snapshot_client.export_snapshot(path, page_size)
+
+# import snapshot
+async def import_snapshot(
+    path: Annotated[str, "The snapshot directory to import."],
+    force: Annotated[bool, "If True, import even if the embedding model or dimensions differ from the current settings."] = False,
+    collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+) -> SnapshotData:
+    """Import a snapshot into the current collection and the SQLite tables without calling the embedding provider.
+
+    Args:
+        path (str): The snapshot directory to import.
+        force (bool): If true, import even if the embedding model or dimensions differ from the current settings.
+        collection_name (str): The collection to use.
+    Returns:
+        SnapshotData: The manifest of the imported snapshot.
+    """
+
+    config = EmbeddingConfig(collection_name)
+    embedding_client = EmbeddingClient(config)
+    snapshot_client = SnapshotClient(embedding_client)
+    return await snapshot_client.import_snapshot(path, force)
+
 # get relations
 async def get_relations(
     from_nodes: Annotated[list[str], "A list of source node IDs to filter relations by."] = [],
@@ -238,6 +586,42 @@ async def get_relations(
     relations = await embedding_client.get_relations(from_nodes, to_nodes, edge_types, conditions)
     return relations
 
+# get relations page
+async def get_relations_page(
+    from_nodes: Annotated[list[str], "A list of source node IDs to filter relations by."] = [],
+    to_nodes: Annotated[list[str], "A list of target node IDs to filter relations by."] = [],
+    edge_types: Annotated[list[str], "A list of edge types to filter relations by."] = [],
+    conditions: Annotated[ConditionContainer, "A dictionary of tags to filter relations by. "] = ConditionContainer(),
+    limit: Annotated[int, "The maximum number of items to return in one page."] = 100,
+    cursor: Annotated[str, "The next_cursor of the previous page. Starts from the first page if omitted."] = "",
+    ) -> PageData[RelationData]:
+    """Retrieve one page of relations ordered by (from_node, to_node, edge_type).
+
+    Returns:
+        PageData[RelationData]: The relations and the cursor of the next page. next_cursor is empty on the last page.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig())
+    return await embedding_client.get_relations_page(from_nodes, to_nodes, edge_types, conditions, limit, cursor)
+
+# stream relations
+async def stream_relations(
+    from_nodes: Annotated[list[str], "A list of source node IDs to filter relations by."] = [],
+    to_nodes: Annotated[list[str], "A list of target node IDs to filter relations by."] = [],
+    edge_types: Annotated[list[str], "A list of edge types to filter relations by."] = [],
+    conditions: Annotated[ConditionContainer, "A dictionary of tags to filter relations by. "] = ConditionContainer(),
+    page_size: Annotated[int, "The number of relations read from the database at a time."] = 1000,
+) -> AsyncIterator[RelationData]:
+    """Yield relations while reading them page by page from the database.
+
+    Yields:
+        RelationData: The relations matching the filters.
+    """
+    config = EmbeddingConfig()
+    embedding_client = EmbeddingClient(config)
+    async for relations in embedding_client.iter_relations(from_nodes, to_nodes, edge_types, conditions, page_size):
+        for relation in relations:
+            yield relation
+
 # upsert relations
 async def upsert_relations(
     relations: Annotated[list[RelationData], "The list of relations to upsert."],
@@ -266,6 +650,37 @@ async def delete_relations(
     embedding_client = EmbeddingClient(config)
     await embedding_client.delete_relations(relations)
 
+# get related nodes
+async def get_related_nodes(
+    nodes: Annotated[list[str], "The category names to start the traversal from."],
+    edge_types: Annotated[list[str], "The edge types to follow. Follows all edge types if omitted."] = [],
+    direction: Annotated[GraphDirection, "out: descendants (from_node to to_node), in: ancestors (to_node to from_node), both: k-hop neighbors ignoring the direction."] = "both",
+    max_depth: Annotated[int, "The maximum number of hops to follow."] = 1,
+) -> list[GraphNodeData]:
+    """Retrieve the nodes reachable from the given nodes by following relations, in a single call.
+
+    Returns:
+        list[GraphNodeData]: The reached nodes and their minimum hop count, ordered by depth and node. The start nodes are not included.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig())
+    return await embedding_client.get_related_nodes(nodes, edge_types, direction, max_depth)
+
+# get shortest path
+async def get_shortest_path(
+    from_node: Annotated[str, "The category name to start from."],
+    to_node: Annotated[str, "The category name to reach."],
+    edge_types: Annotated[list[str], "The edge types to follow. Follows all edge types if omitted."] = [],
+    direction: Annotated[GraphDirection, "out: follow relations from from_node to to_node, in: follow them backwards, both: ignore the direction."] = "out",
+    max_depth: Annotated[int, "The maximum number of hops to follow."] = 10,
+) -> list[RelationData]:
+    """Retrieve the relations on a shortest path between two nodes.
+
+    Returns:
+        list[RelationData]: The relations in path order. Empty if no path exists within max_depth hops.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig())
+    return await embedding_client.get_shortest_path(from_node, to_node, edge_types, direction, max_depth)
+
 # get tags
 async def get_tags() -> list[TagData]:
     """Retrieve tags from the vector database.
@@ -278,6 +693,20 @@ async def get_tags() -> list[TagData]:
     tags = await embedding_client.get_tags()
     return tags
 
+# get tags page
+async def get_tags_page(
+    name_list: Annotated[list[str], "A list of tag names to retrieve."] = [],
+    limit: Annotated[int, "The maximum number of items to return in one page."] = 100,
+    cursor: Annotated[str, "The next_cursor of the previous page. Starts from the first page if omitted."] = "",
+) -> PageData[TagData]:
+    """Retrieve one page of tags ordered by name.
+
+    Returns:
+        PageData[TagData]: The tags and the cursor of the next page. next_cursor is empty on the last page.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig())
+    return await embedding_client.get_tags_page(name_list, limit, cursor)
+
 # upsert tags
 async def upsert_tags(
     tags: Annotated[list[TagData], "The list of tags to upsert."],
@@ -309,7 +738,8 @@ async def delete_tags(
 async def refresh_metadata_from_excel(
         file_path: Annotated[str, "The path to the Excel file."],
         source_id_column: Annotated[str, "The name of the column containing source IDs."] = "source_id",
-        metadata_columns: Annotated[list[str], "A list of column names to include as metadata."] = []
+        metadata_columns: Annotated[list[str], "A list of column names to include as metadata."] = [],
+        collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
     ):
     """Refresh metadata in the vector database based on an Excel file. 
     Args:
@@ -317,8 +747,9 @@ async def refresh_metadata_from_excel(
         source_id_column (str): The name of the column containing source IDs.
         category_column (str): The name of the column containing categories.
         metadata_columns (list[str]): A list of column names to include as metadata.
+        collection_name (str): The collection to use.
     """
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     batch_client = EmbeddingBatchClient(embedding_client)
     await batch_client.refresh_metadata_from_excel(
         file_path, source_id_column, metadata_columns
@@ -333,8 +764,11 @@ async def load_documents_from_excel(
         append_vectors: Annotated[bool, """
                                   If True, add vectors for existing source document search. 
                                   If the vector DB has existing documents, vectors for existing document search are added. 
-                                  If the vector DB has no existing documents, new ones are created."""] = False
-    ):
+                                  If the vector DB has no existing documents, new ones are created."""] = False,
+        resume: Annotated[bool, "If True, skip batches already completed by a previous run of the same file."] = False,
+        retry_failed: Annotated[bool, "If True, reprocess only the rows that failed in a previous run of the same file."] = False,
+        collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
+    ) -> list[LoadFailureData]:
     """Load documents from an Excel file into the vector database.
 
     Args:
@@ -344,25 +778,33 @@ async def load_documents_from_excel(
         category_column (str): The name of the column containing categories.
         metadata_columns (list[str]): A list of column names to include as metadata.
         append_vectors (bool): If true, add vectors for existing source document search.
+        resume (bool): If true, skip batches already completed by a previous run of the same file.
+        retry_failed (bool): If true, reprocess only the rows that failed in a previous run of the same file.
+        collection_name (str): The collection to use.
+    Returns:
+        list[LoadFailureData]: The rows that are still recorded as failed in the load journal.
     """
 
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     batch_client = EmbeddingBatchClient(embedding_client)
-    await batch_client.load_documents_from_excel(
-        file_path, content_column, source_id_column, category_column, metadata_columns, append_vectors
+    return await batch_client.load_documents_from_excel(
+        file_path, content_column, source_id_column, category_column, metadata_columns, append_vectors,
+        resume, retry_failed
     )
 
 async def unload_documents_to_excel(
         file_path: Annotated[str, "The path to the output Excel file."],
-        conditions: Annotated[ConditionContainer, "A dictionary of tags to filter documents by. "] = ConditionContainer()
+        conditions: Annotated[ConditionContainer, "A dictionary of tags to filter documents by. "] = ConditionContainer(),
+        collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
     ):
     """Unload documents from the vector database to an Excel file.
 
     Args:
         file_path (str): The path to the output Excel file.
+        collection_name (str): The collection to use.
     """
 
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     batch_client = EmbeddingBatchClient(embedding_client)
     await batch_client.unload_documents_to_excel(file_path, conditions)
 
@@ -370,7 +812,8 @@ async def delete_documents_from_excel(
         file_path: Annotated[str, "The path to the Excel file."],
         source_id_column: Annotated[str, "The name of the column containing source IDs."] = "source_id",
         category_column: Annotated[str, "The name of the column containing categories."] = "category",
-        metadata_columns: Annotated[dict[str, list[str]], "A list of column names to include as metadata."] = {}
+        metadata_columns: Annotated[dict[str, list[str]], "A list of column names to include as metadata."] = {},
+        collection_name: Annotated[str, "The collection to use. Uses VECTOR_DB_COLLECTION_NAME if omitted."] = "",
     ):
     """Delete documents from the vector database based on an Excel file.
 
@@ -379,9 +822,10 @@ async def delete_documents_from_excel(
         source_id_column (str): The name of the column containing source IDs.
         category_column (str): The name of the column containing categories.
         metadata_columns (list[str]): A list of column names to include as metadata.
+        collection_name (str): The collection to use.
     """
 
-    embedding_client = EmbeddingClient()
+    embedding_client = EmbeddingClient(EmbeddingConfig(collection_name))
     batch_client = EmbeddingBatchClient(embedding_client)
     await batch_client.delete_documents_from_excel(
         file_path, source_id_column, category_column, metadata_columns
@@ -467,6 +911,19 @@ async def get_conditions(name_list: list[str] = []) -> list[ConditionContainer]:
     conditions = await embedding_client.get_conditions(name_list)
     return conditions
 
+async def get_conditions_page(
+    name_list: Annotated[list[str], "A list of condition names to retrieve."] = [],
+    limit: Annotated[int, "The maximum number of items to return in one page."] = 100,
+    cursor: Annotated[str, "The next_cursor of the previous page. Starts from the first page if omitted."] = "",
+) -> PageData[ConditionContainer]:
+    """Retrieve one page of conditions ordered by name.
+
+    Returns:
+        PageData[ConditionContainer]: The conditions and the cursor of the next page. next_cursor is empty on the last page.
+    """
+    embedding_client = EmbeddingClient(EmbeddingConfig())
+    return await embedding_client.get_conditions_page(name_list, limit, cursor)
+
 async def upsert_conditions(
     conditions: Annotated[list[ConditionContainer], "The list of conditions to upsert."],
 ):
@@ -1,29 +1,34 @@
 import asyncio
-import os
-from typing import Any, Optional
-from tqdm.asyncio import tqdm_asyncio
-import pandas as pd
-from pandas import DataFrame
+import os, json, hashlib, time, uuid
+from contextlib import asynccontextmanager
+from typing import Any, Optional, Callable, Awaitable, Iterable, Iterator, AsyncIterator, TYPE_CHECKING
+import numpy as np
 from langchain_core.documents import Document
 from vector_search_util.model import (
-    CategoryData, RelationData, TagData, ConditionContainer, EmbeddingConfig, SourceDocumentData, SourceDocumentData
+    CategoryData, RelationData, TagData, ConditionContainer, EmbeddingConfig, SourceDocumentData, SourceDocumentData, LoadJobData, LoadFailureData, IndexTuningResult, RecallAuditResult,
+    CollectionAliasData, ReembedJobData, SnapshotData, PageData, ContentMode, GraphNodeData, GraphDirection
 )
 from vector_search_util._internal.db import SQLiteClient
 
 from vector_search_util._internal.langchain.langchain_vector_db import LangChainVectorDB
 from vector_search_util._internal.langchain.langchain_client import LangchainClient
-from vector_search_util._internal.langchain.langchain_factory import LangchainFactory
+from vector_search_util._internal.langchain.embedding_scheduler import TokenBucket, estimate_tokens
 
+import vector_search_util._internal.codec.json_codec as json_codec
+# pandas、tqdmはExcelの入出力、進捗表示を行う処理でのみ読み込む
+if TYPE_CHECKING:
+    from pandas import DataFrame
 import vector_search_util._internal.log.log_settings as log_settings
 logger = log_settings.getLogger(__name__)
 
 
-def _remove_excel_x000d_artifact(df: DataFrame) -> DataFrame:
+def _remove_excel_x000d_artifact(df: "DataFrame") -> "DataFrame":
     """Excel由来の改行ゴミ `_x000D_` を全カラムから除去する。
 
     `DataFrame.replace` は pandas の将来互換警告対象なので使わず、
     文字列の split/join でリテラル置換する。
     """
+    import pandas as pd
 
     if df is None or df.empty:
         return df
@@ -37,101 +42,495 @@ def _remove_excel_x000d_artifact(df: DataFrame) -> DataFrame:
     return df
 
 
+def _read_excel_rows(file_path: str) -> tuple[Optional[int], Iterator[tuple[int, dict[str, str]]]]:
+    """Excelファイルの先頭シートを読み取り専用モードで開き、(データ行数, (シートの行番号, 行)のイテレータ)を返す。
+
+    pandasのDataFrameを作らずに1行ずつ読むため、ファイルの行数に関わらずメモリ使用量は一定となる。
+    1行目を列名とし、各行は列名をキーとする文字列のdictとする。空のセルは空文字、`_x000D_` は除去する。
+    行番号はExcelの表示と同じ1始まりの番号(先頭のデータ行は2)とし、空の行を読み飛ばしても変わらない。
+    データ行数はシートのサイズ情報から求めるため、取得できない場合はNone
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    sheet = workbook.worksheets[0]
+    total = sheet.max_row - 1 if sheet.max_row else None
+
+    def to_str(value: Any) -> str:
+        if value is None:
+            return ""
+        # read_excel(dtype=str)と同様に、整数値のfloatは整数の文字列とする
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).replace("_x000D_", "")
+
+    def rows() -> Iterator[tuple[int, dict[str, str]]]:
+        try:
+            values = sheet.iter_rows(values_only=True)
+            header = [to_str(value) for value in next(values, ())]
+            for sheet_row, row in enumerate(values, start=2):
+                if all(value is None for value in row):
+                    continue
+                yield sheet_row, {column: to_str(value) for column, value in zip(header, row) if column}
+        finally:
+            workbook.close()
+
+    return total, rows()
+
+
+def _use_staging(config: EmbeddingConfig, total: Optional[int], staging: Optional[bool]) -> bool:
+    # 一括書き込みで一時テーブルを経由するかどうか。未指定の場合は件数がBULK_STAGING_THRESHOLD以上の場合
+    if staging is not None:
+        return staging
+    return config.bulk_staging_threshold > 0 and total is not None and total >= config.bulk_staging_threshold
+
+
+def _file_fingerprint(file_path: str) -> str:
+    """入力ファイルの内容のSHA-256ハッシュを返す。"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class BatchPipeline:
+    """有界キューと固定数のワーカーで構成される producer/consumer パイプライン。
+
+    入力はイテレータから1件ずつ取り出してキューに投入し、キューが満杯の間は読み込みを待機する
+    (バックプレッシャー)。各ステージは固定数のワーカーで処理し、ステージ間も有界キューで接続するため、
+    入力件数に関わらずメモリ使用量は一定となる。
+    ステージ関数が None を返した行はそこで処理を終了し、例外を送出した行は失敗として記録して
+    パイプライン全体は継続する。
+    バッチサイズを指定したステージは、前段から受け取った行をまとめてステージ関数に渡す。
+    ステージ関数は入力と同じ順序の結果のリストを返し、例外を結果とした行は失敗として記録する。
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        stages: list[tuple[str, Callable[[Any], Awaitable[Any]], int] | tuple[str, Callable[[list[Any]], Awaitable[list[Any]]], int, int]],
+        queue_size: int = 0,
+        total: Optional[int] = None,
+        desc: str = "progress",
+        on_complete: Optional[Callable[[int, Optional[Exception]], Awaitable[None]]] = None,
+    ):
+        """
+        :param stages: (ステージ名, 非同期処理関数, ワーカー数) または (ステージ名, 非同期処理関数, ワーカー数, バッチサイズ) のリスト。
+            前段の戻り値が次段の入力となる
+        :param queue_size: 各ステージの入力キューの上限。0以下の場合は最初のステージのワーカー数の2倍
+        :param total: 進捗表示用の総件数
+        :param desc: 進捗表示の説明
+        :param on_complete: 行の処理が終了した際に (行番号, 失敗時の例外) で呼び出されるコールバック
+        """
+        if not stages:
+            raise ValueError("stages must not be empty")
+        self.stages = stages
+        self.queue_size = queue_size if queue_size > 0 else max(1, stages[0][2]) * 2
+        self.total = total
+        self.desc = desc
+        self.on_complete = on_complete
+
+    async def run(self, items: Iterable[Any], numbered: bool = False) -> list[tuple[int, Exception]]:
+        """
+        パイプラインを実行する。
+        :param items: 入力のイテレータ
+        :param numbered: Trueの場合、itemsは (行番号, 入力) のタプルとして扱う
+        :return: 失敗した行の (行番号, 例外) のリスト
+        """
+        from tqdm.asyncio import tqdm_asyncio
+        progress = tqdm_asyncio(total=self.total, desc=self.desc)
+        progress.bar_format = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]"
+
+        batch_sizes = [max(1, stage[3]) if len(stage) > 3 else 0 for stage in self.stages]
+        # バッチのステージの入力キューは1バッチ分の行を保持できる大きさとする
+        queues: list[asyncio.Queue] = [asyncio.Queue(maxsize=max(self.queue_size, batch_size)) for batch_size in batch_sizes]
+        failures: list[tuple[int, Exception]] = []
+
+        async def complete(row_num: int, error: Optional[Exception]):
+            progress.update(1)
+            if self.on_complete is None:
+                return
+            try:
+                await self.on_complete(row_num, error)
+            except Exception as e:
+                logger.error(f"on_complete callback failed for row {row_num}: {e}")
+
+        async def forward(stage_index: int, row_num: int, result: Any):
+            name = self.stages[stage_index][0]
+            if isinstance(result, Exception):
+                logger.error(f"Row {row_num} failed at stage '{name}': {result}")
+                failures.append((row_num, result))
+                await complete(row_num, result)
+            elif result is None or stage_index + 1 == len(self.stages):
+                await complete(row_num, None)
+            else:
+                await queues[stage_index + 1].put((row_num, result))
+
+        async def worker(stage_index: int):
+            func = self.stages[stage_index][1]
+            queue = queues[stage_index]
+            while True:
+                entry = await queue.get()
+                if entry is self._STOP:
+                    return
+                row_num, item = entry
+                try:
+                    result = await func(item)
+                except Exception as e:
+                    result = e
+                await forward(stage_index, row_num, result)
+
+        # バッチのステージで行を集めるワーカーを1つに限り、各バッチをバッチサイズ分の行で満たす
+        collect_locks = [asyncio.Lock() for _ in self.stages]
+
+        async def batch_worker(stage_index: int):
+            func = self.stages[stage_index][1]
+            queue = queues[stage_index]
+            stopped = False
+            while not stopped:
+                entries = []
+                async with collect_locks[stage_index]:
+                    # 前段が終了するまではバッチサイズ分の行を待つ
+                    while len(entries) < batch_sizes[stage_index]:
+                        entry = await queue.get()
+                        if entry is self._STOP:
+                            stopped = True
+                            break
+                        entries.append(entry)
+                if not entries:
+                    return
+                try:
+                    results = await func([item for _, item in entries])
+                    if len(results) != len(entries):
+                        raise ValueError(f"stage returned {len(results)} results for {len(entries)} rows")
+                except Exception as e:
+                    results = [e] * len(entries)
+                for (row_num, _), result in zip(entries, results):
+                    await forward(stage_index, row_num, result)
+
+        workers: list[list[asyncio.Task]] = [
+            [asyncio.create_task(batch_worker(i) if batch_sizes[i] else worker(i)) for _ in range(max(1, stage[2]))]
+            for i, stage in enumerate(self.stages)
+        ]
+        try:
+            entries = items if numbered else enumerate(items)
+            for row_num, item in entries:
+                await queues[0].put((row_num, item))
+            # 前段から順に停止させる
+            for queue, stage_workers in zip(queues, workers):
+                for _ in stage_workers:
+                    await queue.put(self._STOP)
+                await asyncio.gather(*stage_workers)
+        finally:
+            for stage_workers in workers:
+                for task in stage_workers:
+                    task.cancel()
+            progress.close()
+
+        if failures:
+            logger.warning(f"{len(failures)} rows failed.")
+        return sorted(failures, key=lambda failure: failure[0])
+
+
 class EmbeddingClient:
-    def __init__(self, config: EmbeddingConfig = EmbeddingConfig()):
+    def __init__(self, config: Optional[EmbeddingConfig] = None, resolve_collection: bool = True):
         if config is None:
             config = EmbeddingConfig()
+        self.category_db_path: str = os.path.join(config.app_data_path, "vector_db_search_app.db")
+        self.sqlite_client = SQLiteClient(self.category_db_path, config.relation_graph_cache)
+
+        # VECTOR_DB_COLLECTION_NAMEの値。reembedで切り替えた場合、実際のコレクション名はconfigの値となる
+        self.collection_alias_name: str = config.vector_db_collection_name
+        # 移行中のコレクションへの書き込みを反映するクライアント
+        self.shadow_client: Optional[EmbeddingClient] = None
+        if resolve_collection:
+            # reembedで切り替え済みの場合は、切り替え先のコレクションと埋め込みの設定を使用する
+            alias = self.sqlite_client.get_collection_alias(config.vector_db_collection_name)
+            if alias is not None:
+                config = config.with_collection(alias.collection_name, alias.embedding_model, alias.embedding_dimensions, alias.chunk_size)
+            # reembedの実行中は、書き込みを移行先のコレクションにも反映する
+            job = self.sqlite_client.get_running_reembed_job(config.vector_db_collection_name)
+            if job is not None:
+                shadow_config = config.with_collection(job.target_collection, job.embedding_model, job.embedding_dimensions, job.chunk_size)
+                self.shadow_client = EmbeddingClient(shadow_config, resolve_collection=False)
         self.config = config
 
-        self.client = LangchainFactory.create_client(config)
-        self.vector_db = LangChainVectorDB.create_vector_db(self.client)
-        self.category_db_path: str = os.path.join(self.config.app_data_path, "vector_db_search_app.db")
-        self.sqlite_client = SQLiteClient(self.category_db_path)
-
-    async def vector_search_langchain_documents(self, query: str, category: str = "", condition: ConditionContainer = ConditionContainer(), top_k: int = 5) -> list[Document]:
-        results = await self.vector_db.vector_search(query, category, condition, top_k)
+        # ベクトルDBは最初に使用する時に開く。カテゴリ・タグ等の管理DBのみを使う処理ではベクトルDBのライブラリを読み込まない
+        self._vector_db: Optional[LangChainVectorDB] = None
+
+        # バッチ処理中は新規カテゴリ名・タグ名を蓄積し、バッチ単位でまとめて登録する
+        self.defer_name_registration: bool = False
+        self.pending_category_names: set[str] = set()
+        self.pending_tag_names: set[str] = set()
+
+    @property
+    def vector_db(self) -> LangChainVectorDB:
+        # ベクトルDBはコレクションごとにプロセス内で共有する
+        if self._vector_db is None:
+            self._vector_db = LangChainVectorDB.get_vector_db(self.config)
+        return self._vector_db
+
+    @property
+    def client(self) -> LangchainClient:
+        return self.vector_db.client
+
+    async def vector_search_langchain_documents(
+            self, query: str, category: str = "", condition: ConditionContainer = ConditionContainer(), top_k: int = 5,
+            search_ef: Optional[int] = None, exact: bool = False) -> list[Document]:
+        results = await self.vector_db.vector_search(query, category, condition, top_k, search_ef, exact)
         return results
     
-    async def vector_search(self, query: str, category: str = "", conditions: ConditionContainer = ConditionContainer(), top_k: int = 5) -> list[SourceDocumentData]:
-        results = await self.vector_db.vector_search(query, category, conditions, top_k)
-        return SourceDocumentData.from_langchain_documents(results, self.sqlite_client.get_content_by_source_id)
+    async def vector_search(
+            self, query: str, category: str = "", conditions: ConditionContainer = ConditionContainer(), top_k: int = 5,
+            search_ef: Optional[int] = None, exact: bool = False,
+            fields: Optional[list[str]] = None, include_content: ContentMode = "full",
+            expand_category_depth: int = 0, edge_types: list[str] = [], expand_direction: GraphDirection = "out",
+            mmr: bool = False, fetch_k: int = 20, lambda_mult: float = 0.5
+            ) -> list[SourceDocumentData]:
+        """
+        :param fields: 指定した場合、metadataはこのキーとscoreのみ返す
+        :param include_content: full以外の場合は管理DBから本文を読み込まない。snippetの場合のみチャンク本文を取得する
+        :param expand_category_depth: 0より大きい場合、categoryからリレーションをこのホップ数までたどったカテゴリも検索対象とする
+        :param edge_types: カテゴリの展開でたどる辺の種別。空の場合はすべて
+        :param expand_direction: カテゴリの展開でたどる向き
+        :param mmr: Trueの場合、fetch_k件の候補からMMRで類似したチャンクの重複を避けてtop_k件を選ぶ
+        :param lambda_mult: MMRでクエリとの類似度に掛ける重み。0に近いほど多様性を重視する
+        """
+        if category and expand_category_depth > 0:
+            # 展開したカテゴリの集合を1つの$in条件にまとめ、検索(埋め込みとANN)は1回とする
+            categories = await self.sqlite_client.get_category_closure(category, edge_types, expand_direction, expand_category_depth)
+            conditions = conditions.model_copy(deep=True).add_in_condition(self.config.category_key, categories)
+            category = ""
+        results = await self.vector_db.vector_search(
+            query, category, conditions, top_k, search_ef, exact, include_documents=include_content == "snippet",
+            mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult)
+        return SourceDocumentData.from_langchain_documents(results, self.sqlite_client.get_content_by_source_id, fields, include_content)
+
+    async def get_embeddings(self) -> tuple[list[str], np.ndarray]:
+        return await self.vector_db.get_embeddings()
 
     async def metadata_search(
             self, 
-            condition: ConditionContainer = ConditionContainer()
+            condition: ConditionContainer = ConditionContainer(),
+            fields: Optional[list[str]] = None,
+            include_content: ContentMode = "full"
             ) -> tuple[list[str], list[SourceDocumentData]]:
 
-        ids, results = await self.vector_db.get_documents(condition)
-        return ids, SourceDocumentData.from_langchain_documents(results, self.sqlite_client.get_content_by_source_id)
+        ids, results = await self.vector_db.get_documents(condition, include_documents=include_content == "snippet")
+        return ids, SourceDocumentData.from_langchain_documents(results, self.sqlite_client.get_content_by_source_id, fields, include_content)
+
+    async def metadata_search_page(
+            self,
+            condition: ConditionContainer = ConditionContainer(),
+            limit: int = 100,
+            cursor: str = "",
+            fields: Optional[list[str]] = None,
+            include_content: ContentMode = "full"
+            ) -> PageData[SourceDocumentData]:
+        """
+        metadata_searchの結果を、先頭チャンクのvector idの順にlimit件返す。
+        :param cursor: 前のページのnext_cursor。空文字の場合は先頭から
+        """
+        if limit <= 0:
+            raise ValueError("limit must be greater than 0")
+        # 結果はドキュメント単位のため、先頭チャンクのみを読み進める
+        condition = condition.model_copy(deep=True)
+        condition.add_eq_condition(self.config.first_document_key, True)
+        _, documents, next_cursor = await self.vector_db.get_documents_page(
+            condition, str(PageData.decode_cursor(cursor) or ""), limit, include_documents=include_content == "snippet")
+        return PageData[SourceDocumentData](
+            items=SourceDocumentData.from_langchain_documents(documents, self.sqlite_client.get_content_by_source_id, fields, include_content),
+            next_cursor=PageData.encode_cursor(next_cursor) if next_cursor else "",
+        )
 
     async def get_langchain_documents(
             self,
             source_ids: list[str] = [],
             category_ids: list[str] = [],
-            condition: ConditionContainer = ConditionContainer()
+            condition: ConditionContainer = ConditionContainer(),
+            include_documents: bool = True
             ) -> tuple[list[str], list[Document]]:
 
+        # 呼び出し元(デフォルト引数を含む)のConditionContainerを変更しないようコピーしてから追加する
+        condition = condition.model_copy(deep=True)
         if source_ids:
             condition.add_in_condition(self.config.source_id_key, source_ids)
         if category_ids:
             condition.add_in_condition(self.config.category_key, category_ids)
 
-        ids, results = await self.vector_db.get_documents(condition)
+        ids, results = await self.vector_db.get_documents(condition, include_documents)
         return ids, results
 
     async def get_documents(
             self, 
             source_ids: list[str] = [],
             category_ids: list[str] = [],
-            condition: ConditionContainer = ConditionContainer()
+            condition: ConditionContainer = ConditionContainer(),
+            fields: Optional[list[str]] = None,
+            include_content: ContentMode = "full"
             ) -> tuple[list[str], list[SourceDocumentData]]:
 
-        ids, results = await self.get_langchain_documents(source_ids, category_ids, condition)
-        return ids, SourceDocumentData.from_langchain_documents(results, self.sqlite_client.get_content_by_source_id)
+        ids, results = await self.get_langchain_documents(source_ids, category_ids, condition, include_documents=include_content == "snippet")
+        return ids, SourceDocumentData.from_langchain_documents(results, self.sqlite_client.get_content_by_source_id, fields, include_content)
+
+    async def get_documents_page(
+            self,
+            source_ids: list[str] = [],
+            category_ids: list[str] = [],
+            condition: ConditionContainer = ConditionContainer(),
+            limit: int = 100,
+            cursor: str = "",
+            fields: Optional[list[str]] = None,
+            include_content: ContentMode = "full"
+            ) -> PageData[SourceDocumentData]:
+        """
+        get_documentsと同じ条件のドキュメントを、先頭チャンクのvector idの順にlimit件返す。
+        :param cursor: 前のページのnext_cursor。空文字の場合は先頭から
+        """
+        if limit <= 0:
+            raise ValueError("limit must be greater than 0")
+        condition = condition.model_copy(deep=True)
+        # 1ドキュメントが1チャンクとなるよう先頭チャンクに絞り込み、limitをドキュメント数とする
+        condition.add_eq_condition(self.config.first_document_key, True)
+        if source_ids:
+            condition.add_in_condition(self.config.source_id_key, source_ids)
+        if category_ids:
+            condition.add_in_condition(self.config.category_key, category_ids)
+
+        _, documents, next_cursor = await self.vector_db.get_documents_page(
+            condition, str(PageData.decode_cursor(cursor) or ""), limit, include_documents=include_content == "snippet")
+        return PageData[SourceDocumentData](
+            items=SourceDocumentData.from_langchain_documents(documents, self.sqlite_client.get_content_by_source_id, fields, include_content),
+            next_cursor=PageData.encode_cursor(next_cursor) if next_cursor else "",
+        )
+
+    async def iter_langchain_documents(
+            self,
+            source_ids: list[str] = [],
+            category_ids: list[str] = [],
+            condition: ConditionContainer = ConditionContainer(),
+            page_size: int = 1000
+            ) -> AsyncIterator[list[Document]]:
+        """get_langchain_documentsと同じ条件のチャンクを、ベクトルDBから読み込みながらpage_size件ずつ返す。"""
+        condition = condition.model_copy(deep=True)
+        if source_ids:
+            condition.add_in_condition(self.config.source_id_key, source_ids)
+        if category_ids:
+            condition.add_in_condition(self.config.category_key, category_ids)
+
+        async for _, documents in self.vector_db.iter_documents(condition, page_size):
+            yield documents
+
+    async def iter_documents(
+            self,
+            source_ids: list[str] = [],
+            category_ids: list[str] = [],
+            condition: ConditionContainer = ConditionContainer(),
+            page_size: int = 1000
+            ) -> AsyncIterator[list[SourceDocumentData]]:
+        """get_documentsと同じ条件のドキュメントを、ページごとに本文を読み込みながら返す。"""
+        async for documents in self.iter_langchain_documents(source_ids, category_ids, condition, page_size):
+            data_list = SourceDocumentData.from_langchain_documents(documents, self.sqlite_client.get_content_by_source_id)
+            if data_list:
+                yield data_list
     
     async def add_documents(self, data_list: list[SourceDocumentData]):
-        result = await self.vector_db.add_documents(SourceDocumentData.to_langchain_documents(data_list))
+        result = await self.vector_db.add_documents(SourceDocumentData.to_langchain_documents(data_list, chunk_size=self.config.chunk_size))
+        if self.shadow_client is not None:
+            await self.shadow_client.vector_db.add_documents(
+                SourceDocumentData.to_langchain_documents(data_list, chunk_size=self.shadow_client.config.chunk_size))
         if result:
             # source_documentsに新規ドキュメントがあれば追加
             await self.sqlite_client.upsert_source_documents(data_list)
-            # data_listのcategoryのsetを取得して、カテゴリDBに存在しない場合は追加する
-            data_list_category_names_set = set([data.category for data in data_list if data.category is not None])
-            # data_listのmetadataのkeyのsetを取得して、タグDBに存在しない場合は追加する
-            data_list_metadata_keys_set = set([key for data in data_list for key in data.metadata.keys() if key is not None])
-            # metadataに新規カテゴリがあれば追加
-            await self.sqlite_client.upsert_new_categories(data_list_category_names_set)
-            # metadataに新規タグがあれば追加
-            await self.sqlite_client.upsert_new_tags(data_list_metadata_keys_set)
+            # 新規カテゴリ・タグがあれば追加
+            await self.register_names(data_list)
+
+    async def register_names(self, data_list: list[SourceDocumentData]):
+        # data_listのcategoryのsetを取得して、カテゴリDBに存在しない場合は追加する
+        data_list_category_names_set = set([data.category for data in data_list if data.category is not None])
+        # data_listのmetadataのkeyのsetを取得して、タグDBに存在しない場合は追加する
+        data_list_metadata_keys_set = set([key for data in data_list for key in data.metadata.keys() if key is not None])
+        if self.defer_name_registration:
+            self.pending_category_names.update(data_list_category_names_set)
+            self.pending_tag_names.update(data_list_metadata_keys_set)
+            return
+        await self.sqlite_client.upsert_new_categories_and_tags(data_list_category_names_set, data_list_metadata_keys_set)
+
+    async def flush_names(self):
+        # 蓄積した新規カテゴリ名・タグ名を1トランザクションで登録する
+        category_names, self.pending_category_names = self.pending_category_names, set()
+        tag_names, self.pending_tag_names = self.pending_tag_names, set()
+        await self.sqlite_client.upsert_new_categories_and_tags(category_names, tag_names)
+
+    @asynccontextmanager
+    async def deferred_name_registration(self) -> AsyncIterator[None]:
+        # ブロック内の新規カテゴリ名・タグ名の登録を遅延し、終了時にまとめて登録する
+        self.defer_name_registration = True
+        try:
+            yield
+        finally:
+            self.defer_name_registration = False
+            await self.flush_names()
 
     async def update_metadata(self, source_ids: list[str], metadata: dict[str, Any]) -> bool:
         result = await self.vector_db.update_metadata(source_ids, metadata)
+        if self.shadow_client is not None:
+            await self.shadow_client.vector_db.update_metadata(source_ids, metadata)
         return result
 
     async def upsert_documents(self, data_list: list[SourceDocumentData], append_vectors: bool = False):
-        result = await self.vector_db.upsert_documents(SourceDocumentData.to_langchain_documents(data_list), append_vectors)
+        result = await self.vector_db.upsert_documents(
+            SourceDocumentData.to_langchain_documents(data_list, chunk_size=self.config.chunk_size), append_vectors)
+        if self.shadow_client is not None:
+            await self.shadow_client.vector_db.upsert_documents(
+                SourceDocumentData.to_langchain_documents(data_list, chunk_size=self.shadow_client.config.chunk_size), append_vectors)
 
         if result:
             # source_documentsに新規ドキュメントがあれば追加
             await self.sqlite_client.upsert_source_documents(data_list)
-            # data_listのcategoryのsetを取得して、カテゴリDBに存在しない場合は追加する
-            data_list_category_names_set = set([data.category for data in data_list if data.category is not None])
-            # data_listのmetadataのkeyのsetを取得して、タグDBに存在しない場合は追加する
-            data_list_metadata_keys_set = set([key for data in data_list for key in data.metadata.keys() if key is not None])
-            # metadataに新規カテゴリがあれば追加
-            await self.sqlite_client.upsert_new_categories(data_list_category_names_set)
-            # metadataに新規タグがあれば追加
-            await self.sqlite_client.upsert_new_tags(data_list_metadata_keys_set)
-
+            # 新規カテゴリ・タグがあれば追加
+            await self.register_names(data_list)
+
+    # upsert_documentsを、チャンク分割と差分の反映、埋め込み、格納の段階に分けて行う(パイプライン用)
+    async def prepare_upsert(self, data_list: list[SourceDocumentData], append_vectors: bool = False) -> list[Document]:
+        """
+        ドキュメントをチャンクに分割して既存チャンクとの差分を反映し、ベクトル化する必要のあるチャンクを返す。
+        """
+        return await self.vector_db.prepare_upsert(
+            SourceDocumentData.to_langchain_documents(data_list, chunk_size=self.config.chunk_size), append_vectors)
+
+    async def embed_chunks(self, documents: list[Document]) -> np.ndarray:
+        return await self.vector_db.embed_documents_with_retry(documents)
+
+    async def write_upserted_documents(
+        self, data_list: list[SourceDocumentData], documents: list[Document], embeddings: np.ndarray, append_vectors: bool = False
+        ):
+        """
+        prepare_upsertが返したチャンクを埋め込み済みのベクトルとともに格納し、source_documents、カテゴリ名・タグ名を登録する。
+        """
+        await self.vector_db.add_embeddings([doc.id or str(uuid.uuid4()) for doc in documents], embeddings, documents)
+        if self.shadow_client is not None:
+            await self.shadow_client.vector_db.upsert_documents(
+                SourceDocumentData.to_langchain_documents(data_list, chunk_size=self.shadow_client.config.chunk_size), append_vectors)
+        await self.sqlite_client.upsert_source_documents(data_list)
+        await self.register_names(data_list)
 
     async def delete_documents_by_source_ids(self, source_id_list: list[str], condition: ConditionContainer = ConditionContainer()):
-        condition.add_in_condition(self.config.source_id_key, source_id_list)
+        condition = condition.model_copy(deep=True).add_in_condition(self.config.source_id_key, source_id_list)
         await self.sqlite_client.delete_source_documents(source_id_list)
         await self.vector_db.delete_documents_by_tags(condition)
+        if self.shadow_client is not None:
+            await self.shadow_client.vector_db.delete_documents_by_tags(condition)
 
     async def delete_all_documents(self):
-        ids, _ = await self.vector_db.get_documents()
+        ids, _ = await self.vector_db.get_documents(include_documents=False)
         await self.sqlite_client.delete_all_source_documents()
         await self.vector_db.delete_documents_by_ids(ids)
+        if self.shadow_client is not None:
+            shadow_ids, _ = await self.shadow_client.vector_db.get_documents(include_documents=False)
+            await self.shadow_client.vector_db.delete_documents_by_ids(shadow_ids)
     
     async def upsert_categories(self, categories: list[CategoryData]):
         await self.sqlite_client.upsert_categories(categories)    
@@ -143,6 +542,19 @@ class EmbeddingClient:
         ) -> list[CategoryData]:
         return await self.sqlite_client.get_categories(name_list, conditions)
     
+    async def get_categories_page(
+        self,
+        name_list: list[str] = [],
+        conditions: ConditionContainer = ConditionContainer(),
+        limit: int = 100,
+        cursor: str = ""
+        ) -> PageData[CategoryData]:
+        if limit <= 0:
+            raise ValueError("limit must be greater than 0")
+        categories = await self.sqlite_client.get_categories(name_list, conditions, PageData.decode_cursor(cursor) or "", limit)
+        next_cursor = PageData.encode_cursor(categories[-1].name) if len(categories) == limit else ""
+        return PageData[CategoryData](items=categories, next_cursor=next_cursor)
+
     async def delete_categories(self, name_list: list[str]):
         await self.sqlite_client.delete_categories(name_list)
 
@@ -157,6 +569,31 @@ class EmbeddingClient:
         ) -> list[RelationData]:
         return await self.sqlite_client.get_relations(from_nodes, to_nodes, edge_types, conditions)
 
+    async def get_relations_page(
+        self, from_nodes: list[str] = [],
+        to_nodes: list[str] = [], edge_types: list[str] = [],
+        conditions: ConditionContainer = ConditionContainer(),
+        limit: int = 100,
+        cursor: str = ""
+        ) -> PageData[RelationData]:
+        if limit <= 0:
+            raise ValueError("limit must be greater than 0")
+        after = tuple(PageData.decode_cursor(cursor) or ())
+        relations = await self.sqlite_client.get_relations(from_nodes, to_nodes, edge_types, conditions, after, limit)
+        next_cursor = ""
+        if len(relations) == limit:
+            next_cursor = PageData.encode_cursor([relations[-1].from_node, relations[-1].to_node, relations[-1].edge_type])
+        return PageData[RelationData](items=relations, next_cursor=next_cursor)
+
+    async def iter_relations(
+        self, from_nodes: list[str] = [],
+        to_nodes: list[str] = [], edge_types: list[str] = [],
+        conditions: ConditionContainer = ConditionContainer(),
+        page_size: int = 1000
+        ) -> AsyncIterator[list[RelationData]]:
+        async for relations in self.sqlite_client.iter_relations(from_nodes, to_nodes, edge_types, conditions, page_size):
+            yield relations
+
     async def upsert_relations(self, relations: list[RelationData]):
         await self.sqlite_client.upsert_relations(relations)
     
@@ -166,19 +603,53 @@ class EmbeddingClient:
     async def delete_all_relations(self):
         await self.sqlite_client.delete_all_relations()
 
-    async def cleanup_categories(self):
-        # Sqliteに登録されたカテゴリごとにタグ検索して、データが存在しない場合はそのタグを削除する。
+    async def get_related_nodes(
+        self, nodes: list[str], edge_types: list[str] = [],
+        direction: GraphDirection = "both", max_depth: int = 1
+        ) -> list[GraphNodeData]:
+        """
+        ノードからリレーションをmax_depthホップまでたどって到達したノードを返す。
+        direction="out"で子孫、"in"で祖先、"both"でk-hop近傍となる。
+        """
+        if max_depth <= 0:
+            raise ValueError("max_depth must be greater than 0")
+        return await self.sqlite_client.get_related_nodes(nodes, edge_types, direction, max_depth)
+
+    async def get_shortest_path(
+        self, from_node: str, to_node: str, edge_types: list[str] = [],
+        direction: GraphDirection = "out", max_depth: int = 10
+        ) -> list[RelationData]:
+        """
+        from_nodeからto_nodeまでの最短経路のリレーションを返す。経路がない場合は空のリスト
+        """
+        if max_depth <= 0:
+            raise ValueError("max_depth must be greater than 0")
+        return await self.sqlite_client.get_shortest_path(from_node, to_node, edge_types, direction, max_depth)
+
+    async def cleanup_categories(self, dry_run: bool = False) -> list[str]:
+        """
+        ベクトルDBのチャンクから参照されていないカテゴリを削除する。
+        チャンクのメタデータを1回走査して使用中のカテゴリの集合を求め、それ以外をまとめて削除する。
+        :param dry_run: Trueの場合は削除せずに対象のカテゴリ名のみを返す
+        :return: 削除対象のカテゴリ名のリスト
+        """
+        live_category_names = {str(value) for value in await self.vector_db.get_distinct_metadata_values(self.config.category_key)}
         categories = await self.sqlite_client.get_categories()
-    
-        for category in categories:
-            condition = ConditionContainer().add_in_condition(self.config.category_key, [category.name])
-            vector_ids, _ = await self.vector_db.get_documents(condition)
-            if len(vector_ids) == 0:
-                await self.sqlite_client.delete_categories([category.name])
+        orphan_names = sorted([category.name for category in categories if category.name not in live_category_names])
+        if orphan_names and not dry_run:
+            await self.sqlite_client.delete_categories(orphan_names)
+        return orphan_names
     
     async def get_tags(self, name_list: list[str] = []) -> list[TagData]:
         return await self.sqlite_client.get_tags(name_list)
 
+    async def get_tags_page(self, name_list: list[str] = [], limit: int = 100, cursor: str = "") -> PageData[TagData]:
+        if limit <= 0:
+            raise ValueError("limit must be greater than 0")
+        tags = await self.sqlite_client.get_tags(name_list, PageData.decode_cursor(cursor) or "", limit)
+        next_cursor = PageData.encode_cursor(tags[-1].name) if len(tags) == limit else ""
+        return PageData[TagData](items=tags, next_cursor=next_cursor)
+
     async def delete_tags(self, name_list: list[str]):
         await self.sqlite_client.delete_tags(name_list)
 
@@ -190,6 +661,13 @@ class EmbeddingClient:
 
     async def get_conditions(self, name_list: list[str] = []) -> list[ConditionContainer]:
         return await self.sqlite_client.get_conditions(name_list)
+
+    async def get_conditions_page(self, name_list: list[str] = [], limit: int = 100, cursor: str = "") -> PageData[ConditionContainer]:
+        if limit <= 0:
+            raise ValueError("limit must be greater than 0")
+        conditions = await self.sqlite_client.get_conditions(name_list, ConditionContainer(), PageData.decode_cursor(cursor) or "", limit)
+        next_cursor = PageData.encode_cursor(conditions[-1].name) if len(conditions) == limit else ""
+        return PageData[ConditionContainer](items=conditions, next_cursor=next_cursor)
     
     async def upsert_conditions(self, conditions: list[ConditionContainer]):
         await self.sqlite_client.upsert_conditions(conditions)
@@ -205,28 +683,61 @@ class EmbeddingBatchClient:
     def __init__(self, embedding_client: EmbeddingClient):
         self.embedding_client = embedding_client
 
-    async def _process_row_(self, row_num: int, data: SourceDocumentData, progress: tqdm_asyncio, append_vectors: bool) -> int:
-        await self.embedding_client.upsert_documents([data], append_vectors)
-        progress.update(1)
-        return row_num
-
-    async def update(self, data_list: list[SourceDocumentData], append_vectors: bool = False):
-        progress = tqdm_asyncio(total=len(data_list), desc="progress")
-        progress.bar_format = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]"
-
-        concurrency  = int(self.embedding_client.config.concurrency)
-        sem = asyncio.Semaphore(concurrency)
-
-        async def wrapped(row_num: int, data: SourceDocumentData):
-            async with sem:
-                return await self._process_row_(row_num, data, progress, append_vectors)
-
-        tasks = [wrapped(i, data) for i, data in enumerate(data_list)]
-        await asyncio.gather(*tasks)
-        progress.close()
+    async def update(
+        self, data_list: Iterable[SourceDocumentData], append_vectors: bool = False, total: Optional[int] = None
+        ) -> list[tuple[int, Exception]]:
+        if total is None and isinstance(data_list, list):
+            total = len(data_list)
+        return await self._run_pipeline_(data_list, [], append_vectors, total)
+
+    async def _run_pipeline_(
+        self, items: Iterable[Any], parse_stages: list[tuple[str, Callable[[Any], Awaitable[Any]], int]],
+        append_vectors: bool, total: Optional[int], numbered: bool = False,
+        on_complete: Optional[Callable[[int, Optional[Exception]], Awaitable[None]]] = None
+        ) -> list[tuple[int, Exception]]:
+        concurrency = int(self.embedding_client.config.concurrency)
+        batch_size = max(1, self.embedding_client.config.load_batch_size)
+        embedding_batch_size = max(1, self.embedding_client.config.embedding_batch_size)
+        completed = 0
+
+        # 行ごとにチャンク分割と既存チャンクとの差分の反映を行い、ベクトル化するチャンクを次段に渡す
+        async def chunk(data: SourceDocumentData) -> tuple[SourceDocumentData, list[Document]]:
+            return data, await self.embedding_client.prepare_upsert([data], append_vectors)
+
+        # 複数行のチャンクをまとめて1回の埋め込みAPI呼び出しでベクトル化する
+        async def embed(
+                entries: list[tuple[SourceDocumentData, list[Document]]]
+                ) -> list[tuple[SourceDocumentData, list[Document], np.ndarray]]:
+            documents = [doc for _, docs in entries for doc in docs]
+            embeddings = await self.embedding_client.embed_chunks(documents) if documents else np.empty((0, 0), dtype=np.float32)
+            results = []
+            offset = 0
+            for data, docs in entries:
+                results.append((data, docs, embeddings[offset:offset + len(docs)]))
+                offset += len(docs)
+            return results
+
+        async def write(entry: tuple[SourceDocumentData, list[Document], np.ndarray]) -> None:
+            data, docs, embeddings = entry
+            await self.embedding_client.write_upserted_documents([data], docs, embeddings, append_vectors)
+
+        async def on_row_complete(row_num: int, error: Optional[Exception]):
+            nonlocal completed
+            completed += 1
+            # batch_size行ごとに新規カテゴリ名・タグ名を登録する
+            if completed % batch_size == 0:
+                await self.embedding_client.flush_names()
+            if on_complete is not None:
+                await on_complete(row_num, error)
+
+        pipeline = BatchPipeline(
+            parse_stages + [("chunk", chunk, 1), ("embed", embed, concurrency, embedding_batch_size), ("write", write, 1)],
+            total=total, on_complete=on_row_complete)
+        async with self.embedding_client.deferred_name_registration():
+            return await pipeline.run(items, numbered)
 
     def __create_metadata_documents_from_dataframe__(
-        self, df: DataFrame, source_id_column: str, metadata_columns: list[str]
+        self, df: "DataFrame", source_id_column: str, metadata_columns: list[str]
     ) -> list[tuple[str, dict[str, Any]]]:
         result: list[tuple[str, dict[str, Any]]] = []
         for _, row in df.iterrows():
@@ -240,23 +751,30 @@ class EmbeddingBatchClient:
         return result
     
     def __create_documents_from_dataframe__(
-        self, df: DataFrame, content_column: str, source_id_column: str, category_column: str, metadata_columns: list[str]
+        self, df: "DataFrame", content_column: str, source_id_column: str, category_column: str, metadata_columns: list[str]
     ) -> list[SourceDocumentData]:
         data_list: list[SourceDocumentData] = []
         for _, row in df.iterrows():
-            content = row.get(content_column, "")
-            source_id = row.get(source_id_column, "")
-            category = row.get(category_column, "") if category_column in df.columns else ""
-            if not content or not source_id:
-                continue
-            metadata = {key: row.get(key, "") for key in metadata_columns}
-            data = SourceDocumentData(source_content=str(content), source_id=str(source_id), category=str(category), metadata=metadata)
-            data_list.append(data)
+            data = self.__create_document_from_row__(row, content_column, source_id_column, category_column, metadata_columns)
+            if data is not None:
+                data_list.append(data)
         return data_list
 
+    def __create_document_from_row__(
+        self, row: Any, content_column: str, source_id_column: str, category_column: str, metadata_columns: list[str]
+    ) -> Optional[SourceDocumentData]:
+        content = row.get(content_column, "")
+        source_id = row.get(source_id_column, "")
+        category = row.get(category_column, "")
+        if not content or not source_id:
+            return None
+        metadata = {key: row.get(key, "") for key in metadata_columns}
+        return SourceDocumentData(source_content=str(content), source_id=str(source_id), category=str(category or ""), metadata=metadata)
+
     async def delete_documents_from_excel(
         self, file_path: str, source_id_column: str, category_column: str, tags: dict[str, list[str]] ={}
     ):
+        import pandas as pd
         df = pd.read_excel(file_path, dtype=str, na_values=[])
         df = _remove_excel_x000d_artifact(df)
 
@@ -277,6 +795,7 @@ class EmbeddingBatchClient:
     async def refresh_metadata_from_excel(
         self, file_path: str, source_id_column: str, metadata_columns: list[str]
     ):
+        import pandas as pd
         df = pd.read_excel(file_path, dtype=str, na_values=[])
         df = _remove_excel_x000d_artifact(df)
         entries = self.__create_metadata_documents_from_dataframe__(df, source_id_column, metadata_columns)
@@ -285,17 +804,122 @@ class EmbeddingBatchClient:
 
     async def load_documents_from_excel(
         self, file_path: str, content_column: str, source_id_column: str, category_column: str, 
-        metadata_columns: list[str], append_vectors: bool = False
-    ):
-        df = pd.read_excel(file_path, dtype=str, na_values=[])
-        df = _remove_excel_x000d_artifact(df)
-        data_list = self.__create_documents_from_dataframe__(df, content_column, source_id_column, category_column, metadata_columns)
-        await self.update(data_list, append_vectors)
+        metadata_columns: list[str], append_vectors: bool = False,
+        resume: bool = False, retry_failed: bool = False
+    ) -> list[LoadFailureData]:
+        """
+        Excelファイルのドキュメントをベクトル化して登録する。
+        進捗はバッチ単位でジャーナルに記録し、resumeで完了済みのバッチを、retry_failedで失敗行のみを再処理する。
+        :return: ジャーナルに残っている失敗行のリスト
+        """
+        sqlite_client = self.embedding_client.sqlite_client
+        # pandasのDataFrameを作らずに1行ずつ読み込む。行番号はジャーナルと同じ0始まりのデータ行の番号とする
+        total_rows, sheet_rows = _read_excel_rows(file_path)
+        rows = ((sheet_row - 2, row) for sheet_row, row in sheet_rows)
+
+        # 入力ファイルの内容と読み込み条件からジョブを識別する
+        fingerprint = _file_fingerprint(file_path)
+        job_params = [content_column, source_id_column, category_column, metadata_columns, append_vectors]
+        job_id = hashlib.sha256(f"{fingerprint}:{json.dumps(job_params, ensure_ascii=False)}".encode("utf-8")).hexdigest()
+        batch_size = max(1, self.embedding_client.config.load_batch_size)
+
+        previous_job = await sqlite_client.get_load_job(job_id) if (resume or retry_failed) else None
+        if (resume or retry_failed) and previous_job is None:
+            logger.info(f"No load journal found for {file_path}. Start loading from the beginning.")
+        elif previous_job is not None:
+            # 前回と同じバッチ境界で再開する
+            batch_size = previous_job.batch_size
+
+        await sqlite_client.start_load_job(
+            LoadJobData(job_id=job_id, file_path=file_path, file_fingerprint=fingerprint, total_rows=total_rows or 0, batch_size=batch_size),
+            reset=previous_job is None
+        )
+
+        # 処理中の行のsource_id。失敗行をジャーナルに記録する際に使う
+        source_ids: dict[int, str] = {}
+
+        def feed(entries: Iterable[tuple[int, dict[str, str]]]) -> Iterator[tuple[int, dict[str, str]]]:
+            for row_num, row in entries:
+                source_ids[row_num] = row.get(source_id_column, "")
+                yield row_num, row
+
+        def failure_of(row_num: int, error: Exception) -> LoadFailureData:
+            return LoadFailureData(row_num=row_num, source_id=source_ids.get(row_num, ""), error=str(error))
+
+        # 行の解析はパイプラインのステージとして逐次行い、全行分のSourceDocumentDataを保持しない
+        async def parse(row: dict[str, str]) -> Optional[SourceDocumentData]:
+            return self.__create_document_from_row__(row, content_column, source_id_column, category_column, metadata_columns)
+
+        if retry_failed and previous_job is not None:
+            # 失敗行のみを再処理し、成功した行をジャーナルから削除する
+            failed_row_nums = {failure.row_num for failure in await sqlite_client.get_load_failures(job_id)}
+            logger.info(f"Retrying {len(failed_row_nums)} failed rows.")
+
+            async def on_retry_complete(row_num: int, error: Optional[Exception]):
+                if error is None:
+                    await sqlite_client.delete_load_failures(job_id, [row_num])
+                else:
+                    await sqlite_client.upsert_load_failures(job_id, [failure_of(row_num, error)])
+                source_ids.pop(row_num, None)
+
+            await self._run_pipeline_(
+                feed((row_num, row) for row_num, row in rows if row_num in failed_row_nums),
+                [("parse", parse, 1)], append_vectors, len(failed_row_nums), numbered=True, on_complete=on_retry_complete)
+        else:
+            completed_batches = await sqlite_client.get_completed_load_batches(job_id) if previous_job is not None else set()
+            if completed_batches:
+                logger.info(f"Skipping {len(completed_batches)} completed batches.")
+
+            # バッチごとの未完了行数と失敗行を保持し、全行を投入済みで全行が終了したバッチをジャーナルに記録する。
+            # 行数は読み込みながら数えるため、投入中のバッチは完了としない
+            remaining: dict[int, int] = {}
+            batch_failures: dict[int, list[LoadFailureData]] = {}
+            feeding_batch = -1
+
+            def feed_batches() -> Iterator[tuple[int, dict[str, str]]]:
+                nonlocal feeding_batch
+                for row_num, row in feed((row_num, row) for row_num, row in rows if row_num // batch_size not in completed_batches):
+                    feeding_batch = row_num // batch_size
+                    remaining[feeding_batch] = remaining.get(feeding_batch, 0) + 1
+                    yield row_num, row
+                feeding_batch = -1
+
+            async def complete_batch(batch_index: int):
+                del remaining[batch_index]
+                # バッチ完了を記録する前に、バッチ内の新規カテゴリ名・タグ名を登録する
+                await self.embedding_client.flush_names()
+                await sqlite_client.complete_load_batch(job_id, batch_index, batch_failures.pop(batch_index, []))
+
+            async def on_batch_row_complete(row_num: int, error: Optional[Exception]):
+                batch_index = row_num // batch_size
+                if error is not None:
+                    batch_failures.setdefault(batch_index, []).append(failure_of(row_num, error))
+                source_ids.pop(row_num, None)
+                remaining[batch_index] -= 1
+                if remaining[batch_index] == 0 and batch_index != feeding_batch:
+                    await complete_batch(batch_index)
+
+            total = None
+            if total_rows is not None:
+                total = max(0, total_rows - len(completed_batches) * batch_size)
+            await self._run_pipeline_(
+                feed_batches(), [("parse", parse, 1)], append_vectors, total, numbered=True, on_complete=on_batch_row_complete)
+            # 最後の行の投入より前に全行が終了したバッチを記録する
+            for batch_index in sorted(remaining):
+                if remaining[batch_index] == 0:
+                    await complete_batch(batch_index)
+
+        failures = await sqlite_client.get_load_failures(job_id)
+        await sqlite_client.update_load_job_status(job_id, "completed" if not failures else "completed_with_failures")
+        if failures:
+            logger.warning(f"{len(failures)} rows failed. Run again with retry_failed to reprocess them.")
+        return failures
     
     async def unload_documents_to_excel(
         self, file_path: str,
         condition: ConditionContainer = ConditionContainer()
     ):
+        import pandas as pd
         _, documents = await self.embedding_client.metadata_search(condition=condition)
         keys = set()
         source_id_key = self.embedding_client.config.source_id_key
@@ -316,7 +940,7 @@ class EmbeddingBatchClient:
             data.update(document.metadata)
             data_list.append(data)
 
-        df = DataFrame()
+        df = pd.DataFrame()
         # 全てのキーをDataFrameのカラムとして追加
         for key in keys:
             df[key] = [data.get(key, "") for data in data_list]
@@ -328,28 +952,25 @@ class CategoryBatchClient:
     def __init__(self, embedding_client: EmbeddingClient):
         self.embedding_client = embedding_client
 
-    async def _process_row_(self, row_num: int, data: CategoryData, progress: tqdm_asyncio) -> int:
-        await self.embedding_client.upsert_categories([data])
-        progress.update(1)
-        return row_num
-
-    async def run(self, data_list: list[CategoryData]):
-        progress = tqdm_asyncio(total=len(data_list), desc="progress")
-        progress.bar_format = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]"
-
-        concurrency  = int(self.embedding_client.config.concurrency)
-        sem = asyncio.Semaphore(concurrency)
-
-        async def wrapped(row_num: int, data: CategoryData):
-            async with sem:
-                return await self._process_row_(row_num, data, progress)
-
-        tasks = [wrapped(i, data) for i, data in enumerate(data_list)]
-        await asyncio.gather(*tasks)
-        progress.close()
+    async def run(
+        self, data_list: Iterable[Any], total: Optional[int] = None, staging: Optional[bool] = None, numbered: bool = False
+    ) -> list[tuple[int, Exception]]:
+        """
+        カテゴリをBULK_WRITE_BATCH_SIZE行ずつ1トランザクションで書き込む。data_listは逐次読み込む。
+        :param staging: 一時テーブルを経由して1トランザクションで反映するかどうか。Noneの場合はtotalで判定する
+        :param numbered: Trueの場合、data_listは(行番号, データ)のタプルとして扱う
+        :return: 失敗した行の(行番号, 例外)のリスト
+        """
+        if total is None and isinstance(data_list, list):
+            total = len(data_list)
+        config = self.embedding_client.config
+        count, failures = await self.embedding_client.sqlite_client.bulk_upsert_categories(
+            data_list, config.bulk_write_batch_size, _use_staging(config, total, staging), numbered)
+        logger.info(f"Upserted {count - len(failures)} categories. failed: {len(failures)}")
+        return failures
 
     def create_category_data_from_dataframe(
-        self, df: DataFrame, name_column: str, description_column: str, metadata_columns: list[str]
+        self, df: "DataFrame", name_column: str, description_column: str, metadata_columns: list[str]
     ) -> list[CategoryData]:
         category_list: list[CategoryData] = []
         for _, row in df.iterrows():
@@ -366,24 +987,25 @@ class CategoryBatchClient:
         self, file_path: str, name_column: str, description_column: str, 
         metadata_columns: list[str]
     ):
-        df = pd.read_excel(file_path, dtype=str, na_values=[])
-        df = _remove_excel_x000d_artifact(df)
-        category_list: list[CategoryData] = []
-        for _, row in df.iterrows():
-            name = row.get(name_column, "")
-            description = row.get(description_column, "")
-            if not name:
-                continue
-            metadata = {col: row.get(col, "") for col in metadata_columns}
-            category = CategoryData(name=str(name), description=str(description), metadata=metadata)
-            category_list.append(category)
-    
-        await self.embedding_client.upsert_categories(category_list)
+        total, rows = _read_excel_rows(file_path)
+
+        def categories() -> Iterator[tuple[int, CategoryData]]:
+            for sheet_row, row in rows:
+                name = row.get(name_column, "")
+                if not name:
+                    continue
+                description = row.get(description_column, "")
+                metadata = {col: row.get(col, "") for col in metadata_columns}
+                yield sheet_row, CategoryData(name=name, description=description, metadata=metadata)
+
+        for sheet_row, error in await self.run(categories(), total, numbered=True):
+            logger.error(f"Failed to upsert category at row {sheet_row} of {file_path}: {error}")
 
     async def unload_category_data_to_excel(
         self, file_path: str,
         tags: dict[str, Any] ={}
     ):
+        import pandas as pd
         # tagからConditionContainerを作成
         condition = ConditionContainer()
         for key, values in tags.items():
@@ -405,7 +1027,7 @@ class CategoryBatchClient:
             data.update(category.metadata)
             data_list.append(data)
 
-        df = DataFrame()
+        df = pd.DataFrame()
         # 全てのキーをDataFrameのカラムとして追加
         for key in keys:
             df[key] = [data.get(key, "") for data in data_list]
@@ -415,6 +1037,7 @@ class CategoryBatchClient:
     async def delete_category_data_from_excel(
         self, file_path: str, name_column: str
     ):
+        import pandas as pd
         df = pd.read_excel(file_path, dtype=str, na_values=[])
         df = _remove_excel_x000d_artifact(df)
         name_list: list[str] = []
@@ -427,28 +1050,25 @@ class RelationBatchClient:
     def __init__(self, embedding_client: EmbeddingClient):
         self.embedding_client = embedding_client
 
-    async def _process_row_(self, row_num: int, data: RelationData, progress: tqdm_asyncio) -> int:
-        await self.embedding_client.upsert_relations([data])
-        progress.update(1)
-        return row_num
-
-    async def run(self, data_list: list[RelationData]):
-        progress = tqdm_asyncio(total=len(data_list), desc="progress")
-        progress.bar_format = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]"
-
-        concurrency  = int(self.embedding_client.config.concurrency)
-        sem = asyncio.Semaphore(concurrency)
-
-        async def wrapped(row_num: int, data: RelationData):
-            async with sem:
-                return await self._process_row_(row_num, data, progress)
-
-        tasks = [wrapped(i, data) for i, data in enumerate(data_list)]
-        await asyncio.gather(*tasks)
-        progress.close()
+    async def run(
+        self, data_list: Iterable[Any], total: Optional[int] = None, staging: Optional[bool] = None, numbered: bool = False
+    ) -> list[tuple[int, Exception]]:
+        """
+        リレーションをBULK_WRITE_BATCH_SIZE行ずつ1トランザクションで書き込む。data_listは逐次読み込む。
+        :param staging: 一時テーブルを経由して1トランザクションで反映するかどうか。Noneの場合はtotalで判定する
+        :param numbered: Trueの場合、data_listは(行番号, リレーション)のタプルとして扱う
+        :return: 失敗した行の(行番号, 例外)のリスト。numberedでない場合、行番号は空文字のフィールドを含むリレーションを除いた番号
+        """
+        if total is None and isinstance(data_list, list):
+            total = len(data_list)
+        config = self.embedding_client.config
+        count, failures = await self.embedding_client.sqlite_client.bulk_upsert_relations(
+            data_list, config.bulk_write_batch_size, _use_staging(config, total, staging), numbered)
+        logger.info(f"Upserted {count - len(failures)} relations. failed: {len(failures)}")
+        return failures
 
     def create_relation_data_from_dataframe(
-        self, df: DataFrame, from_node_column: str, to_node_column: str, edge_type_column: str, metadata_columns: list[str]
+        self, df: "DataFrame", from_node_column: str, to_node_column: str, edge_type_column: str, metadata_columns: list[str]
     ) -> list[RelationData]:
         relation_list: list[RelationData] = []
         for _, row in df.iterrows():
@@ -467,23 +1087,24 @@ class RelationBatchClient:
         self, file_path: str, from_node_column: str, to_node_column: str, edge_type_column: str, 
         metadata_columns: list[str]
     ):
-        df = pd.read_excel(file_path, dtype=str, na_values=[])
-        df = _remove_excel_x000d_artifact(df)
-        relation_list: list[RelationData] = []
-        for _, row in df.iterrows():
-            from_node = row.get(from_node_column, "")
-            to_node = row.get(to_node_column, "")
-            edge_type = row.get(edge_type_column, "")
-            metadata = {col: row.get(col, "") for col in metadata_columns}
-            relation = RelationData(from_node=str(from_node), to_node=str(to_node), edge_type=str(edge_type), metadata=metadata)
-            relation_list.append(relation)
-    
-        await self.embedding_client.upsert_relations(relation_list)
+        total, rows = _read_excel_rows(file_path)
+
+        def relations() -> Iterator[tuple[int, RelationData]]:
+            for sheet_row, row in rows:
+                from_node = row.get(from_node_column, "")
+                to_node = row.get(to_node_column, "")
+                edge_type = row.get(edge_type_column, "")
+                metadata = {col: row.get(col, "") for col in metadata_columns}
+                yield sheet_row, RelationData(from_node=from_node, to_node=to_node, edge_type=edge_type, metadata=metadata)
+
+        for sheet_row, error in await self.run(relations(), total, numbered=True):
+            logger.error(f"Failed to upsert relation at row {sheet_row} of {file_path}: {error}")
 
     async def unload_relation_data_to_excel(
         self, file_path: str,
         tags: dict[str, Any] ={}
     ):
+        import pandas as pd
         # tagからConditionContainerを作成
         conditions = ConditionContainer()
         for key, values in tags.items():
@@ -504,7 +1125,7 @@ class RelationBatchClient:
             data.update(relation.metadata)
             data_list.append(data)
 
-        df = DataFrame()
+        df = pd.DataFrame()
         # 全てのキーをDataFrameのカラムとして追加
         for key in keys:
             df[key] = [data.get(key, "") for data in data_list]
@@ -513,6 +1134,7 @@ class RelationBatchClient:
     async def delete_relation_data_from_excel(
         self, file_path: str, from_node_column: str, to_node_column: str, edge_type_column: str
     ):
+        import pandas as pd
         df = pd.read_excel(file_path, dtype=str, na_values=[])
         df = _remove_excel_x000d_artifact(df)
         relation_list: list[RelationData] = []
@@ -529,9 +1151,27 @@ class TagBatchClient:
     def __init__(self, embedding_client: EmbeddingClient):
         self.embedding_client = embedding_client
 
+    async def run(
+        self, data_list: Iterable[Any], total: Optional[int] = None, staging: Optional[bool] = None, numbered: bool = False
+    ) -> list[tuple[int, Exception]]:
+        """
+        タグをBULK_WRITE_BATCH_SIZE行ずつ1トランザクションで書き込む。data_listは逐次読み込む。
+        :param staging: 一時テーブルを経由して1トランザクションで反映するかどうか。Noneの場合はtotalで判定する
+        :param numbered: Trueの場合、data_listは(行番号, データ)のタプルとして扱う
+        :return: 失敗した行の(行番号, 例外)のリスト
+        """
+        if total is None and isinstance(data_list, list):
+            total = len(data_list)
+        config = self.embedding_client.config
+        count, failures = await self.embedding_client.sqlite_client.bulk_upsert_tags(
+            data_list, config.bulk_write_batch_size, _use_staging(config, total, staging), numbered)
+        logger.info(f"Upserted {count - len(failures)} tags. failed: {len(failures)}")
+        return failures
+
     async def delete_tag_data_from_excel(
         self, file_path: str, name_column: str
     ):
+        import pandas as pd
         df = pd.read_excel(file_path, dtype=str, na_values=[])
         df = _remove_excel_x000d_artifact(df)
         name_list: list[str] = []
@@ -543,6 +1183,7 @@ class TagBatchClient:
     async def unload_tag_data_to_excel(
         self, file_path: str
     ):
+        import pandas as pd
         # 全タグを取得してExcelに保存する
         tag_list = await self.embedding_client.get_tags()
         data = {
@@ -556,16 +1197,376 @@ class TagBatchClient:
     async def load_tag_data_from_excel(
         self, file_path: str, name_column: str, description_column: str, metadata_columns: list[str]
     ):
-        df = pd.read_excel(file_path, dtype=str, na_values=[])
-        df = _remove_excel_x000d_artifact(df)
-        tag_list: list[TagData] = []
-        for _, row in df.iterrows():
-            name = row.get(name_column, "")
-            if not name:
-                continue
-            description = row.get(description_column, "")
-            metadata = {col: row.get(col, "") for col in metadata_columns}
-            tag = TagData(name=str(name), description=str(description), metadata=metadata)
-            tag_list.append(tag)
-    
-        await self.embedding_client.upsert_tags(tag_list)
+        total, rows = _read_excel_rows(file_path)
+
+        def tags() -> Iterator[tuple[int, TagData]]:
+            for sheet_row, row in rows:
+                name = row.get(name_column, "")
+                if not name:
+                    continue
+                description = row.get(description_column, "")
+                metadata = {col: row.get(col, "") for col in metadata_columns}
+                yield sheet_row, TagData(name=name, description=description, metadata=metadata)
+
+        for sheet_row, error in await self.run(tags(), total, numbered=True):
+            logger.error(f"Failed to upsert tag at row {sheet_row} of {file_path}: {error}")
+
+
+class IndexTuningClient:
+    """HNSWパラメータ(M, construction_ef, search_ef)ごとのrecall@kと検索レイテンシを計測する。
+
+    コレクションに格納済みのベクトルを読み込み、その一部をクエリとして使用する(クエリ自身は正解から除外)。
+    正解は全件のコサイン類似度による厳密検索で求め、各パラメータの組み合わせごとに
+    インメモリのChromaコレクションを作成して計測する。埋め込みAPIは呼び出さない。
+    audit_recallは既存コレクションのHNSWインデックスを厳密検索と比較する。
+    """
+    def __init__(self, embedding_client: EmbeddingClient):
+        self.embedding_client = embedding_client
+
+    @classmethod
+    def __exact_top_k__(cls, vectors: np.ndarray, query_indices: np.ndarray, k: int) -> np.ndarray:
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = normalized[query_indices] @ normalized.T
+        # クエリ自身は除外する
+        scores[np.arange(len(query_indices)), query_indices] = -np.inf
+        top_k = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return top_k
+
+    async def run(
+            self, k: int = 10, num_queries: int = 100,
+            m_values: list[int] = [16, 24, 32],
+            construction_ef_values: list[int] = [100, 200, 400],
+            search_ef_values: list[int] = [10, 50, 100, 200]
+            ) -> list[IndexTuningResult]:
+        import chromadb
+
+        ids, vectors = await self.embedding_client.get_embeddings()
+        if len(ids) <= k:
+            raise ValueError(f"The collection must contain more than k={k} vectors. count={len(ids)}")
+
+        rng = np.random.default_rng(0)
+        query_indices = rng.choice(len(ids), size=min(num_queries, len(ids)), replace=False)
+        ground_truth = [set(row.tolist()) for row in self.__exact_top_k__(vectors, query_indices, k)]
+        index_ids = [str(i) for i in range(len(ids))]
+
+        client = chromadb.EphemeralClient()
+        results: list[IndexTuningResult] = []
+        for m in m_values:
+            for construction_ef in construction_ef_values:
+                collection_name = f"tune_index_{uuid.uuid4().hex}"
+                # search_efを最小にし、クエリごとの取得件数でefを指定する(HNSWは max(ef, 取得件数) で探索する)
+                collection = client.create_collection(
+                    collection_name,
+                    metadata={"hnsw:space": "cosine", "hnsw:M": m, "hnsw:construction_ef": construction_ef, "hnsw:search_ef": 1}
+                )
+                try:
+                    start = time.perf_counter()
+                    batch_size = 1000
+                    for i in range(0, len(index_ids), batch_size):
+                        collection.add(ids=index_ids[i:i + batch_size], embeddings=vectors[i:i + batch_size])
+                    build_seconds = time.perf_counter() - start
+
+                    for search_ef in search_ef_values:
+                        if search_ef < k:
+                            continue
+                        latencies: list[float] = []
+                        hits = 0
+                        for query_index, expected in zip(query_indices, ground_truth):
+                            start = time.perf_counter()
+                            # クエリ自身が含まれるため1件多く取得する
+                            response = collection.query(query_embeddings=vectors[query_index:query_index + 1], n_results=max(search_ef, k + 1), include=[])
+                            latencies.append((time.perf_counter() - start) * 1000)
+                            found = [int(i) for i in response["ids"][0] if int(i) != query_index][:k]
+                            hits += len(expected.intersection(found))
+                        results.append(IndexTuningResult(
+                            m=m, construction_ef=construction_ef, search_ef=search_ef,
+                            recall=hits / (len(query_indices) * k),
+                            p50_latency_ms=float(np.percentile(latencies, 50)),
+                            p99_latency_ms=float(np.percentile(latencies, 99)),
+                            build_seconds=build_seconds,
+                        ))
+                        logger.info(f"M={m} construction_ef={construction_ef} search_ef={search_ef} recall={results[-1].recall:.4f}")
+                finally:
+                    client.delete_collection(collection_name)
+        return results
+
+    async def audit_recall(self, k: int = 10, num_queries: int = 100, search_ef: Optional[int] = None) -> RecallAuditResult:
+        """
+        格納済みのベクトルをクエリとして、コレクションのHNSW検索のrecall@kを厳密検索と比較して計測する。
+        :param k: recall@kのk
+        :param num_queries: クエリとして使用するベクトル数
+        :param search_ef: HNSW検索に適用するef。Noneの場合はコレクションの設定値
+        """
+        vector_db = self.embedding_client.vector_db
+        index = await vector_db.get_exact_index()
+        if index.size <= k:
+            raise ValueError(f"The collection must contain more than k={k} vectors. count={index.size}")
+
+        rng = np.random.default_rng(0)
+        query_positions = rng.choice(index.size, size=min(num_queries, index.size), replace=False)
+        hits = 0
+        exact_latencies: list[float] = []
+        hnsw_latencies: list[float] = []
+        for position in query_positions:
+            query_id = index.ids[position]
+            query_vector = index.get_vectors(np.array([position]))
+
+            start = time.perf_counter()
+            # クエリ自身が含まれるため1件多く取得する
+            positions, _ = index.search_positions(query_vector, k + 1)
+            exact_latencies.append((time.perf_counter() - start) * 1000)
+            expected = {index.ids[p] for p in [p for p in positions[0] if p != position][:k]}
+
+            start = time.perf_counter()
+            docs_and_scores = await vector_db.vector_search_by_vector(query_vector[0].tolist(), k + 1, search_ef=search_ef)
+            hnsw_latencies.append((time.perf_counter() - start) * 1000)
+            found = [doc.id for doc, _ in docs_and_scores if doc.id != query_id][:k]
+            hits += len(expected.intersection(found))
+
+        return RecallAuditResult(
+            k=k, num_queries=len(query_positions), search_ef=search_ef,
+            recall=hits / (len(query_positions) * k),
+            exact_p50_latency_ms=float(np.percentile(exact_latencies, 50)),
+            hnsw_p50_latency_ms=float(np.percentile(hnsw_latencies, 50)),
+        )
+
+
+class ReembedClient:
+    """
+    SQLiteのdocumentsテーブルのsource_contentを、新しい埋め込みの設定(モデル、次元数、チャンクサイズ)で
+    別のコレクションにベクトル化し、完了後にVECTOR_DB_COLLECTION_NAMEの解決先を切り替える。
+    移行中の検索は移行元のコレクションで行い、書き込みは移行先のコレクションにも反映する。
+    """
+    def __init__(self, embedding_client: EmbeddingClient):
+        self.embedding_client = embedding_client
+
+    def __create_target_job__(
+            self, target_collection: str, embedding_model: str, embedding_dimensions: Optional[int], chunk_size: int
+            ) -> ReembedJobData:
+        config = self.embedding_client.config
+        name = self.embedding_client.collection_alias_name
+        source_collection = config.vector_db_collection_name
+        if not target_collection:
+            target_collection = f"{name or 'langchain'}_{time.strftime('%Y%m%d%H%M%S')}"
+        if target_collection == source_collection:
+            raise ValueError(f"Target collection must differ from the current collection: {source_collection}")
+        return ReembedJobData(
+            target_collection=target_collection,
+            name=name,
+            source_collection=source_collection,
+            embedding_model=embedding_model or config.embedding_model,
+            # 0はモデルの既定の次元数、Noneは現在の設定を引き継ぐ
+            embedding_dimensions=config.embedding_dimensions if embedding_dimensions is None else (embedding_dimensions or None),
+            chunk_size=chunk_size if chunk_size > 0 else config.chunk_size,
+        )
+
+    async def __load_page__(self, data_list: list[SourceDocumentData]) -> list[SourceDocumentData]:
+        # category、updated_at、metadataは移行元のコレクションの先頭チャンクから引き継ぐ。本文はSQLiteの値を使用する。
+        # チャンク本文は読み込まないため、チャンクのmetadataのミラーを持つベクトルDBではミラーから読み込む
+        contents = {data.source_id: data.source_content for data in data_list}
+        condition = ConditionContainer().add_eq_condition(self.embedding_client.config.first_document_key, True)
+        _, documents = await self.embedding_client.get_langchain_documents(
+            list(contents.keys()), [], condition, include_documents=False)
+        restored = {data.source_id: data for data in SourceDocumentData.from_langchain_documents(documents, contents.get)}
+        return [restored.get(data.source_id, data) for data in data_list]
+
+    async def run(
+            self, target_collection: str = "", embedding_model: str = "", embedding_dimensions: Optional[int] = None,
+            chunk_size: int = 0, batch_size: int = 0, tokens_per_minute: int = 0, resume: bool = False
+            ) -> ReembedJobData:
+        """
+        移行先のコレクションにベクトル化し、完了後にVECTOR_DB_COLLECTION_NAMEの解決先を移行先に切り替える。
+        進捗はbatch_size件ごとにジョブに記録する。
+        :param target_collection: 移行先のコレクション名。省略した場合は{VECTOR_DB_COLLECTION_NAME}_{日時}
+        :param embedding_model: 埋め込みモデル。省略した場合は現在の設定
+        :param embedding_dimensions: 埋め込みベクトルの次元数。Noneの場合は現在の設定、0の場合はモデルの既定値
+        :param chunk_size: チャンクサイズ。0の場合は現在の設定
+        :param batch_size: 1回に処理するドキュメント数。0の場合はLOAD_BATCH_SIZE
+        :param tokens_per_minute: 移行で埋め込むトークン数の上限(1分あたり)。0の場合はREEMBED_TOKENS_PER_MINUTE
+        :param resume: Trueの場合、同じ移行先の未完了のジョブを続きから再開する
+        :return: ジョブの状態
+        """
+        from tqdm.asyncio import tqdm_asyncio
+        sqlite_client = self.embedding_client.sqlite_client
+        config = self.embedding_client.config
+        job = self.__create_target_job__(target_collection, embedding_model, embedding_dimensions, chunk_size)
+
+        previous_job = await sqlite_client.get_reembed_job(job.target_collection) if resume else None
+        if previous_job is not None and previous_job.status != "completed":
+            # 前回と同じ設定で続きから再開する
+            logger.info(f"Resume reembed into {previous_job.target_collection} after source_id={previous_job.last_source_id!r}.")
+            job = previous_job
+            job.status = "running"
+        elif resume:
+            logger.info(f"No unfinished reembed job found for {job.target_collection}. Start from the beginning.")
+        job.total = job.processed + await sqlite_client.count_source_documents(job.last_source_id)
+        # 移行先のクライアントを作成する前にジョブを登録し、以降の書き込みを移行先にも反映する
+        await sqlite_client.start_reembed_job(job)
+
+        target_config = config.with_collection(job.target_collection, job.embedding_model, job.embedding_dimensions, job.chunk_size)
+        target_client = EmbeddingClient(target_config, resolve_collection=False)
+        batch_size = batch_size if batch_size > 0 else max(1, config.load_batch_size)
+        tokens_per_minute = tokens_per_minute if tokens_per_minute > 0 else config.reembed_tokens_per_minute
+        token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+        progress = tqdm_asyncio(total=job.total, initial=job.processed, desc=f"reembed {job.target_collection}")
+        try:
+            while True:
+                data_list = await sqlite_client.get_source_documents_page(job.last_source_id, batch_size)
+                if not data_list:
+                    break
+                data_list = await self.__load_page__(data_list)
+                documents = SourceDocumentData.to_langchain_documents(data_list, chunk_size=job.chunk_size)
+                if token_bucket is not None:
+                    wait = token_bucket.reserve(estimate_tokens([doc.page_content for doc in documents]))
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                # upsertはチャンクのcontent_hashで差分を取るため、再開時に同じドキュメントを処理しても再ベクトル化しない
+                await target_client.vector_db.upsert_documents(documents)
+
+                job.last_source_id = data_list[-1].source_id
+                job.processed += len(data_list)
+                await sqlite_client.update_reembed_job_progress(job.target_collection, job.last_source_id, job.processed)
+                progress.update(len(data_list))
+        except Exception:
+            await sqlite_client.update_reembed_job_status(job.target_collection, "failed")
+            raise
+        finally:
+            progress.close()
+
+        # 別名の切り替えとジョブの完了を1トランザクションで記録する。以降に作成したEmbeddingClientは移行先を使用する
+        alias = CollectionAliasData(
+            name=job.name, collection_name=job.target_collection,
+            embedding_model=job.embedding_model, embedding_dimensions=job.embedding_dimensions, chunk_size=job.chunk_size
+        )
+        await sqlite_client.complete_reembed_job(job, alias)
+        logger.info(f"Switched collection {job.name!r} from {job.source_collection} to {job.target_collection}.")
+        return await sqlite_client.get_reembed_job(job.target_collection) or job
+
+
+class SnapshotClient:
+    """
+    ベクトルDBのチャンク(vector id、本文、metadata、埋め込みベクトル)とSQLiteのテーブルをディレクトリに書き出し、
+    埋め込みAPIを呼び出さずに復元する。ディレクトリの構成は以下のとおり。
+      manifest.json            SnapshotData。書き出しの最後に作成する
+      chunks/{page}.npy        埋め込みベクトル(float32、チャンク数×次元数)
+      chunks/{page}.jsonl      各チャンクのvector id、本文、metadata(.npyと同じ順序)
+      tables/{table}.jsonl     SQLiteのテーブルの行
+    """
+    manifest_file_name: str = "manifest.json"
+
+    def __init__(self, embedding_client: EmbeddingClient):
+        self.embedding_client = embedding_client
+
+    @classmethod
+    def __page_path__(cls, path: str, page: int, ext: str) -> str:
+        return os.path.join(path, "chunks", f"{page:05d}.{ext}")
+
+    @classmethod
+    def __table_path__(cls, path: str, table: str) -> str:
+        return os.path.join(path, "tables", f"{table}.jsonl")
+
+    @classmethod
+    def read_manifest(cls, path: str) -> SnapshotData:
+        manifest_path = os.path.join(path, cls.manifest_file_name)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"Snapshot manifest not found: {manifest_path}")
+        with open(manifest_path, encoding="utf-8") as f:
+            snapshot = SnapshotData.model_validate_json(f.read())
+        if snapshot.format != SnapshotData().format or snapshot.version > SnapshotData().version:
+            raise ValueError(f"Unsupported snapshot format: {snapshot.format} version {snapshot.version}")
+        return snapshot
+
+    async def export_snapshot(self, path: str, page_size: int = 1000) -> SnapshotData:
+        """
+        コレクションの全チャンクとSQLiteのテーブルをpage_size件ずつpathに書き出す。
+        :param path: 書き出し先のディレクトリ。manifest.jsonが存在する場合はエラー
+        :param page_size: 1ファイルに書き出すチャンク数、テーブルの行数
+        :return: 書き出したsnapshotの内容
+        """
+        if os.path.exists(os.path.join(path, self.manifest_file_name)):
+            raise ValueError(f"Snapshot already exists: {path}")
+        os.makedirs(os.path.join(path, "chunks"), exist_ok=True)
+        os.makedirs(os.path.join(path, "tables"), exist_ok=True)
+
+        config = self.embedding_client.config
+        vector_db = self.embedding_client.vector_db
+        collection_metadata = await vector_db.get_collection_metadata()
+        snapshot = SnapshotData(
+            vector_db_type=config.vector_db_type,
+            collection_name=config.vector_db_collection_name,
+            embedding_model=collection_metadata.get(vector_db.embedding_model_key) or config.embedding_model,
+            embedding_dimensions=collection_metadata.get(vector_db.embedding_dimensions_key),
+        )
+        async for ids, embeddings, documents in vector_db.iter_embeddings(page_size):
+            np.save(self.__page_path__(path, snapshot.pages, "npy"), embeddings.astype(np.float32, copy=False))
+            with open(self.__page_path__(path, snapshot.pages, "jsonl"), "w", encoding="utf-8") as f:
+                for doc_id, doc in zip(ids, documents):
+                    f.write(json_codec.dumps({"id": doc_id, "document": doc.page_content, "metadata": doc.metadata}) + "\n")
+            if snapshot.embedding_dimensions is None and embeddings.size > 0:
+                snapshot.embedding_dimensions = int(embeddings.shape[1])
+            snapshot.pages += 1
+            snapshot.count += len(ids)
+
+        sqlite_client = self.embedding_client.sqlite_client
+        for table in SQLiteClient.snapshot_tables:
+            snapshot.tables[table] = 0
+            with open(self.__table_path__(path, table), "w", encoding="utf-8") as f:
+                async for rows in sqlite_client.iter_table_rows(table, page_size):
+                    for row in rows:
+                        f.write(json_codec.dumps(row) + "\n")
+                    snapshot.tables[table] += len(rows)
+
+        # manifest.jsonは最後に書き出し、書き出しが完了したsnapshotであることを示す
+        with open(os.path.join(path, self.manifest_file_name), "w", encoding="utf-8") as f:
+            f.write(snapshot.model_dump_json(indent=2))
+        logger.info(f"Exported snapshot to {path}: chunks={snapshot.count}, tables={snapshot.tables}")
+        return snapshot
+
+    async def import_snapshot(self, path: str, force: bool = False, page_size: int = 1000) -> SnapshotData:
+        """
+        pathのsnapshotを現在のコレクションとSQLiteに読み込む。埋め込みベクトルはそのまま格納し、埋め込みAPIは呼び出さない。
+        同じvector id、主キーのデータは上書きする。
+        :param path: snapshotのディレクトリ
+        :param force: Trueの場合、snapshotと現在の埋め込みモデル・次元数が異なっていても読み込む
+        :param page_size: 1回に書き込むテーブルの行数
+        :return: 読み込んだsnapshotの内容
+        """
+        from tqdm.asyncio import tqdm_asyncio
+        snapshot = self.read_manifest(path)
+        config = self.embedding_client.config
+        dimensions_mismatch = (
+            config.embedding_dimensions is not None and snapshot.embedding_dimensions is not None
+            and config.embedding_dimensions != snapshot.embedding_dimensions
+        )
+        if not force and (snapshot.embedding_model != config.embedding_model or dimensions_mismatch):
+            raise ValueError(
+                f"Snapshot was embedded with {snapshot.embedding_model} ({snapshot.embedding_dimensions} dimensions), "
+                f"but the current model is {config.embedding_model} ({config.embedding_dimensions or 'default'} dimensions). "
+                "Use force to import anyway."
+            )
+
+        vector_db = self.embedding_client.vector_db
+        for page in tqdm_asyncio(range(snapshot.pages), desc=f"import {os.path.basename(os.path.normpath(path))}"):
+            embeddings = np.load(self.__page_path__(path, page, "npy"))
+            ids: list[str] = []
+            documents: list[Document] = []
+            with open(self.__page_path__(path, page, "jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    record = json_codec.loads(line)
+                    ids.append(record["id"])
+                    documents.append(Document(page_content=record["document"], metadata=record["metadata"] or {}))
+            await vector_db.add_embeddings(ids, embeddings, documents)
+
+        sqlite_client = self.embedding_client.sqlite_client
+        for table in snapshot.tables:
+            rows: list[dict] = []
+            with open(self.__table_path__(path, table), encoding="utf-8") as f:
+                for line in f:
+                    rows.append(json_codec.loads(line))
+                    if len(rows) >= page_size:
+                        await sqlite_client.import_table_rows(table, rows)
+                        rows = []
+            await sqlite_client.import_table_rows(table, rows)
+        logger.info(f"Imported snapshot from {path}: chunks={snapshot.count}, tables={snapshot.tables}")
+        return snapshot
@@ -5,17 +5,24 @@ from fastmcp import FastMCP
 from vector_search_util.core.app import (
     vector_search,
     metadata_search,
+    metadata_search_page,
     get_documents,
+    get_documents_page,
     upsert_documents,
     delete_documents,
     update_document_metadata,
     get_categories,
+    get_categories_page,
     upsert_categories,
     delete_categories,
     get_relations,
+    get_relations_page,
     upsert_relations,
     delete_relations,
+    get_related_nodes,
+    get_shortest_path,
     get_tags,
+    get_tags_page,
     upsert_tags,
     delete_tags,
 )
@@ -57,18 +64,20 @@ async def main():
     else:
         # デフォルトのツールを登録
         mcp.tool()(vector_search)
-        mcp.tool()(metadata_search)
-        mcp.tool()(get_documents)
+        mcp.tool()(metadata_search_page)
+        mcp.tool()(get_documents_page)
         mcp.tool()(upsert_documents)
         mcp.tool()(delete_documents)
         mcp.tool()(update_document_metadata)
-        mcp.tool()(get_categories)
+        mcp.tool()(get_categories_page)
         mcp.tool()(upsert_categories)
         mcp.tool()(delete_categories)
-        mcp.tool()(get_relations)
+        mcp.tool()(get_relations_page)
         mcp.tool()(upsert_relations)
         mcp.tool()(delete_relations)
-        mcp.tool()(get_tags)
+        mcp.tool()(get_related_nodes)
+        mcp.tool()(get_shortest_path)
+        mcp.tool()(get_tags_page)
         mcp.tool()(upsert_tags)
         mcp.tool()(delete_tags)
 
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-import os, json
+import os, json, hashlib, copy, base64, binascii
 from dotenv import load_dotenv
 from datetime import datetime
 from abc import ABC, abstractmethod
 from pydantic import BaseModel, Field
 
-from typing import Optional, ClassVar, Any, Callable, Sequence, Union, Literal, Annotated, TypeAlias
+from typing import Optional, ClassVar, Any, Callable, Sequence, Union, Literal, Annotated, TypeAlias, TypeVar, Generic
 from datetime import datetime, timezone
 from langchain_core.documents import Document
 
@@ -16,8 +16,16 @@ from typing import Optional
 
 class EmbeddingConfig:
 
-    def __init__(self):
-        load_dotenv()
+    # .envを読み込み済みかどうか。既存の環境変数は上書きしないため、読み込みはプロセスで1回とする
+    dotenv_loaded: ClassVar[bool] = False
+
+    def __init__(self, collection_name: str = ""):
+        """
+        :param collection_name: 使用するコレクション名。省略した場合はVECTOR_DB_COLLECTION_NAME
+        """
+        if not EmbeddingConfig.dotenv_loaded:
+            load_dotenv()
+            EmbeddingConfig.dotenv_loaded = True
 
         # metadata用のキー設定
         self.source_id_key: str = os.getenv("SOURCE_ID_KEY","source_id")
@@ -25,23 +33,88 @@ class EmbeddingConfig:
         self.category_key: str = os.getenv("CATEGORY_KEY","category")
         self.updated_at_key: str = os.getenv("UPDATED_AT_KEY","updated_at")
         self.first_document_key: str = os.getenv("FIRST_DOCUMENT_KEY","first_document")
+        # チャンク単位の差分検出用のキー設定
+        self.chunk_index_key: str = os.getenv("CHUNK_INDEX_KEY","chunk_index")
+        self.content_hash_key: str = os.getenv("CONTENT_HASH_KEY","content_hash")
 
         # ベクトル化する際にSOURCE_CONTENTを分割する。その際のチャンクサイズ
         self.chunk_size: int = int(os.getenv("CHUNK_SIZE","4000"))
 
         # 並列度の設定
         self.concurrency: int = int(os.getenv("EMBEDDING_CONCURRENCY","16"))
+        # load_dataの進捗をジャーナルに記録する単位(行数)
+        self.load_batch_size: int = int(os.getenv("LOAD_BATCH_SIZE","100"))
+        # load_dataで1回の埋め込みAPI呼び出しにまとめる行数
+        self.embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE","16"))
+        # カテゴリ・リレーション・タグの一括書き込みで1トランザクションにまとめる行数と、
+        # 一時テーブルを経由して1トランザクションで反映する行数の下限 (0の場合は一時テーブルを使わない)
+        self.bulk_write_batch_size: int = int(os.getenv("BULK_WRITE_BATCH_SIZE","5000"))
+        self.bulk_staging_threshold: int = int(os.getenv("BULK_STAGING_THRESHOLD","100000"))
+
+        # 埋め込みAPIのレート制限の設定 (0の場合は無制限)
+        self.requests_per_minute: int = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE","0"))
+        self.tokens_per_minute: int = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE","0"))
+        # reembedで移行中のコレクションに埋め込むトークン数の上限 (0の場合は上記の制限のみ)
+        self.reembed_tokens_per_minute: int = int(os.getenv("REEMBED_TOKENS_PER_MINUTE","0"))
+        # 埋め込みAPIのリトライ設定
+        self.max_retries: int = int(os.getenv("EMBEDDING_MAX_RETRIES","5"))
+        self.retry_base_delay: float = float(os.getenv("EMBEDDING_RETRY_BASE_DELAY","1.0"))
+        self.retry_max_delay: float = float(os.getenv("EMBEDDING_RETRY_MAX_DELAY","60.0"))
+        # 埋め込みAPIのレイテンシ目標(秒)。超えた場合は同時実行数を減らす (0の場合は無効)
+        self.latency_target: float = float(os.getenv("EMBEDDING_LATENCY_TARGET","0"))
         
         self.app_data_path: str = os.getenv("APP_DATA_PATH","work/app_data")
 
         
         self.vector_db_type: str = os.getenv("VECTOR_DB_TYPE","chroma")
         self.vector_db_url: str = os.getenv("VECTOR_DB_URL", "work/chroma_db")
-        self.vector_db_collection_name: str = os.getenv("VECTOR_DB_COLLECTION_NAME","")
+        self.vector_db_collection_name: str = collection_name or os.getenv("VECTOR_DB_COLLECTION_NAME","")
+        # プロセス内で開いたままにするコレクションの最大数と、使用されていないコレクションを閉じるまでの秒数 (0の場合は閉じない)
+        # VECTOR_DB_CACHE_SIZE=0の場合はリクエストごとにコレクションを開く
+        self.vector_db_cache_size: int = int(os.getenv("VECTOR_DB_CACHE_SIZE","16"))
+        self.vector_db_idle_seconds: float = float(os.getenv("VECTOR_DB_IDLE_SECONDS","600"))
+
+        # HNSWインデックスのパラメータ。HNSW_COLLECTION_PARAMS(JSON)でコレクションごとに上書きできる
+        # 例: {"large_collection": {"M": 16, "construction_ef": 200, "search_ef": 64}}
+        self.hnsw_m: int = int(os.getenv("HNSW_M","24"))
+        self.hnsw_construction_ef: int = int(os.getenv("HNSW_CONSTRUCTION_EF","400"))
+        self.hnsw_search_ef: int = int(os.getenv("HNSW_SEARCH_EF","200"))
+        self.hnsw_collection_params: dict[str, dict[str, int]] = json.loads(os.getenv("HNSW_COLLECTION_PARAMS","") or "{}")
+        # exact=Trueの厳密検索を許可する最大チャンク数。超える場合はHNSWで検索する
+        self.exact_search_max_chunks: int = int(os.getenv("EXACT_SEARCH_MAX_CHUNKS","50000"))
+        # フィルタ付きのvector_searchの検索計画。trueの場合、フィルタに一致するチャンク数から検索方法を選ぶ
+        # 一致数がFILTER_PREFILTER_MAX_CHUNKS以下の場合は一致するチャンクのみを厳密検索し、
+        # 一致する割合がFILTER_ANN_MIN_SELECTIVITY未満の場合は k / 割合 件を取得して絞り込む
+        self.filter_planner: bool = os.getenv("FILTER_PLANNER","true").lower() == "true"
+        self.filter_prefilter_max_chunks: int = int(os.getenv("FILTER_PREFILTER_MAX_CHUNKS","2000"))
+        self.filter_ann_min_selectivity: float = float(os.getenv("FILTER_ANN_MIN_SELECTIVITY","0.3"))
+        # include_content="snippet"の場合に返すチャンク本文の最大文字数
+        self.snippet_length: int = int(os.getenv("SNIPPET_LENGTH","200"))
+        # trueの場合、relationsの隣接リストをプロセス内にキャッシュしてグラフ探索を行う。relationsの書き込みで破棄する
+        self.relation_graph_cache: bool = os.getenv("RELATION_GRAPH_CACHE","false").lower() == "true"
+        # VECTOR_DB_TYPE=numpy の設定。ベクトルの格納形式(float32/float16)、コンパクションを行う墓標の割合、検索の並列数(0はCPUコア数)
+        self.numpy_vector_dtype: str = os.getenv("NUMPY_VECTOR_DTYPE","float32")
+        self.numpy_compaction_ratio: float = float(os.getenv("NUMPY_COMPACTION_RATIO","0.2"))
+        self.numpy_search_workers: int = int(os.getenv("NUMPY_SEARCH_WORKERS","0"))
+        # VECTOR_DB_TYPE=faiss の設定。インデックスの種類(Flat/HNSW/IVFPQ)、IVFPQのクラスタ数(0は4*sqrt(n))、
+        # 直積量子化の分割数とビット数、探索するクラスタ数、学習に使う件数、インデックスを保存する間隔(秒)
+        # HNSWのM, construction_ef, search_efはHNSW_*の設定を使用する
+        self.faiss_index_type: str = os.getenv("FAISS_INDEX_TYPE","HNSW")
+        self.faiss_nlist: int = int(os.getenv("FAISS_NLIST","0"))
+        self.faiss_pq_m: int = int(os.getenv("FAISS_PQ_M","64"))
+        self.faiss_pq_nbits: int = int(os.getenv("FAISS_PQ_NBITS","8"))
+        self.faiss_nprobe: int = int(os.getenv("FAISS_NPROBE","16"))
+        self.faiss_train_size: int = int(os.getenv("FAISS_TRAIN_SIZE","100000"))
+        self.faiss_persist_interval: float = float(os.getenv("FAISS_PERSIST_INTERVAL","0"))
+        # HNSWの墓標(削除済みid)の割合がこの値を超えたらインデックスを作り直す
+        self.faiss_rebuild_ratio: float = float(os.getenv("FAISS_REBUILD_RATIO","0.2"))
         self.llm_provider: str = os.getenv("LLM_PROVIDER","openai")
         self.api_key: str = ""
         self.completion_model: str = ""
         self.embedding_model: str = ""
+        # 埋め込みベクトルの次元数。text-embedding-3-*はMatryoshka表現のため先頭の次元に縮めて返せる。Noneの場合はモデルの既定値
+        embedding_dimensions = os.getenv("EMBEDDING_DIMENSIONS","")
+        self.embedding_dimensions: Optional[int] = int(embedding_dimensions) if embedding_dimensions else None
         self.api_version: Optional[str] = None
         self.endpoint: Optional[str] = None
 
@@ -56,6 +129,27 @@ class EmbeddingConfig:
             self.api_version: Optional[str] = os.getenv("AZURE_OPENAI_API_VERSION","")
             self.endpoint: Optional[str] = os.getenv("AZURE_OPENAI_ENDPOINT","")
 
+    def get_hnsw_params(self, collection_name: str) -> dict[str, int]:
+        """コレクションに適用するHNSWパラメータ (M, construction_ef, search_ef) を返す。"""
+        params = {
+            "M": self.hnsw_m,
+            "construction_ef": self.hnsw_construction_ef,
+            "search_ef": self.hnsw_search_ef,
+        }
+        params.update(self.hnsw_collection_params.get(collection_name, {}))
+        return params
+
+    def with_collection(
+            self, collection_name: str, embedding_model: str, embedding_dimensions: Optional[int], chunk_size: int
+            ) -> EmbeddingConfig:
+        """コレクション名と埋め込みの設定(モデル、次元数、チャンクサイズ)を置き換えたコピーを返す。"""
+        config = copy.copy(self)
+        config.vector_db_collection_name = collection_name
+        config.embedding_model = embedding_model
+        config.embedding_dimensions = embedding_dimensions
+        config.chunk_size = chunk_size
+        return config
+
 
 # category_data
 class CategoryData(BaseModel):
@@ -75,12 +169,117 @@ class RelationData(BaseModel):
         # すべてのフィールドが非空文字列であることを確認
         return all([self.from_node, self.to_node, self.edge_type])
 
+# リレーションをたどる向き。out: from_node→to_node、in: to_node→from_node、both: 両方向
+GraphDirection: TypeAlias = Literal["out", "in", "both"]
+
+# リレーションをたどって到達したノードと、起点からの最短のホップ数
+class GraphNodeData(BaseModel):
+    node: str
+    depth: int
+
 # tag_data
 class TagData(BaseModel):
     name: str
     description: str
     metadata: dict[str, Any] = Field(default_factory=dict)
 
+# load_dataのジャーナル
+class LoadJobData(BaseModel):
+    job_id: str
+    file_path: str
+    file_fingerprint: str
+    total_rows: int
+    batch_size: int
+    status: str = "running"
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class IndexTuningResult(BaseModel):
+    m: int
+    construction_ef: int
+    search_ef: int
+    recall: float
+    p50_latency_ms: float
+    p99_latency_ms: float
+    build_seconds: float
+
+class RecallAuditResult(BaseModel):
+    k: int
+    num_queries: int
+    search_ef: Optional[int] = None
+    recall: float
+    exact_p50_latency_ms: float
+    hnsw_p50_latency_ms: float
+
+class LoadFailureData(BaseModel):
+    row_num: int
+    source_id: str = ""
+    error: str = ""
+
+class CollectionAliasData(BaseModel):
+    # VECTOR_DB_COLLECTION_NAMEの値と、実際に使用するコレクションおよび埋め込みの設定
+    name: str
+    collection_name: str
+    embedding_model: str
+    embedding_dimensions: Optional[int] = None
+    chunk_size: int
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class ReembedJobData(BaseModel):
+    # 移行先のコレクション名をジョブの識別子とする
+    target_collection: str
+    name: str
+    source_collection: str
+    embedding_model: str
+    embedding_dimensions: Optional[int] = None
+    chunk_size: int
+    total: int = 0
+    processed: int = 0
+    # 処理済みの最後のsource_id。source_idの昇順で処理する
+    last_source_id: str = ""
+    status: str = "running"
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class SnapshotData(BaseModel):
+    # snapshotディレクトリのmanifest.jsonの内容
+    format: str = "vector-search-util-snapshot"
+    version: int = 1
+    vector_db_type: str = ""
+    collection_name: str = ""
+    embedding_model: str = ""
+    embedding_dimensions: Optional[int] = None
+    dtype: str = "float32"
+    count: int = 0
+    pages: int = 0
+    # テーブル名ごとの行数
+    tables: dict[str, int] = Field(default_factory=dict)
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+PageItem = TypeVar("PageItem")
+
+class PageData(BaseModel, Generic[PageItem]):
+    # 一覧の1ページ分。next_cursorを次の呼び出しのcursorに指定すると続きを返す。空文字の場合は最後のページ
+    items: list[PageItem] = Field(default_factory=list)
+    next_cursor: str = ""
+
+    @classmethod
+    def encode_cursor(cls, key: Any) -> str:
+        """ページの最後の行のキー(vector id、主キーなど)を不透明なcursor文字列に変換する。"""
+        return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+    @classmethod
+    def decode_cursor(cls, cursor: str) -> Any:
+        """cursor文字列をキーに戻す。空文字の場合はNone"""
+        if not cursor:
+            return None
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        except (ValueError, binascii.Error) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+# 検索・取得結果のsource_contentの返し方。
+# full: 管理DBの本文全体、snippet: 一致したチャンク本文の先頭SNIPPET_LENGTH文字、false: 本文を返さない(空文字)
+ContentMode: TypeAlias = Literal["full", "snippet", "false"]
 
 class SourceDocumentData(BaseModel):
 
@@ -99,22 +298,26 @@ class SourceDocumentData(BaseModel):
         return cls.embedding_config
 
     @classmethod
-    def to_langchain_documents(cls, data_list: list["SourceDocumentData"], append_vectors: bool = False) -> list[Document]:
-        """Convert to Langchain Document."""
+    def to_langchain_documents(
+            cls, data_list: list["SourceDocumentData"], append_vectors: bool = False, chunk_size: int = 0
+            ) -> list[Document]:
+        """Convert to Langchain Document. chunk_sizeが0の場合はCHUNK_SIZEの設定値で分割する。"""
         documents: list[Document] = []
         for data in data_list:
-            docs = cls.__to_langchain_documents_from_single_source_document__(data, append_vectors)
+            docs = cls.__to_langchain_documents_from_single_source_document__(data, append_vectors, chunk_size)
             documents.extend(docs)
         return documents
 
     @classmethod
-    def __to_langchain_documents_from_single_source_document__(cls, data: "SourceDocumentData", append_vectors: bool = False) -> list[Document]:
+    def __to_langchain_documents_from_single_source_document__(
+            cls, data: "SourceDocumentData", append_vectors: bool = False, chunk_size: int = 0
+            ) -> list[Document]:
         """Convert to Langchain Document."""
         embedding_config = cls._get_embedding_config_()
         documents: list[Document] = []
 
         # chunkingに基づいて、source_contentを分割する
-        chunk_size = embedding_config.chunk_size
+        chunk_size = chunk_size or embedding_config.chunk_size
         updated_at_str = data.updated_at.isoformat()
 
         page_countents = [data.source_content[i:i+chunk_size] for i in range(0, len(data.source_content), chunk_size)]
@@ -125,7 +328,9 @@ class SourceDocumentData(BaseModel):
                     embedding_config.source_id_key: data.source_id,
                     embedding_config.category_key: data.category,
                     embedding_config.updated_at_key: updated_at_str,
-                    **data.metadata
+                    **data.metadata,
+                    embedding_config.chunk_index_key: i,
+                    embedding_config.content_hash_key: cls.compute_content_hash(page_content),
                 }
             # metadataにfirst_document_flagを追加
             if i == 0 and not append_vectors:
@@ -138,15 +343,38 @@ class SourceDocumentData(BaseModel):
         return documents
 
     @classmethod
-    def from_langchain_documents(cls, documents: list[Document], get_source_content_function: Callable) -> list["SourceDocumentData"]:
+    def compute_content_hash(cls, content: str) -> str:
+        """チャンク本文のハッシュ値を返す。upsert時の差分検出に利用する。"""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def from_langchain_documents(
+            cls, documents: list[Document], get_source_content_function: Callable,
+            fields: Optional[list[str]] = None, include_content: ContentMode = "full"
+            ) -> list["SourceDocumentData"]:
+        """
+        Convert from Langchain Documents.
+        fieldsを指定した場合、metadataはfieldsのキー(とscore)のみとする。
+        include_contentがfull以外の場合、管理DBから本文を読み込まない。
+        """
         embedding_config = cls._get_embedding_config_()
+        if include_content == "full":
+            content_function = get_source_content_function
+        elif include_content == "snippet":
+            # 一致したチャンク本文(先頭チャンク)を切り詰めて返す
+            content_function = None
+        else:
+            content_function = lambda source_id: ""
 
         first_documents = [doc for doc in documents if doc.metadata.get(embedding_config.first_document_key, False) == True]
         data_dict: dict[str, SourceDocumentData] = {}
         for doc in first_documents:
             source_id = doc.metadata.get(embedding_config.source_id_key, "")
             if source_id not in data_dict:
-                data = SourceDocumentData.__from_langchain_document__(doc, get_source_content_function)
+                snippet = doc.page_content[:embedding_config.snippet_length]
+                data = SourceDocumentData.__from_langchain_document__(doc, content_function or (lambda source_id: snippet))
+                if fields:
+                    data.metadata = {k: v for k, v in data.metadata.items() if k in fields or k == "score"}
                 data_dict[source_id] = data
         return list(data_dict.values())
     
@@ -164,13 +392,15 @@ class SourceDocumentData(BaseModel):
             updated_at = datetime.now(timezone.utc)
 
 
-        # documentのmetadataをコピーして、source_id, category, updated_at, first_document_keyを削除する
+        # documentのmetadataをコピーして、source_id, category, updated_at, first_document_key, chunk_index, content_hashを削除する
         metadata_copy = {
             k: v for k, v in document.metadata.copy().items() if k not in [
                 embedding_config.source_id_key, 
                 embedding_config.category_key, 
                 embedding_config.updated_at_key, 
-                embedding_config.first_document_key
+                embedding_config.first_document_key,
+                embedding_config.chunk_index_key,
+                embedding_config.content_hash_key,
                 ]
             }
 
@@ -418,11 +648,11 @@ class ConditionContainer(BaseModel):
         return translator.translate(self.build())
 
     # --- SQLite3 JSON SQL 生成 ---
-    def to_sqlite_sql(self):
+    def to_sqlite_sql(self, json_field: str = "cmetadata", columns: Optional[dict[str, str]] = None):
         if len(self.conditions) == 0:
             return ""
 
-        translator = SqliteJsonTranslator()
+        translator = SqliteJsonTranslator(json_field, columns)
         return translator.translate(self.build())
 
 
@@ -506,7 +736,9 @@ class PostgresJsonbTranslator(ConditionTranslator):
                 inner = self._translate_field(field, expr["$not"])
                 return f"NOT ({inner})"
 
-        # eq
+        # eq。->>はJSONの真偽値をtrue/falseの文字列で返す
+        if isinstance(expr, bool):
+            return f"({json_field}->>'{field}') = '{str(expr).lower()}'"
         return f"({json_field}->>'{field}') = '{expr}'"
 
 
@@ -516,10 +748,13 @@ class SqliteJsonTranslator(ConditionTranslator):
     - json_extract(json_field, '$.key') を使ってJSONから値を取り出す
     - SQLite標準では正規表現が無い前提で $regex は LIKE にマップ
 
+    - columnsに指定したキーはJSONではなく列(metadataのキー -> 列名)から値を取り出す
+
     NOTE: 既存のPostgresJsonbTranslatorと同様、現状はSQL文字列を直接生成します。
     """
-    def __init__(self):
-        self.json_field = "cmetadata"
+    def __init__(self, json_field: str = "cmetadata", columns: Optional[dict[str, str]] = None):
+        self.json_field = json_field
+        self.columns = columns or {}
 
     def translate(self, condition_dict) -> str:
         return self._translate_dict(condition_dict)
@@ -574,6 +809,8 @@ class SqliteJsonTranslator(ConditionTranslator):
         return f"{extracted} = {self._sql_literal(expr)}"
 
     def _json_extract(self, field: str) -> str:
+        if field in self.columns:
+            return self.columns[field]
         # fieldにクォートが必要なケース（記号など）がある場合はここを拡張
         return f"json_extract({self.json_field}, '$.{field}')"
 
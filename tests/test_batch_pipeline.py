@@ -0,0 +1,27 @@
+import asyncio
+
+from vector_search_util.core.client import BatchPipeline
+
+
+def test_batch_stage_groups_rows():
+    batches: list[list[int]] = []
+    written: list[int] = []
+
+    async def double(item: int) -> int:
+        return item * 2
+
+    async def collect(items: list[int]) -> list:
+        batches.append(items)
+        # 結果を例外とした行のみ失敗とする
+        return [ValueError("bad") if item == 6 else item for item in items]
+
+    async def write(item: int) -> None:
+        written.append(item)
+
+    pipeline = BatchPipeline([("double", double, 2), ("collect", collect, 4, 4), ("write", write, 1)])
+    failures = asyncio.run(pipeline.run(range(10)))
+
+    # 複数のワーカーがあっても、前段が終了するまでの各バッチはバッチサイズ分の行で満たす
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [(row_num, str(error)) for row_num, error in failures] == [(3, "bad")]
+    assert sorted(written) == [item * 2 for item in range(10) if item != 3]
@@ -0,0 +1,55 @@
+import asyncio
+import sqlite3
+
+import openpyxl
+import pytest
+
+from vector_search_util.model import CategoryData
+from vector_search_util._internal.db import SQLiteClient
+from vector_search_util.core.client import _read_excel_rows
+
+
+def test_read_excel_rows_numbers_sheet_rows(tmp_path):
+    path = str(tmp_path / "categories.xlsx")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["name", "description"])
+    sheet.append(["a", "x"])
+    sheet.append([None, None])
+    sheet.append(["b", "y"])
+    workbook.save(path)
+
+    _, rows = _read_excel_rows(path)
+    # 空の行を読み飛ばしても、行番号はExcelの行番号とする
+    assert [(sheet_row, row["name"]) for sheet_row, row in rows] == [(2, "a"), (4, "b")]
+
+
+def test_bulk_upsert_reports_failed_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteClient, "initialized", False)
+    client = SQLiteClient(str(tmp_path / "app.db"))
+    with sqlite3.connect(client.db_path) as conn:
+        conn.execute('''
+            CREATE TRIGGER reject_category BEFORE INSERT ON categories WHEN NEW.name = 'bad'
+            BEGIN SELECT RAISE(ABORT, 'rejected'); END
+        ''')
+
+    categories = [(row_num, CategoryData(name=name, description="")) for row_num, name in [(2, "a"), (3, "bad"), (5, "b"), (6, "c")]]
+    count, failures = asyncio.run(client.bulk_upsert_categories(categories, batch_size=2, numbered=True))
+
+    # 失敗したバッチは1行ずつ書き込み直し、失敗した行のみを行番号とともに返す
+    assert count == 4
+    assert [(row_num, str(error)) for row_num, error in failures] == [(3, "rejected")]
+    assert sorted(category.name for category in asyncio.run(client.get_categories())) == ["a", "b", "c"]
+
+
+def test_import_table_rows_rejects_unknown_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteClient, "initialized", False)
+    client = SQLiteClient(str(tmp_path / "app.db"))
+    rows = [{"name": "a", "description": "x"}, {"name": "b", "description": "y", "name) VALUES ('c', '');--": ""}]
+    with pytest.raises(ValueError):
+        asyncio.run(client.import_table_rows("categories", rows))
+    assert asyncio.run(client.get_categories()) == []
+
+    # 値は行ごとのキーの順序によらず、テーブルのカラム順に書き込む
+    asyncio.run(client.import_table_rows("categories", [{"description": "x", "name": "a"}, {"name": "b", "description": "y"}]))
+    assert [(category.name, category.description) for category in asyncio.run(client.get_categories())] == [("a", "x"), ("b", "y")]
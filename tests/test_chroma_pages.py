@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+pytest.importorskip("chromadb")
+
+from vector_search_util.model import ConditionContainer, EmbeddingConfig
+from vector_search_util._internal.langchain.langchain_client import LangchainClient
+from vector_search_util._internal.langchain.langchain_vector_db import LangChainVectorDBChroma
+
+
+def test_document_and_mirror_pages_share_cursor(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DATA_PATH", str(tmp_path / "app"))
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    client = LangchainClient(EmbeddingConfig())
+    client.embedding = DeterministicFakeEmbedding(size=8)
+    vector_db = LangChainVectorDBChroma(client, str(tmp_path / "chroma"), "test")
+    asyncio.run(vector_db.add_documents([Document(id=f"id{i}", page_content=f"text {i}") for i in range(5)]))
+
+    # 本文を読み込まないページ(ミラー)のcursorで、本文を読み込むページを続けて取得できる
+    ids, _, cursor = asyncio.run(vector_db.get_documents_page(ConditionContainer(), limit=2, include_documents=False))
+    assert ids == ["id0", "id1"]
+    ids, documents, cursor = asyncio.run(vector_db.get_documents_page(ConditionContainer(), cursor, limit=2))
+    assert ids == ["id2", "id3"]
+    assert [doc.page_content for doc in documents] == ["text 2", "text 3"]
+    ids, _, cursor = asyncio.run(vector_db.get_documents_page(ConditionContainer(), cursor, limit=2, include_documents=False))
+    assert ids == ["id4"] and cursor == ""
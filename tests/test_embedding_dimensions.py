@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_search_util.model import EmbeddingConfig
+from vector_search_util._internal.langchain.langchain_client import LangchainClient
+from vector_search_util._internal.langchain.langchain_vector_db import LangChainVectorDBNumpy
+
+
+def create_vector_db(tmp_path, monkeypatch, size: int, model: str = "test-model") -> LangChainVectorDBNumpy:
+    monkeypatch.setenv("APP_DATA_PATH", str(tmp_path / "app"))
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    config = EmbeddingConfig()
+    config.embedding_model = model
+    client = LangchainClient(config)
+    client.embedding = DeterministicFakeEmbedding(size=size)
+    return LangChainVectorDBNumpy(client, str(tmp_path / "numpy"), "test")
+
+
+def test_add_documents_rejects_other_dimensions(tmp_path, monkeypatch):
+    # EMBEDDING_DIMENSIONSが未設定でも、埋め込んだベクトルの次元数で確認する
+    asyncio.run(create_vector_db(tmp_path, monkeypatch, 16).add_documents([Document(page_content="a")]))
+
+    vector_db = create_vector_db(tmp_path, monkeypatch, 8)
+    with pytest.raises(ValueError, match="dimensions mismatch"):
+        asyncio.run(vector_db.add_documents([Document(page_content="b")]))
+    assert vector_db._get_count_() == 1
+
+
+def test_add_documents_rejects_other_model(tmp_path, monkeypatch):
+    asyncio.run(create_vector_db(tmp_path, monkeypatch, 16).add_documents([Document(page_content="a")]))
+
+    vector_db = create_vector_db(tmp_path, monkeypatch, 16, model="other-model")
+    with pytest.raises(ValueError, match="model mismatch"):
+        asyncio.run(vector_db.add_documents([Document(page_content="b")]))
+    assert vector_db._get_count_() == 1
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_search_util.model import EmbeddingConfig
+from vector_search_util._internal.langchain.embedding_scheduler import EmbeddingScheduler
+from vector_search_util._internal.langchain.langchain_client import LangchainClient
+from vector_search_util._internal.langchain.langchain_vector_db import LangChainVectorDBNumpy
+
+
+def test_get_instance_per_config():
+    config = EmbeddingConfig()
+    assert EmbeddingScheduler.get_instance(config) is EmbeddingScheduler.get_instance(EmbeddingConfig())
+
+    # 設定が異なる呼び出し元は、最初の呼び出しの設定を共有しない
+    limited = EmbeddingConfig()
+    limited.tokens_per_minute = 1000
+    limited.concurrency = 2
+    scheduler = EmbeddingScheduler.get_instance(limited)
+    assert scheduler is not EmbeddingScheduler.get_instance(config)
+    assert scheduler.token_bucket is not None and scheduler.token_bucket.capacity == 1000
+    assert scheduler.max_concurrency == 2
+
+
+class SlowEmbedding(DeterministicFakeEmbedding):
+    # 同期の埋め込みAPI呼び出しを模して待機する
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(0.3)
+        return super().embed_query(text)
+
+
+def test_vector_search_does_not_block_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DATA_PATH", str(tmp_path / "app"))
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+    client = LangchainClient(EmbeddingConfig())
+    client.embedding = SlowEmbedding(size=8)
+    vector_db = LangChainVectorDBNumpy(client, str(tmp_path / "numpy"), "test")
+
+    async def main() -> int:
+        await vector_db.add_documents([Document(page_content="a")])
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(tick())
+        await vector_db.vector_search("a", k=1)
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(main()) >= 10
@@ -0,0 +1,19 @@
+import sys
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_search_util.model import EmbeddingConfig
+from vector_search_util._internal.langchain.langchain_client import LangchainClient
+from vector_search_util._internal.langchain.langchain_vector_db import LangChainVectorDBFaiss
+
+
+def test_missing_faiss_names_extra(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DATA_PATH", str(tmp_path / "app"))
+    # faissがインストールされていない環境とする
+    monkeypatch.setitem(sys.modules, "faiss", None)
+    monkeypatch.delitem(sys.modules, "vector_search_util._internal.langchain.faiss_vector_store", raising=False)
+    client = LangchainClient(EmbeddingConfig())
+    client.embedding = DeterministicFakeEmbedding(size=8)
+    with pytest.raises(ModuleNotFoundError, match=r"vector_search_util\[faiss\]"):
+        LangChainVectorDBFaiss(client, str(tmp_path / "faiss"), "test")
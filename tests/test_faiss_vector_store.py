@@ -0,0 +1,50 @@
+import atexit
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+faiss = pytest.importorskip("faiss")
+
+from vector_search_util._internal.langchain.faiss_vector_store import FaissVectorStore
+
+
+def create_store(tmp_path, index_type: str = "HNSW") -> FaissVectorStore:
+    return FaissVectorStore(
+        embedding=DeterministicFakeEmbedding(size=8),
+        db_path=str(tmp_path / "app.db"),
+        data_dir=str(tmp_path / "faiss"),
+        collection_name="test",
+        index_type=index_type,
+    )
+
+
+def test_delete_all_vectors_from_hnsw(tmp_path):
+    # 全件削除で墓標の割合がrebuild_ratioを超え、空のインデックスに作り直される
+    store = create_store(tmp_path)
+    store.add_texts(["a", "b"], ids=["x", "y"])
+
+    assert store.delete(["x", "y"]) is True
+    assert store.get_count() == 0
+    assert store.index is not None and store.index.ntotal == 0
+    ids, embeddings, _ = store.get_embeddings()
+    assert ids == [] and embeddings.shape[0] == 0
+
+    store.add_texts(["c"], ids=["z"])
+    assert [doc.id for doc, _ in store.similarity_search_with_score("c", k=5)] == ["z"]
+    store.close()
+
+
+def test_close_unregisters_atexit(tmp_path, monkeypatch):
+    unregistered = []
+    monkeypatch.setattr(atexit, "unregister", lambda func: unregistered.append(func))
+    store = create_store(tmp_path, "Flat")
+    store.add_texts(["a"], ids=["x"])
+    store.close()
+
+    assert unregistered == [store.persist]
+    assert not store.dirty
+    reopened = create_store(tmp_path, "Flat")
+    ids, embeddings, _ = reopened.get_embeddings()
+    assert ids == ["x"]
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
@@ -0,0 +1,34 @@
+import json
+import subprocess
+import sys
+
+# core.appのimportにかける時間の上限(秒)。CIの遅いマシンでも超えない程度に余裕をとる
+IMPORT_TIME_BUDGET = 2.0
+# サブコマンド、ベクトルDBで使う場合のみimportするモジュール
+HEAVY_MODULES = ["chromadb", "pandas", "langchain_postgres", "langchain_openai", "faiss"]
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+
+
+def test_import_app_within_budget():
+    result = run_python("import vector_search_util.core.app")
+    # -X importtime は "import time: self [us] | cumulative | imported package" をstderrに出力する
+    cumulative = None
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.removeprefix("import time:").split("|")]
+        if len(fields) == 3 and fields[2] == "vector_search_util.core.app":
+            cumulative = int(fields[1]) / 1_000_000
+    assert cumulative is not None
+    assert cumulative < IMPORT_TIME_BUDGET
+
+
+def test_import_app_skips_heavy_modules():
+    result = run_python(
+        "import json, sys; import vector_search_util.core.app; "
+        f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))"
+    )
+    assert json.loads(result.stdout) == []
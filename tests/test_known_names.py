@@ -0,0 +1,19 @@
+import asyncio
+import sqlite3
+
+from vector_search_util._internal.db import SQLiteClient
+
+
+def test_new_names_reflect_deletes_from_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteClient, "initialized", False)
+    client = SQLiteClient(str(tmp_path / "app.db"))
+    asyncio.run(client.upsert_new_categories_and_tags({"a", "b"}, {"x"}))
+
+    # 他プロセスの削除はSQLiteClientを経由しない
+    with sqlite3.connect(client.db_path) as conn:
+        conn.execute("DELETE FROM categories WHERE name = 'a'")
+        conn.execute("DELETE FROM tags")
+    asyncio.run(client.upsert_new_categories_and_tags({"a", "b"}, {"x"}))
+
+    assert sorted(category.name for category in asyncio.run(client.get_categories())) == ["a", "b"]
+    assert [tag.name for tag in asyncio.run(client.get_tags())] == ["x"]
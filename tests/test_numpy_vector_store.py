@@ -0,0 +1,39 @@
+import os
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_search_util._internal.langchain.numpy_vector_store import NumpyVectorStore
+
+
+def create_store(tmp_path) -> NumpyVectorStore:
+    return NumpyVectorStore(
+        embedding=DeterministicFakeEmbedding(size=8),
+        db_path=str(tmp_path / "app.db"),
+        data_dir=str(tmp_path / "numpy"),
+        collection_name="test",
+    )
+
+
+def test_compact_keeps_previous_generation(tmp_path):
+    # 旧世代を読み込んだ直後の他プロセスのため、直前の世代のファイルは次のcompactまで残す
+    store = create_store(tmp_path)
+    store.add_texts(["a", "b", "c"], ids=["x", "y", "z"])
+    store.compact()
+    assert sorted(os.listdir(store.data_dir)) == ["test.0.float32", "test.1.float32"]
+
+    store.compact()
+    assert sorted(os.listdir(store.data_dir)) == ["test.1.float32", "test.2.float32"]
+
+
+def test_reader_reloads_after_compaction(tmp_path):
+    reader = create_store(tmp_path)
+    writer = create_store(tmp_path)
+    writer.add_texts(["a", "b", "c"], ids=["x", "y", "z"])
+    assert [doc.id for doc, _ in reader.similarity_search_with_score("a", k=1)] == ["x"]
+
+    # 読み込み済みの世代のファイルが削除されても、新しい世代を読み直して検索できる
+    writer.delete(["y"])
+    writer.compact()
+    writer.compact()
+    assert not os.path.exists(os.path.join(writer.data_dir, "test.0.float32"))
+    assert sorted(doc.id for doc, _ in reader.similarity_search_with_score("a", k=5)) == ["x", "z"]
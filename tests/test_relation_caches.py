@@ -0,0 +1,29 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from vector_search_util.model import RelationData
+from vector_search_util._internal.db import SQLiteClient
+
+
+@pytest.fixture(params=[False, True], ids=["cte", "graph_cache"])
+def sqlite_client(tmp_path, monkeypatch, request) -> SQLiteClient:
+    monkeypatch.setattr(SQLiteClient, "initialized", False)
+    client = SQLiteClient(str(tmp_path / "app.db"), relation_graph_cache=request.param)
+    yield client
+    client.__clear_relation_caches__()
+
+
+def test_closure_reflects_writes_from_other_processes(sqlite_client):
+    asyncio.run(sqlite_client.upsert_relations([RelationData(from_node="a", to_node="b", edge_type="child")]))
+    assert asyncio.run(sqlite_client.get_category_closure("a", max_depth=3)) == ["a", "b"]
+
+    # 他プロセスの書き込みはSQLiteClientを経由しない
+    with sqlite3.connect(sqlite_client.db_path) as conn:
+        conn.execute("INSERT INTO relations (from_node, to_node, edge_type) VALUES ('b', 'c', 'child')")
+    assert asyncio.run(sqlite_client.get_category_closure("a", max_depth=3)) == ["a", "b", "c"]
+
+    with sqlite3.connect(sqlite_client.db_path) as conn:
+        conn.execute("DELETE FROM relations WHERE from_node = 'a'")
+    assert asyncio.run(sqlite_client.get_category_closure("a", max_depth=3)) == ["a"]
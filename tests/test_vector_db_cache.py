@@ -0,0 +1,63 @@
+import gc
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+pytest.importorskip("faiss")
+
+from vector_search_util.model import EmbeddingConfig
+from vector_search_util._internal.langchain.faiss_vector_store import FaissVectorStore
+from vector_search_util._internal.langchain.langchain_client import LangchainClient
+from vector_search_util._internal.langchain.langchain_factory import LangchainFactory
+from vector_search_util._internal.langchain.langchain_vector_db import LangChainVectorDB
+
+
+@pytest.fixture
+def faiss_config(tmp_path, monkeypatch):
+    monkeypatch.setenv("APP_DATA_PATH", str(tmp_path / "app"))
+    monkeypatch.setenv("VECTOR_DB_TYPE", "faiss")
+    monkeypatch.setenv("VECTOR_DB_URL", str(tmp_path / "faiss"))
+    monkeypatch.setenv("VECTOR_DB_CACHE_SIZE", "1")
+    monkeypatch.setenv("FAISS_INDEX_TYPE", "Flat")
+    monkeypatch.delenv("EMBEDDING_DIMENSIONS", raising=False)
+
+    def create_client(config=None):
+        client = LangchainClient(config)
+        client.embedding = DeterministicFakeEmbedding(size=8)
+        return client
+
+    monkeypatch.setattr(LangchainFactory, "create_client", staticmethod(create_client))
+    yield lambda collection_name: EmbeddingConfig(collection_name)
+    for key in list(LangChainVectorDB.instances):
+        LangChainVectorDB.instances.pop(key)
+    gc.collect()
+
+
+def add_vectors(vector_db: LangChainVectorDB, ids: list[str]) -> None:
+    vectors = np.random.default_rng(0).random((len(ids), 8), dtype=np.float32)
+    vector_db._add_embeddings_(ids, vectors, [Document(id=doc_id, page_content=doc_id) for doc_id in ids])
+
+
+def test_evicted_collection_stays_open_while_in_use(faiss_config, tmp_path):
+    writer = LangChainVectorDB.get_vector_db(faiss_config("a"))
+    add_vectors(writer, ["a1"])
+
+    # キャッシュサイズを超えてaがキャッシュから外れても、使用中のため閉じない
+    LangChainVectorDB.get_vector_db(faiss_config("b"))
+    add_vectors(writer, ["a2"])
+    # 使用中のインスタンスを返し、同じファイルのインデックスを2つ作らない
+    other = LangChainVectorDB.get_vector_db(faiss_config("a"))
+    assert other is writer
+    add_vectors(other, ["a3"])
+    LangChainVectorDB.get_vector_db(faiss_config("b"))
+    add_vectors(writer, ["a4"])
+
+    # 最後の参照が解放された時に閉じて保存する
+    del writer, other
+    gc.collect()
+    store = FaissVectorStore(DeterministicFakeEmbedding(size=8), str(tmp_path / "app" / "vector_db_search_app.db"),
+                             str(tmp_path / "faiss"), "a", index_type="Flat")
+    assert sorted(store.get_embeddings()[0]) == ["a1", "a2", "a3", "a4"]
+    store.close()